@@ -0,0 +1,92 @@
+# @file baseline_serialize.py
+# Copyright (C) 2015  Metaswitch Networks Ltd
+
+"""
+The serializer the messages had before serialization was precompiled (packing each field and
+parameter with its own struct.pack call, and concatenating the results), kept so that the
+benchmarks can report the current serializer against it on the same machine.  It works on the
+current message classes, and gives the same bytes as their serialize().
+"""
+
+import struct
+
+from metaswitch.sasclient import Analytics, Event, Marker, TrailAssoc
+from metaswitch.sasclient.constants import (
+    FLAG_ASSOCIATE,
+    FLAG_NO_REACTIVATE,
+    INTERFACE_VERSION,
+    PROTOCOL_VERSION,
+    SCOPE_NONE)
+from metaswitch.sasclient.messages import RESOURCE_BUNDLE_BASE, Heartbeat, Init, encode
+
+
+def pack_string(string):
+    data = encode(string)
+    return struct.pack('b', len(data)) + data
+
+
+def serialize_params(message):
+    static_data = b''.join(
+        [struct.pack('=i', static_param) for static_param in message.static_params])
+    static_data = struct.pack('!h', len(static_data)) + static_data
+
+    var_data = b''.join([
+        struct.pack('!h', len(var_param)) + var_param
+        for var_param in message.var_params])
+
+    return static_data + var_data
+
+
+def serialize_event_headers(message):
+    headers = struct.pack('!qii', message.trail_id,
+                          message.event_id | RESOURCE_BUNDLE_BASE,
+                          message.instance_id)
+    if isinstance(message, Analytics):
+        source_type = encode(message.source_type)
+        friendly_id = encode(message.friendly_id)
+        headers += struct.pack('!bb', message.format_type, message.store_event)
+        headers += struct.pack('!h', len(source_type)) + source_type
+        headers += struct.pack('!h', len(friendly_id)) + friendly_id
+    return headers
+
+
+def serialize_body(message):
+    if isinstance(message, Event):
+        return serialize_event_headers(message) + serialize_params(message)
+    if isinstance(message, Marker):
+        flags = 0
+        if message.scope != SCOPE_NONE:
+            flags |= FLAG_ASSOCIATE
+            if not message.reactivate:
+                flags |= FLAG_NO_REACTIVATE
+        return struct.pack(
+            '!qiibb',
+            message.trail_id,
+            message.marker_id,
+            message.instance_id,
+            flags,
+            message.scope) + serialize_params(message)
+    if isinstance(message, TrailAssoc):
+        return struct.pack('!qqb', message.trail_a_id, message.trail_b_id, message.scope)
+    if isinstance(message, Init):
+        return b''.join([
+            pack_string(message.system_name),
+            struct.pack('=i', 1),
+            pack_string(PROTOCOL_VERSION),
+            pack_string(message.system_type),
+            pack_string(message.resource_identifier),
+            pack_string(message.resource_version)])
+    return struct.pack('')
+
+
+def serialize(message):
+    """
+    Serialize a message as the original serializer did.
+    """
+    body = serialize_body(message)
+    if isinstance(message, Heartbeat):
+        header = struct.pack('!hbb', len(body) + 4, INTERFACE_VERSION, message.msg_type)
+    else:
+        header = struct.pack('!hbbq', len(body) + 12, INTERFACE_VERSION, message.msg_type,
+                             message.timestamp)
+    return header + body
@@ -0,0 +1,65 @@
+# @file bench_connections.py
+# Copyright (C) 2015  Metaswitch Networks Ltd
+
+"""
+Measures end to end throughput from Client.send to a loopback listener, with different numbers of
+connections (and so sender threads).
+
+Run with the package on the path, e.g.
+    PYTHONPATH=src python benchmark/bench_connections.py
+"""
+
+import threading
+import time
+
+from metaswitch.sasclient import Client, Event, Trail
+from loopback import LoopbackSAS
+
+MESSAGES_PER_PRODUCER = 20000
+PRODUCERS = 8
+CONNECTION_COUNTS = [1, 2, 4, 8]
+
+
+def run(sas, connections):
+    """
+    :return: messages per second delivered to the listener
+    """
+    client = Client("bench", "bench", "bench", sas.address,
+                    queue_length=PRODUCERS * MESSAGES_PER_PRODUCER,
+                    connections=connections)
+    trails = [Trail() for _ in range(64)]
+    message_bytes = Event(trails[0], 1, 2, [80], ["an.example.host", "POST"]).serialized_size()
+
+    def produce():
+        for i in range(MESSAGES_PER_PRODUCER):
+            client.send(Event(trails[i % len(trails)], 1, 2, [80], ["an.example.host", "POST"]))
+
+    # Wait for the Init messages to arrive, then start counting.
+    sas.wait_for_bytes(sas.bytes_received + 1)
+    time.sleep(0.1)
+    expected = sas.bytes_received + PRODUCERS * MESSAGES_PER_PRODUCER * message_bytes
+
+    producers = [threading.Thread(target=produce) for _ in range(PRODUCERS)]
+    start = time.time()
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+    sas.wait_for_bytes(expected)
+    elapsed = time.time() - start
+    client.stop()
+    return PRODUCERS * MESSAGES_PER_PRODUCER / elapsed
+
+
+def main():
+    sas = LoopbackSAS()
+    try:
+        print("{:>12} {:>16}".format("connections", "messages/sec"))
+        for connections in CONNECTION_COUNTS:
+            print("{:>12} {:>16,.0f}".format(connections, run(sas, connections)))
+    finally:
+        sas.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# @file bench_deferred.py
+# Copyright (C) 2015  Metaswitch Networks Ltd
+
+"""
+Measures how long the application spends in building and sending an Event with a SIP message body
+as a compressed parameter, with the parameter encoded and compressed as it is added, and deferred
+to the sender thread.
+
+Run with the package on the path, e.g.
+    PYTHONPATH=src python benchmark/bench_deferred.py
+"""
+
+import time
+
+from metaswitch.sasclient import Client, Event, Trail, COMPRESS_ZLIB
+
+CALLS = 10000
+SIP_BODY = (u"INVITE sip:bob@example.com SIP/2.0\r\n"
+            u"Via: SIP/2.0/TCP client.example.com:5060;branch=z9hG4bK74bf9\r\n"
+            u"From: Alice <sip:alice@example.com>;tag=9fxced76sl\r\n"
+            u"To: Bob <sip:bob@example.com>\r\n"
+            u"Call-ID: 3848276298220188511@client.example.com\r\n"
+            u"CSeq: 1 INVITE\r\n"
+            u"Content-Type: application/sdp\r\n\r\n" +
+            u"a=rtpmap:0 PCMU/8000\r\n" * 40)
+
+
+def run(deferred):
+    """
+    :return: microseconds per call
+    """
+    client = Client("bench", "bench", "bench", "localhost", start=False, queue_length=CALLS)
+    trail = Trail()
+    start = time.time()
+    for _ in range(CALLS):
+        event = Event(trail, 0x900001, 1, [200], ["INVITE"], deferred=deferred)
+        event.add_variable_param(SIP_BODY, compress=COMPRESS_ZLIB)
+        client.send(event)
+    elapsed = time.time() - start
+    return elapsed / CALLS * 1e6
+
+
+def main():
+    print("{} byte SIP body".format(len(SIP_BODY)))
+    print("{:<20} {:>10}".format("", "us/call"))
+    for name, deferred in [("immediate", False), ("deferred", True)]:
+        print("{:<20} {:>10.2f}".format(name, run(deferred)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# @file bench_overflow.py
+# Copyright (C) 2015  Metaswitch Networks Ltd
+
+"""
+Measures the cost of each overflow policy on the send path: a put to a queue with room, and a put
+to a full queue, which the policy has to deal with.
+
+Run with the package on the path, e.g.
+    PYTHONPATH=src python benchmark/bench_overflow.py
+"""
+
+import time
+
+from metaswitch.sasclient import Event, Marker, Trail, MARKER_ID_END
+from metaswitch.sasclient import overflow
+from metaswitch.sasclient.msgbuffer import MessageBuffer
+
+MAXSIZE = 10000
+PUTS = 100000
+
+POLICIES = [
+    ("DropNewest", overflow.DropNewest()),
+    ("DropOldest", overflow.DropOldest()),
+    ("Block(0)", overflow.Block(0)),
+    ("Sample(0.5)", overflow.Sample(0.5)),
+    ("Priority", overflow.Priority()),
+]
+
+
+def time_puts(buf, messages):
+    """
+    :return: microseconds per put
+    """
+    put = buf.put
+    start = time.time()
+    for message in messages:
+        put(message)
+    return (time.time() - start) / len(messages) * 1e6
+
+
+def run(policy):
+    """
+    :return: (microseconds per put with room, microseconds per put to a full queue)
+    """
+    trails = [Trail() for _ in range(64)]
+    events = [Event(trails[i % len(trails)], 1) for i in range(MAXSIZE)]
+    markers = [Marker(trails[i % len(trails)], MARKER_ID_END) for i in range(PUTS)]
+
+    # The queue has room for every message.
+    room = time_puts(MessageBuffer(MAXSIZE, policy), events)
+
+    # The queue is full of Events, and Markers keep arriving (so the Priority policy has work to
+    # do, evicting the oldest Event).
+    buf = MessageBuffer(MAXSIZE, policy)
+    for event in events:
+        buf.put(event)
+    full = time_puts(buf, markers[:MAXSIZE])
+    return room, full
+
+
+def main():
+    print("{:<14} {:>16} {:>16}".format("policy", "us/put (room)", "us/put (full)"))
+    for name, policy in POLICIES:
+        room, full = run(policy)
+        print("{:<14} {:>16.2f} {:>16.2f}".format(name, room, full))
+
+
+if __name__ == "__main__":
+    main()
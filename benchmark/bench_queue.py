@@ -0,0 +1,96 @@
+# @file bench_queue.py
+# Copyright (C) 2015  Metaswitch Networks Ltd
+
+"""
+Compares the MessageBuffer used by Client.send against Queue.Queue, with many producer threads
+putting messages and a single consumer taking them off, as the MessageSender does.
+
+Run with the package on the path, e.g.
+    PYTHONPATH=src python benchmark/bench_queue.py
+"""
+
+import threading
+import time
+
+try:
+    import queue as Queue
+except ImportError:
+    import Queue
+
+from metaswitch.sasclient.msgbuffer import MessageBuffer
+
+MESSAGES_PER_PRODUCER = 20000
+PRODUCER_COUNTS = [1, 4, 16, 64]
+MAXSIZE = 10000
+
+
+class StdQueueAdapter(object):
+    """
+    Drives a Queue.Queue the way the client and sender used to.
+    """
+    def __init__(self, maxsize):
+        self._queue = Queue.Queue(maxsize=maxsize)
+
+    def put(self, item):
+        try:
+            self._queue.put(item, block=False)
+            return True
+        except Queue.Full:
+            return False
+
+    def get(self, timeout):
+        try:
+            item = self._queue.get(True, timeout)
+            self._queue.task_done()
+            return item
+        except Queue.Empty:
+            return None
+
+
+def run(queue, producers):
+    """
+    :return: (put calls per second, number of puts rejected because the queue was full)
+    """
+    total = producers * MESSAGES_PER_PRODUCER
+    rejected = [0] * producers
+    done = threading.Event()
+    start_gate = threading.Event()
+
+    def produce(index):
+        start_gate.wait()
+        put = queue.put
+        for i in range(MESSAGES_PER_PRODUCER):
+            if not put(i):
+                rejected[index] += 1
+
+    def consume():
+        start_gate.wait()
+        received = 0
+        while received + sum(rejected) < total:
+            if queue.get(0.01) is not None:
+                received += 1
+        done.set()
+
+    threads = [threading.Thread(target=produce, args=(i,)) for i in range(producers)]
+    threads.append(threading.Thread(target=consume))
+    for thread in threads:
+        thread.start()
+    start = time.time()
+    start_gate.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+    return total / elapsed, sum(rejected)
+
+
+def main():
+    print("{:<10} {:>10} {:>16} {:>10}".format("queue", "producers", "puts/sec", "rejected"))
+    for producers in PRODUCER_COUNTS:
+        for name, queue in [("Queue", StdQueueAdapter(MAXSIZE)),
+                            ("Buffer", MessageBuffer(MAXSIZE))]:
+            rate, rejected = run(queue, producers)
+            print("{:<10} {:>10} {:>16,.0f} {:>10}".format(name, producers, rate, rejected))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# @file bench_send_event.py
+# Copyright (C) 2015  Metaswitch Networks Ltd
+
+"""
+Compares the cost of logging an event with Client.send, building Trail and Event objects, against
+Client.send_event, which serializes the event straight from its fields, and Client.send_template,
+which serializes it from an EventTemplate.
+
+Run with the package on the path, e.g.
+    PYTHONPATH=src python benchmark/bench_send_event.py
+"""
+
+import time
+
+from metaswitch.sasclient import Client, Event, EventTemplate, Trail
+
+CALLS = 100000
+STATIC_PARAMS = [80, 200]
+VAR_PARAMS = ["an.example.host", "POST", "/org.etsi.ngn.simservs"]
+
+
+def run(send):
+    """
+    :return: microseconds per call
+    """
+    client = Client("bench", "bench", "bench", "localhost", start=False, queue_length=CALLS)
+    start = time.time()
+    send(client)
+    elapsed = time.time() - start
+    return elapsed / CALLS * 1e6
+
+
+def send_new_trail(client):
+    for _ in range(CALLS):
+        client.send(Event(Trail(), 0x900001, 1, STATIC_PARAMS, VAR_PARAMS))
+
+
+def send_event_object(client):
+    trail = Trail()
+    for _ in range(CALLS):
+        client.send(Event(trail, 0x900001, 1, STATIC_PARAMS, VAR_PARAMS))
+
+
+def send_event(client):
+    trail_id = Trail().get_trail_id()
+    for _ in range(CALLS):
+        client.send_event(trail_id, 0x900001, 1, STATIC_PARAMS, VAR_PARAMS)
+
+
+def send_template(client):
+    trail_id = Trail().get_trail_id()
+    template = EventTemplate(0x900001, 1, len(STATIC_PARAMS), len(VAR_PARAMS))
+    for _ in range(CALLS):
+        client.send_template(template, trail_id, STATIC_PARAMS, VAR_PARAMS)
+
+
+def main():
+    print("{:<40} {:>10}".format("", "us/call"))
+    for name, send in [("send(Event(Trail(), ...))", send_new_trail),
+                       ("send(Event(trail, ...))", send_event_object),
+                       ("send_event(trail_id, ...)", send_event),
+                       ("send_template(template, trail_id, ...)", send_template)]:
+        print("{:<40} {:>10.2f}".format(name, run(send)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# @file bench_serialize.py
+# Copyright (C) 2015  Metaswitch Networks Ltd
+
+"""
+Measures serialization throughput (messages/sec) for each message type, with the current
+serializer and with the original one (see baseline_serialize), so that the speedup can be
+reproduced on any machine.
+
+Run with the package on the path, e.g.
+    PYTHONPATH=src python benchmark/bench_serialize.py
+"""
+
+import timeit
+
+from metaswitch.sasclient import (
+    Analytics,
+    Event,
+    Marker,
+    Trail,
+    TrailAssoc,
+    MARKER_ID_START,
+    SCOPE_BRANCH)
+from metaswitch.sasclient.messages import Heartbeat, Init
+import baseline_serialize
+
+ITERATIONS = 100000
+
+
+def make_messages():
+    """
+    Returns a list of (name, message) pairs with parameter mixes typical of real call sites.
+    """
+    trail = Trail()
+    return [
+        ("Init", Init("ellis@ellis.cw-ngv.com", "ellis", "org.projectclearwater.20151201")),
+        ("Event (empty)", Event(trail, 0x900001)),
+        ("Event (typical)", Event(trail, 0x900001, 3, [80, 200],
+                                  ["an.example.host", "POST", "/org.etsi.ngn.simservs"])),
+        ("Event (1KB body)", Event(trail, 0x900002, 4, [1], ["x" * 1024])),
+        ("Event (16KB binary)", Event(trail, 0x900002, 4, [1], [bytearray(16 * 1024)])),
+        ("Marker", Marker(trail, MARKER_ID_START, scope=SCOPE_BRANCH,
+                          var_params=["sip:6505550000@example.com"])),
+        ("Analytics", Analytics(trail, Analytics.FORMAT_JSON, "ellis-analytics", "ellis-1",
+                                var_params=['{"key": "value", "other": [1, 2, 3]}'])),
+        ("TrailAssoc", TrailAssoc(trail, Trail(), SCOPE_BRANCH)),
+        ("Heartbeat", Heartbeat()),
+    ]
+
+
+def rate(function):
+    """
+    :return: calls of function per second, the best of three runs
+    """
+    return ITERATIONS / min(timeit.repeat(function, number=ITERATIONS, repeat=3))
+
+
+def main():
+    print("{:<20} {:>14} {:>14} {:>8}".format("messages/sec", "baseline", "current", "speedup"))
+    for name, message in make_messages():
+        assert baseline_serialize.serialize(message) == message.serialize()
+        baseline = rate(lambda: baseline_serialize.serialize(message))
+        current = rate(message.serialize)
+        print("{:<20} {:>14,.0f} {:>14,.0f} {:>7.2f}x".format(
+            name, baseline, current, current / baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# @file bench_socket_options.py
+# Copyright (C) 2015  Metaswitch Networks Ltd
+
+"""
+Measures the effect of the socket options on the connection to SAS, against a loopback listener:
+- throughput: messages per second from Client.send to the listener, sending flat out
+- latency: the time from Client.send to the listener receiving the message, sending one message at
+  a time.
+
+Run with the package on the path, e.g.
+    PYTHONPATH=src:benchmark python benchmark/bench_socket_options.py
+"""
+
+import time
+
+from metaswitch.sasclient import Client, Event, Trail
+from metaswitch.sasclient.sender import SocketOptions
+from loopback import LoopbackSAS
+
+THROUGHPUT_MESSAGES = 100000
+LATENCY_MESSAGES = 1000
+
+OPTIONS = [
+    ("default", SocketOptions()),
+    ("tcp_nodelay", SocketOptions(tcp_nodelay=True)),
+    ("send_buffer_size=16K", SocketOptions(send_buffer_size=16 * 1024)),
+    ("send_buffer_size=1M", SocketOptions(send_buffer_size=1024 * 1024)),
+    ("tcp_nodelay, 1M", SocketOptions(tcp_nodelay=True, send_buffer_size=1024 * 1024)),
+    ("keepalive", SocketOptions(keepalive=True, keepalive_idle=1, keepalive_interval=1,
+                                keepalive_count=3, user_timeout=5)),
+]
+
+
+def connect(sas, options, messages):
+    client = Client("bench", "bench", "bench", sas.address, queue_length=messages,
+                    sas_port=sas.port, socket_options=options)
+    # Wait for the Init message to arrive.
+    sas.wait_for_bytes(sas.bytes_received + 1)
+    time.sleep(0.1)
+    return client
+
+
+def throughput(sas, options):
+    """
+    :return: messages per second delivered to the listener
+    """
+    client = connect(sas, options, THROUGHPUT_MESSAGES)
+    trail = Trail()
+    message_bytes = Event(trail, 1, 2, [80], ["an.example.host", "POST"]).serialized_size()
+    expected = sas.bytes_received + THROUGHPUT_MESSAGES * message_bytes
+
+    start = time.time()
+    for _ in range(THROUGHPUT_MESSAGES):
+        client.send(Event(trail, 1, 2, [80], ["an.example.host", "POST"]))
+    sas.wait_for_bytes(expected)
+    elapsed = time.time() - start
+    client.stop()
+    return THROUGHPUT_MESSAGES / elapsed
+
+
+def latency(sas, options):
+    """
+    :return: the median and 99th percentile latency in microseconds
+    """
+    client = connect(sas, options, LATENCY_MESSAGES)
+    trail = Trail()
+    latencies = []
+    for _ in range(LATENCY_MESSAGES):
+        message = Event(trail, 1, 2, [80], ["an.example.host", "POST"])
+        expected = sas.bytes_received + message.serialized_size()
+        start = time.time()
+        client.send(message)
+        sas.wait_for_bytes(expected)
+        latencies.append(time.time() - start)
+    client.stop()
+
+    latencies.sort()
+    return (latencies[len(latencies) // 2] * 1e6,
+            latencies[int(len(latencies) * 0.99)] * 1e6)
+
+
+def main():
+    sas = LoopbackSAS()
+    try:
+        print("{:<24} {:>12} {:>12} {:>12}".format("", "msgs/sec", "p50 us", "p99 us"))
+        for name, options in OPTIONS:
+            rate = throughput(sas, options)
+            p50, p99 = latency(sas, options)
+            print("{:<24} {:>12,.0f} {:>12.0f} {:>12.0f}".format(name, rate, p50, p99))
+    finally:
+        sas.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# @file bench_trail.py
+# Copyright (C) 2015  Metaswitch Networks Ltd
+
+"""
+Measures the rate at which trails can be created from many threads at once, comparing the
+lock-free TrailIdGenerator with a single global lock around a counter.
+
+Run with the package on the path, e.g.
+    PYTHONPATH=src python benchmark/bench_trail.py
+"""
+
+import threading
+import time
+
+from metaswitch.sasclient import Trail
+from metaswitch.sasclient.main import TrailIdGenerator
+
+TRAILS_PER_THREAD = 50000
+THREAD_COUNTS = [1, 4, 16, 64]
+
+
+class LockedIdGenerator(object):
+    """
+    Allocates IDs from a counter under a global lock.
+    """
+    def __init__(self):
+        self._next = 1
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        with self._lock:
+            trail_id = self._next
+            self._next += 1
+        return trail_id
+
+
+def run(threads):
+    """
+    :return: trails created per second
+    """
+    start_gate = threading.Event()
+
+    def create():
+        start_gate.wait()
+        for _ in range(TRAILS_PER_THREAD):
+            Trail()
+
+    workers = [threading.Thread(target=create) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    start = time.time()
+    start_gate.set()
+    for worker in workers:
+        worker.join()
+    return threads * TRAILS_PER_THREAD / (time.time() - start)
+
+
+def main():
+    original_generator = Trail.id_generator
+    print("{:<10} {:>10} {:>16}".format("generator", "threads", "trails/sec"))
+    try:
+        for threads in THREAD_COUNTS:
+            for name, generator in [("locked", LockedIdGenerator()),
+                                    ("lock-free", TrailIdGenerator())]:
+                Trail.id_generator = generator
+                print("{:<10} {:>10} {:>16,.0f}".format(name, threads, run(threads)))
+    finally:
+        Trail.id_generator = original_generator
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# @file loopback.py
+# Copyright (C) 2015  Metaswitch Networks Ltd
+
+"""
+A loopback listener standing in for SAS in the benchmarks, which reads and counts what it is sent.
+"""
+
+import socket
+import threading
+import time
+
+from metaswitch.sasclient import main
+
+
+class LoopbackSAS(object):
+    """
+    Accepts any number of connections and counts the bytes received on them.  While it is running,
+    clients connect to it by default.
+    """
+    def __init__(self):
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(('127.0.0.1', 0))
+        self._server.listen(64)
+        self.address = '127.0.0.1'
+        self.port = self._server.getsockname()[1]
+        self.bytes_received = 0
+        self._received = threading.Condition()
+
+        self._original_port = main.DEFAULT_SAS_PORT
+        main.DEFAULT_SAS_PORT = self.port
+
+        acceptor = threading.Thread(target=self._accept)
+        acceptor.daemon = True
+        acceptor.start()
+
+    def stop(self):
+        main.DEFAULT_SAS_PORT = self._original_port
+        self._server.close()
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self._server.accept()
+            except (socket.error, OSError):
+                return
+            reader = threading.Thread(target=self._read, args=(sock,))
+            reader.daemon = True
+            reader.start()
+
+    def _read(self, sock):
+        while True:
+            try:
+                received = len(sock.recv(1024 * 1024))
+            except (socket.error, OSError):
+                return
+            if not received:
+                return
+            with self._received:
+                self.bytes_received += received
+                self._received.notify_all()
+
+    def wait_for_bytes(self, count, timeout=60):
+        """
+        Wait until at least count bytes have been received in total.
+        :return: whether they arrived within the timeout
+        """
+        deadline = time.time() + timeout
+        with self._received:
+            while self.bytes_received < count:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._received.wait(remaining)
+        return True
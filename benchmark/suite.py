@@ -0,0 +1,249 @@
+# @file suite.py
+# Copyright (C) 2015  Metaswitch Networks Ltd
+
+"""
+Runs the benchmarks that guard against performance regressions, and writes the results as JSON:
+- serialization throughput, size and memory allocated for each message type
+- Client.send latency with different numbers of producer threads
+- end to end messages/sec and bytes/sec through the MessageSender to a loopback listener.
+
+Memory allocation is measured with tracemalloc, where it is available (Python 3.4+).
+
+Run with the package on the path, e.g.
+    PYTHONPATH=src:benchmark python benchmark/suite.py --output results.json
+and compare a later run with an earlier one, exiting with status 1 if any throughput has dropped by
+more than the tolerance:
+    PYTHONPATH=src:benchmark python benchmark/suite.py --baseline results.json
+The baseline may be from another Python version, e.g. to compare Python 3 against Python 2.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import threading
+import time
+import timeit
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from metaswitch.sasclient import Client, Event, Trail
+from bench_serialize import make_messages
+from loopback import LoopbackSAS
+
+SERIALIZE_ITERATIONS = 100000
+ALLOCATION_ITERATIONS = 1000
+SENDS_PER_PRODUCER = 10000
+PRODUCER_COUNTS = [1, 4, 16]
+END_TO_END_MESSAGES = 100000
+
+# The default fraction by which a throughput may fall before it counts as a regression.
+DEFAULT_TOLERANCE = 0.1
+
+
+def typical_event(trail):
+    return Event(trail, 0x900001, 3, [80, 200],
+                 ["an.example.host", "POST", "/org.etsi.ngn.simservs"])
+
+
+def measure_allocations(function):
+    """
+    :return: (blocks, bytes) of memory allocated by each call of function and still held by what it
+             returns, and the peak bytes allocated during a call; or Nones if tracemalloc isn't
+             available
+    """
+    if tracemalloc is None:
+        return None, None, None
+
+    results = []
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        for _ in range(ALLOCATION_ITERATIONS):
+            results.append(function())
+        after = tracemalloc.take_snapshot()
+
+        del results[:]
+        tracemalloc.clear_traces()
+        current = tracemalloc.get_traced_memory()[0]
+        function()
+        peak = tracemalloc.get_traced_memory()[1] - current
+    finally:
+        tracemalloc.stop()
+
+    stats = after.compare_to(before, 'filename')
+    blocks = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+    return (float(blocks) / ALLOCATION_ITERATIONS, float(size) / ALLOCATION_ITERATIONS, peak)
+
+
+def bench_serialize():
+    results = {}
+    for name, message in make_messages():
+        elapsed = min(timeit.repeat(message.serialize, number=SERIALIZE_ITERATIONS, repeat=3))
+        blocks, size, peak = measure_allocations(message.serialize)
+        results[name] = {
+            "messages_per_sec": SERIALIZE_ITERATIONS / elapsed,
+            "bytes_per_message": message.serialized_size(),
+            "alloc_blocks_per_message": blocks,
+            "alloc_bytes_per_message": size,
+            "alloc_peak_bytes": peak,
+        }
+    return results
+
+
+def percentile(ordered, fraction):
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def bench_enqueue(sas):
+    """
+    Time each Client.send call, with several threads sending at once.
+    """
+    results = {}
+    for producers in PRODUCER_COUNTS:
+        client = Client("bench", "bench", "bench", sas.address,
+                        queue_length=producers * SENDS_PER_PRODUCER)
+        latencies = [[] for _ in range(producers)]
+        start_gate = threading.Event()
+
+        def produce(index):
+            trail = Trail()
+            times = latencies[index]
+            clock = timeit.default_timer
+            start_gate.wait()
+            for _ in range(SENDS_PER_PRODUCER):
+                message = typical_event(trail)
+                start = clock()
+                client.send(message)
+                times.append(clock() - start)
+
+        threads = [threading.Thread(target=produce, args=(i,)) for i in range(producers)]
+        for thread in threads:
+            thread.start()
+        start_gate.set()
+        for thread in threads:
+            thread.join()
+        client.stop()
+
+        ordered = sorted(latency for times in latencies for latency in times)
+        results[str(producers)] = {
+            "mean_us": sum(ordered) / len(ordered) * 1e6,
+            "p50_us": percentile(ordered, 0.5) * 1e6,
+            "p99_us": percentile(ordered, 0.99) * 1e6,
+            "max_us": ordered[-1] * 1e6,
+        }
+    return results
+
+
+def bench_end_to_end(sas):
+    """
+    Time from the first Client.send until the listener has received every message.
+    Raises RuntimeError if they don't all arrive, rather than reporting a meaningless rate.
+    """
+    client = Client("bench", "bench", "bench", sas.address, queue_length=END_TO_END_MESSAGES)
+    try:
+        trail = Trail()
+        message_bytes = typical_event(trail).serialized_size()
+
+        # Wait for the Init message to arrive, then start counting.
+        if not sas.wait_for_bytes(sas.bytes_received + 1):
+            raise RuntimeError("The client didn't connect to the loopback listener")
+        time.sleep(0.1)
+        initial = sas.bytes_received
+        total = END_TO_END_MESSAGES * message_bytes
+
+        start = time.time()
+        for _ in range(END_TO_END_MESSAGES):
+            client.send(typical_event(trail))
+        if not sas.wait_for_bytes(initial + total):
+            raise RuntimeError("Only {} of {} bytes reached the loopback listener".format(
+                sas.bytes_received - initial, total))
+        elapsed = time.time() - start
+    finally:
+        client.stop()
+
+    return {
+        "messages_per_sec": END_TO_END_MESSAGES / elapsed,
+        "bytes_per_sec": total / elapsed,
+    }
+
+
+def run():
+    results = {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "time": time.time(),
+        "serialize": bench_serialize(),
+    }
+    sas = LoopbackSAS()
+    try:
+        results["enqueue"] = bench_enqueue(sas)
+        results["end_to_end"] = bench_end_to_end(sas)
+    finally:
+        sas.stop()
+    return results
+
+
+def throughputs(results):
+    """
+    :return: dict of each throughput measured, by name, for comparing runs
+    """
+    rates = {}
+    for name, result in results["serialize"].items():
+        rates["serialize " + name] = result["messages_per_sec"]
+    rates["end_to_end"] = results["end_to_end"]["messages_per_sec"]
+    return rates
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print how each throughput has changed since the baseline.
+    :return: the names of those that have fallen by more than the tolerance
+    """
+    regressions = []
+    old_rates = throughputs(baseline)
+    print("{:<30} {:>14} {:>14}".format("", "Python " + baseline["python"],
+                                        "Python " + results["python"]))
+    for name, rate in sorted(throughputs(results).items()):
+        if name not in old_rates:
+            continue
+        change = rate / old_rates[name] - 1
+        flag = ""
+        if change < -tolerance:
+            regressions.append(name)
+            flag = "REGRESSION"
+        print("{:<30} {:>14,.0f} {:>14,.0f} {:>+8.1%} {}".format(
+            name, old_rates[name], rate, change, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", help="file to write the results to (default: stdout)")
+    parser.add_argument("--baseline", help="results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="fractional drop in throughput counted as a regression")
+    args = parser.parse_args()
+
+    results = run()
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+    elif not args.baseline:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print("")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
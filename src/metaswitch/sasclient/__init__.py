@@ -4,9 +4,16 @@
 import logging
 
 from metaswitch.sasclient.main import Client, Trail, TestClient
-from metaswitch.sasclient.messages import Event, TrailAssoc, Marker, Analytics
+from metaswitch.sasclient.messages import (
+    Event, TrailAssoc, Marker, Analytics, EventTemplate, MarkerTemplate, AnalyticsTemplate)
 from metaswitch.sasclient.constants import *
 
+try:
+    from metaswitch.sasclient.asyncclient import AsyncClient
+except ImportError:
+    # asyncio is only available from Python 3.4.
+    pass
+
 logger = logging.getLogger(__name__)
 # Let the calling application control logging
 logger.addHandler(logging.NullHandler())
@@ -0,0 +1,299 @@
+# @file asyncclient.py
+# Copyright (C) 2015  Metaswitch Networks Ltd
+
+import asyncio
+import logging
+
+from metaswitch.sasclient import messages
+from metaswitch.sasclient.compression import CompressionPolicy
+from metaswitch.sasclient.constants import SCOPE_NONE
+from metaswitch.sasclient.main import DEFAULT_SAS_PORT
+from metaswitch.sasclient.sender import (
+    CONNECTION_TIMEOUT,
+    DEFAULT_HEARTBEAT_INTERVAL,
+    HEARTBEAT,
+    MAX_RECONNECT_WAIT_TIME,
+    MIN_RECONNECT_WAIT_TIME)
+
+# Limits on the transport's write buffer.  Once the buffer grows past the high watermark, messages
+# are discarded until it drains below the low watermark.
+DEFAULT_WRITE_BUFFER_HIGH = 1024 * 1024
+DEFAULT_WRITE_BUFFER_LOW = 256 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncClient(object):
+    """
+    Client for applications running on an asyncio event loop.  Messages are serialized and written
+    to an asyncio transport from the calling task, so there is no sender thread or message queue.
+    The transport's write buffer takes the place of the queue: its high and low watermarks decide
+    when messages are discarded, rather than a message count.
+
+    All methods must be called from the thread running the event loop.
+    """
+    def __init__(self,
+                 system_name,
+                 system_type,
+                 resource_identifier,
+                 sas_address,
+                 start=True,
+                 loop=None,
+                 sas_port=DEFAULT_SAS_PORT,
+                 write_buffer_high=DEFAULT_WRITE_BUFFER_HIGH,
+                 write_buffer_low=DEFAULT_WRITE_BUFFER_LOW,
+                 compression_policy=None,
+                 heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL):
+        """
+        Constructs the client.
+        :param system_name: The system name
+        :param system_type: The system type, e.g. "ellis", "homer"
+        :param resource_identifier: Identifier of the resource bundle, e.g.
+                                    org.projectclearwater.20151201
+        :param sas_address: The hostname or IP address of the SAS server to communicate with, (no
+                            port)
+        :param start: Whether the SAS client should start connecting immediately
+        :param loop: The event loop to use.  Defaults to the current event loop.
+        :param sas_port: The port of the SAS server
+        :param write_buffer_high: Size in bytes of unsent data at which to start discarding
+        :param write_buffer_low: Size in bytes of unsent data at which to stop discarding
+        :param compression_policy: The CompressionPolicy for variable parameters added with
+                                   COMPRESS_AUTO.  Defaults to CompressionPolicy().
+        :param heartbeat_interval: How long, in seconds, the connection may be idle before a
+                                   heartbeat is sent
+        """
+        self._system_name = system_name
+        self._system_type = system_type
+        self._resource_identifier = resource_identifier
+        self._sas_address = sas_address
+        self._sas_port = sas_port
+        self._write_buffer_high = write_buffer_high
+        self._write_buffer_low = write_buffer_low
+        self._loop = loop
+        self._compression_policy = compression_policy or CompressionPolicy()
+        self._heartbeat_interval = heartbeat_interval
+
+        self._running = False
+        self._transport = None
+        self._paused = False
+        self._discarding = False
+        self._connect_future = None
+        self._reconnect_handle = None
+        self._heartbeat_handle = None
+        self._reconnect_wait = MIN_RECONNECT_WAIT_TIME
+        self._last_write = 0
+
+        if start:
+            self.start()
+
+    def start(self):
+        """
+        Start the client, connecting to the SAS server in the background.
+        """
+        if self._running:
+            return
+
+        logger.info("Starting asyncio SAS client")
+        if self._loop is None:
+            self._loop = asyncio.get_event_loop()
+        self._running = True
+        self._connect()
+        self._heartbeat_handle = self._loop.call_later(self._heartbeat_interval, self._heartbeat)
+
+    def stop(self):
+        """
+        Stop the client and close the connection.  Any data still in the transport's write buffer
+        is flushed before the connection closes.
+        """
+        logger.info("Stopping asyncio SAS client")
+        self._running = False
+        for handle in (self._connect_future, self._reconnect_handle, self._heartbeat_handle):
+            if handle is not None:
+                handle.cancel()
+        self._connect_future = None
+        self._reconnect_handle = None
+        self._heartbeat_handle = None
+
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def send(self, message):
+        """
+        Serialize a message and write it to the connection.  If there is no connection, or the
+        transport's write buffer is full, the message is discarded.
+        """
+        if not self._check_writable():
+            return
+
+        logger.debug("Sending message:\n%s", message)
+        if message.pending_params:
+            message.encode_params(self._compression_policy)
+        self._write(message)
+
+    def send_event(self, trail_id, event_id, instance_id=0, static_params=(), var_params=()):
+        """
+        Send an Event, serializing it straight away rather than building an Event object (see
+        Client.send_event).
+        """
+        if self._check_writable():
+            self._write_bytes(messages.encode_event(
+                trail_id, event_id, instance_id, static_params, var_params))
+
+    def send_marker(self, trail_id, marker_id, instance_id=0, reactivate=True, scope=SCOPE_NONE,
+                    static_params=(), var_params=()):
+        """
+        Send a Marker, serializing it straight away rather than building a Marker object (see
+        Client.send_marker).
+        """
+        if self._check_writable():
+            self._write_bytes(messages.encode_marker(
+                trail_id, marker_id, instance_id, reactivate, scope, static_params, var_params))
+
+    def send_template(self, template, trail_id, static_params=(), var_params=()):
+        """
+        Send a message encoded from a template (see Client.send_template).
+        """
+        if self._check_writable():
+            self._write_bytes(template.encode(trail_id, static_params, var_params))
+
+    def _check_writable(self):
+        """
+        :return: whether there is a connection with room to write to, flagging that messages are
+                 being discarded if not
+        """
+        if self._transport is None or self._paused:
+            if not self._discarding:
+                logger.error("SAS is unavailable or not keeping up.  Messages for SAS will be "
+                             "discarded")
+                self._discarding = True
+            return False
+        return True
+
+    def _write(self, message):
+        parts = []
+        message.serialize_parts(parts)
+        self._transport.writelines(parts)
+        self._last_write = self._loop.time()
+
+    def _write_bytes(self, data):
+        self._transport.write(data)
+        self._last_write = self._loop.time()
+
+    def _connect(self):
+        logger.info("Connecting to: %s:%s", self._sas_address, self._sas_port)
+        connection = self._loop.create_connection(lambda: _SASProtocol(self),
+                                                  self._sas_address,
+                                                  self._sas_port)
+        self._connect_future = self._loop.create_task(
+            asyncio.wait_for(connection, CONNECTION_TIMEOUT))
+        self._connect_future.add_done_callback(self._connect_done)
+
+    def _connect_done(self, future):
+        self._connect_future = None
+        if future.cancelled():
+            return
+
+        error = future.exception()
+        if error is not None:
+            logger.error("Failed to connect to %s on port %s: %s",
+                         self._sas_address, self._sas_port, str(error))
+            self._schedule_reconnect()
+
+    def _schedule_reconnect(self):
+        if not self._running:
+            return
+
+        # If our connection is being rejected, don't spam the SAS with attempts. Use exponential
+        # back-off.
+        reconnect_wait = self._reconnect_wait
+        self._reconnect_wait = min(reconnect_wait * 2, MAX_RECONNECT_WAIT_TIME)
+        self._reconnect_handle = self._loop.call_later(reconnect_wait, self._reconnect)
+
+    def _reconnect(self):
+        self._reconnect_handle = None
+        if self._running:
+            self._connect()
+
+    def _connection_made(self, transport):
+        if not self._running:
+            transport.close()
+            return
+
+        logger.debug("Successfully connected")
+        transport.set_write_buffer_limits(high=self._write_buffer_high,
+                                          low=self._write_buffer_low)
+        self._transport = transport
+        self._paused = False
+        self._reconnect_wait = MIN_RECONNECT_WAIT_TIME
+
+        # Send the Init message before anything else.
+        self._write(messages.Init(self._system_name,
+                                  self._system_type,
+                                  self._resource_identifier))
+
+        if self._discarding:
+            logger.error("The SAS client library has discarded some messages.  The connection to "
+                         "SAS has been restored, so future logs should be successfully sent to "
+                         "SAS.")
+            self._discarding = False
+
+    def _connection_lost(self, error):
+        if not self._running:
+            return
+
+        logger.error("Lost connection to %s on port %s: %s",
+                     self._sas_address, self._sas_port, str(error))
+        self._transport = None
+        self._paused = False
+        self._schedule_reconnect()
+
+    def _pause_writing(self):
+        logger.debug("Transport write buffer is full")
+        self._paused = True
+
+    def _resume_writing(self):
+        logger.debug("Transport write buffer has drained")
+        self._paused = False
+        if self._discarding:
+            logger.error("The SAS client library has discarded some messages because SAS was not "
+                         "keeping up.  Future logs should be successfully sent to SAS.")
+            self._discarding = False
+
+    def _heartbeat(self):
+        """
+        Send a heartbeat if nothing else has been written for the heartbeat interval, and schedule
+        the next check for when the next heartbeat would be due.
+        """
+        now = self._loop.time()
+        if (self._transport is not None and
+                not self._paused and
+                now - self._last_write >= self._heartbeat_interval):
+            self._write_bytes(HEARTBEAT)
+        delay = max(self._last_write + self._heartbeat_interval - now, 0)
+        self._heartbeat_handle = self._loop.call_later(delay or self._heartbeat_interval,
+                                                       self._heartbeat)
+
+
+class _SASProtocol(asyncio.Protocol):
+    """
+    Protocol for the connection to SAS, which passes transport events on to the AsyncClient.
+    """
+    def __init__(self, client):
+        self._client = client
+
+    def connection_made(self, transport):
+        self._client._connection_made(transport)
+
+    def connection_lost(self, exc):
+        self._client._connection_lost(exc)
+
+    def pause_writing(self):
+        self._client._pause_writing()
+
+    def resume_writing(self):
+        self._client._resume_writing()
+
+    def data_received(self, data):
+        # SAS doesn't send anything that we need to act on.
+        pass
@@ -0,0 +1,81 @@
+# @file compression.py
+# Copyright (C) 2015  Metaswitch Networks Ltd
+
+import threading
+import time
+import zlib
+
+# Parameters shorter than this (in bytes) are rarely made any shorter by compression, so by default
+# they are sent as they are.
+DEFAULT_COMPRESSION_THRESHOLD = 128
+DEFAULT_COMPRESSION_LEVEL = zlib.Z_DEFAULT_COMPRESSION
+
+# The clock used to measure time spent compressing: this thread's CPU time where Python provides it
+# (3.7+), otherwise wall clock time, which zlib's CPU bound work tracks closely.
+_clock = getattr(time, 'thread_time', time.time)
+
+
+class CompressionPolicy(object):
+    """
+    Decides how to compress variable parameters added with compress=COMPRESS_AUTO (or with
+    compress set to the policy itself).  Parameters shorter than the threshold, or that zlib doesn't
+    make any shorter, are sent as they are; the rest are compressed at the given zlib level.
+
+    The policy counts what it has compressed, so that the threshold and level can be tuned against
+    the bandwidth available to SAS.  Any number of threads may use the same policy.
+    """
+
+    def __init__(self, threshold=DEFAULT_COMPRESSION_THRESHOLD, level=DEFAULT_COMPRESSION_LEVEL):
+        """
+        :param threshold: The minimum length, in bytes, of parameter to compress
+        :param level: The zlib compression level, from 1 (fastest) to 9 (smallest)
+        """
+        self.threshold = threshold
+        self.level = level
+        self._lock = threading.Lock()
+
+        self.params = 0
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_time = 0.0
+
+    def compress(self, data):
+        """
+        :param data: An encoded parameter
+        :return: the parameter compressed with zlib, or unchanged if compressing it isn't
+                 worthwhile
+        """
+        result = data
+        elapsed = 0.0
+        if len(data) >= self.threshold:
+            start = _clock()
+            compressed = zlib.compress(data, self.level)
+            elapsed = _clock() - start
+            if len(compressed) < len(data):
+                result = compressed
+
+        with self._lock:
+            self.params += 1
+            if result is not data:
+                self.compressed += 1
+            self.bytes_in += len(data)
+            self.bytes_out += len(result)
+            self.cpu_time += elapsed
+        return result
+
+    def stats(self):
+        """
+        :return: dict of the number of parameters the policy has seen, the number it has
+                 compressed, their total size before and after, the ratio of the two, and the time
+                 spent compressing, in seconds
+        """
+        with self._lock:
+            return {
+                "params": self.params,
+                "compressed": self.compressed,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "ratio": float(self.bytes_out) / self.bytes_in if self.bytes_in else 1.0,
+                "cpu_time": self.cpu_time,
+            }
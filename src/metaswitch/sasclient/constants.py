@@ -63,7 +63,10 @@ MARKER_ID_INBOUND_CALLING_URI = 0x05000004
 MARKER_ID_OUTBOUND_CALLED_URI = 0x05000005
 MARKER_ID_INBOUND_CALLED_URI = 0x05000006
 
-# Compression constants
+# Compression constants.  Parameters added with COMPRESS_ZLIB are always compressed with zlib.
+# Those added with COMPRESS_AUTO are compressed as the client's CompressionPolicy decides, and may
+# be sent uncompressed, so should only be used where SAS accepts either.
 COMPRESS_ZLIB = "zlib"
+COMPRESS_AUTO = "auto"
 
 # For event IDs and usage, see your resource bundle
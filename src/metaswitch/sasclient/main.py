@@ -1,20 +1,59 @@
 # @file main.py
 # Copyright (C) 2015  Metaswitch Networks Ltd
 
-import Queue
+import hashlib
+import itertools
+import os
+import socket
+import struct
 import threading
+import time
 import logging
-from metaswitch.sasclient import sender
+from metaswitch.sasclient import msgbuffer, overflow, sender, spool, stats
+from metaswitch.sasclient.compression import CompressionPolicy
+from metaswitch.sasclient.constants import SCOPE_NONE
+from metaswitch.sasclient.messages import encode_event, encode_marker, message_trail_id
 
-# The default SAS port, at the moment not configurable
+# The default SAS port
 DEFAULT_SAS_PORT = 6761
 
 # The number of messages to queue if no value is provided.
 MINIMUM_QUEUE_LENGTH = 100
 DEFAULT_QUEUE_LENGTH = 10000
 
+# The default size of the spool file, if spooling is enabled.
+DEFAULT_SPOOL_SIZE = 64 * 1024 * 1024
+
+# Trail IDs are 63 bit positive integers (SAS treats them as signed 64 bit): a 31 bit prefix unique
+# to the generator, followed by a 32 bit counter.
+TRAIL_PREFIX_BITS = 31
+TRAIL_COUNTER_BITS = 32
+TRAIL_COUNTER_MAX = (1 << TRAIL_COUNTER_BITS) - 1
+
+# Limits on how long, in seconds, the supervisor waits before restarting a sender thread that has
+# died.  The wait doubles each time a restarted sender dies again, and is reset once a sender has
+# run for longer than the maximum wait.
+MIN_RESTART_WAIT_TIME = 0.1
+MAX_RESTART_WAIT_TIME = 30
+
 logger = logging.getLogger(__name__)
 
+# Forked children must not share trail IDs, queues, sockets or sender threads with their parent, so
+# we need to know when we're running in a new process.  Where the platform lets us register a fork
+# hook (Python 3.7+) we track the PID cheaply; otherwise we have to ask the OS every time.
+_pid = os.getpid()
+
+if hasattr(os, 'register_at_fork'):
+    def _update_pid():
+        global _pid
+        _pid = os.getpid()
+    os.register_at_fork(after_in_child=_update_pid)
+
+    def current_pid():
+        return _pid
+else:
+    current_pid = os.getpid
+
 
 class Client(object):
     def __init__(self,
@@ -23,7 +62,23 @@ class Client(object):
                  resource_identifier,
                  sas_address,
                  start=True,
-                 queue_length=DEFAULT_QUEUE_LENGTH):
+                 queue_length=DEFAULT_QUEUE_LENGTH,
+                 batch_max_messages=sender.DEFAULT_BATCH_MAX_MESSAGES,
+                 batch_max_bytes=sender.DEFAULT_BATCH_MAX_BYTES,
+                 batch_linger=sender.DEFAULT_BATCH_LINGER,
+                 connections=1,
+                 spool_path=None,
+                 spool_size=DEFAULT_SPOOL_SIZE,
+                 spool_watermark=None,
+                 spool_replay_rate=sender.DEFAULT_SPOOL_REPLAY_RATE,
+                 overflow_policy=None,
+                 queue_bytes=None,
+                 tracer=None,
+                 resource_bundle=None,
+                 compression_policy=None,
+                 heartbeat_interval=sender.DEFAULT_HEARTBEAT_INTERVAL,
+                 sas_port=None,
+                 socket_options=None):
         """
         Constructs the client and the message queue.
         :param system_name: The system name
@@ -34,90 +89,485 @@ class Client(object):
                             port)
         :param start: Whether the SAS client should start immediately
         :param queue_length: The maximum number of messages to queue for sending to SAS
+        :param batch_max_messages: The maximum number of queued messages to send in one write
+        :param batch_max_bytes: The maximum number of bytes to send in one write (a batch always
+                                contains at least one message)
+        :param batch_linger: How long, in seconds, to wait for more messages to fill a batch once
+                             the queue is empty.  The default of 0 sends whatever is queued
+                             immediately.
+        :param connections: The number of connections to SAS, each with its own sender thread and
+                            share of the queue.  Messages are assigned to a connection by trail ID,
+                            so messages on the same trail are always sent in order.
+        :param spool_path: Path of a file in which to spool messages while SAS is unavailable,
+                           rather than discarding them.  Spooled messages are kept across restarts
+                           and sent, oldest first, once SAS is available.  With several
+                           connections, each has its own spool file, named with a suffix of the
+                           connection number.  By default, there is no spool.
+        :param spool_size: The maximum number of bytes of messages to spool (per connection).  Once
+                           the spool is full, the oldest messages are discarded.
+        :param spool_watermark: The number of messages to hold on each connection's queue before
+                                moving them to the spool.  Defaults to half the queue length.
+        :param spool_replay_rate: The rate, in bytes per second, at which spooled messages are sent
+                                  to SAS once it is available.
+        :param overflow_policy: What to do with messages sent while the queue is full: one of the
+                                policies in the overflow module.  Defaults to
+                                overflow.DropNewest(), which discards new messages, and the queue
+                                once SAS is available again.
+        :param queue_bytes: The maximum total size, in bytes, of the messages to queue for sending
+                            to SAS, shared between the connections.  If this is set, it bounds the
+                            queue rather than queue_length, and the size of each message is
+                            calculated as it is queued.
+        :param tracer: A MessageTracer, to keep a sample of the messages sent
+        :param resource_bundle: A ResourceBundle (see resources.load_resource_bundle), to check
+                                events against as they are sent, if it is validating.  send and
+                                send_event raise ValueError or TypeError for an invalid event.
+        :param compression_policy: The CompressionPolicy for variable parameters added with
+                                   COMPRESS_AUTO.  Defaults to CompressionPolicy().
+        :param heartbeat_interval: How long, in seconds, a connection may be idle before a
+                                   heartbeat is sent on it
+        :param sas_port: The port of the SAS server.  Defaults to DEFAULT_SAS_PORT.
+        :param socket_options: A sender.SocketOptions, setting timeouts, TCP_NODELAY, the send
+                               buffer size and keepalives for the connections to SAS
         """
-        queue_length = max(queue_length, MINIMUM_QUEUE_LENGTH)
-        self._queue = Queue.Queue(maxsize=queue_length)
+        self._connections = max(connections, 1)
+        self._queue_length = max(queue_length // self._connections, MINIMUM_QUEUE_LENGTH)
+        self._overflow_policy = overflow_policy or overflow.DropNewest()
+        self._queue_bytes = None
+        if queue_bytes is not None:
+            self._queue_bytes = queue_bytes // self._connections
+        self._create_queues()
+        self._pid = current_pid()
+        self._fork_lock = threading.Lock()
         self._stopper = None
-        self._worker = None
-        self._discarding = None
+        self._workers = []
+        self._supervisor = None
+        self._worker_failed = None
 
         self._system_name = system_name
         self._system_type = system_type
         self._resource_identifier = resource_identifier
         self._sas_address = sas_address
+        self._sas_port = sas_port
+        self._socket_options = socket_options
+
+        self._batch_max_messages = batch_max_messages
+        self._batch_max_bytes = batch_max_bytes
+        self._batch_linger = batch_linger
+        self._tracer = tracer
+        self._resource_bundle = resource_bundle
+        self._compression_policy = compression_policy or CompressionPolicy()
+        self._heartbeat_interval = heartbeat_interval
+
+        self._spool_path = spool_path
+        self._spool_size = spool_size
+        if spool_watermark is None:
+            spool_watermark = self._queue_length // 2
+        self._spool_watermark = spool_watermark
+        self._spool_replay_rate = spool_replay_rate
 
         if start:
             self.start()
 
+    def _create_queues(self):
+        """
+        Create a queue for each connection, the flag that tells its worker to discard what it has
+        queued, and the connection's statistics.
+        """
+        self._queues = [msgbuffer.MessageBuffer(self._queue_length,
+                                                self._overflow_policy,
+                                                self._queue_bytes)
+                        for _ in range(self._connections)]
+        self._discarding = [threading.Event() for _ in range(self._connections)]
+        self._sender_stats = [stats.SenderStats() for _ in range(self._connections)]
+
     def start(self):
         """
         Start the sasclient. This should only be called once since the latest call to stop().
-        Spins up the thread to do the work, and connects to the SAS server.
+        Spins up the threads to do the work, which connect to the SAS server in the background:
+        this doesn't wait for the connections to be made (see wait_connected).  Messages sent in
+        the meantime are queued.
         """
-        if self._worker is not None:
-            # We already had a worker. start must have been called twice consecutively. Try to
+        if self._pid != current_pid():
+            # Started for the first time in a forked child (e.g. created with start=False before
+            # the fork): drop what was inherited from the parent first.
+            self._after_fork(restart=False)
+
+        if self._workers:
+            # We already had workers. start must have been called twice consecutively. Try to
             # recover.
             self.stop()
 
         logger.info("Starting SAS client")
         self._stopper = threading.Event()
-        self._discarding = threading.Event()
-        self._worker = sender.MessageSender(
+        self._worker_failed = threading.Event()
+        for index in range(self._connections):
+            # Start the message sender worker thread, which makes the initial connection.
+            worker = self._create_worker(index)
+            worker.start()
+            self._workers.append(worker)
+
+        # Start the thread that restarts any worker that dies.
+        self._supervisor = threading.Thread(target=self._supervise,
+                                            args=(self._stopper, self._workers,
+                                                  self._worker_failed))
+        self._supervisor.daemon = True
+        self._supervisor.start()
+
+    def _create_worker(self, index):
+        """
+        :return: a new MessageSender for the connection with the given index
+        """
+        worker = sender.MessageSender(
             self._stopper,
-            self._queue,
-            self._discarding,
+            self._queues[index],
+            self._discarding[index],
             self._system_name,
             self._system_type,
             self._resource_identifier,
             self._sas_address,
-            DEFAULT_SAS_PORT)
-        self._worker.setDaemon(True)
+            self._sas_port if self._sas_port is not None else DEFAULT_SAS_PORT,
+            batch_max_messages=self._batch_max_messages,
+            batch_max_bytes=self._batch_max_bytes,
+            batch_linger=self._batch_linger,
+            spool=self._open_spool(index),
+            spool_watermark=self._spool_watermark,
+            spool_replay_rate=self._spool_replay_rate,
+            stats=self._sender_stats[index],
+            compression_policy=self._compression_policy,
+            heartbeat_interval=self._heartbeat_interval,
+            socket_options=self._socket_options,
+            failed_event=self._worker_failed)
+        worker.daemon = True
+        return worker
+
+    def _supervise(self, stopper, workers, worker_failed):
+        """
+        Run by the supervisor thread until the client is stopped.  Replaces any worker that has
+        been ended by an unexpected exception with a new one, which carries on with its queue.
+        Restarts are backed off, so that a worker that keeps failing doesn't spin.  The thread
+        sleeps until a worker fails (the worker sets worker_failed), a restart is due, or the
+        client is stopped.
+        """
+        restart_wait = [MIN_RESTART_WAIT_TIME] * len(workers)
+        restart_due = [None] * len(workers)
+        started = [time.time()] * len(workers)
+        timeout = None
+        while True:
+            worker_failed.wait(timeout)
+            if stopper.is_set():
+                return
+            # Clear the flag before looking, so that a worker failing from now on wakes us again.
+            worker_failed.clear()
 
-        # Make the initial connection.
-        self._worker.connect()
+            now = time.time()
+            for index, worker in enumerate(workers):
+                if not worker.failed:
+                    continue
 
-        # Start the message sender worker thread.
-        self._worker.start()
+                if restart_due[index] is None:
+                    if now - started[index] > MAX_RESTART_WAIT_TIME:
+                        # It ran for a good while, so this isn't the last failure repeating.
+                        restart_wait[index] = MIN_RESTART_WAIT_TIME
+                    restart_due[index] = now + restart_wait[index]
+                    logger.error("SAS sender thread for connection %d has died, restarting it in "
+                                 "%s seconds", index, restart_wait[index])
+                elif now >= restart_due[index]:
+                    logger.info("Restarting SAS sender thread for connection %d", index)
+                    worker.join()
+                    self._sender_stats[index].restarts += 1
+                    workers[index] = self._create_worker(index)
+                    workers[index].start()
+                    restart_wait[index] = min(restart_wait[index] * 2, MAX_RESTART_WAIT_TIME)
+                    restart_due[index] = None
+                    started[index] = now
 
-    def stop(self):
+            pending = [due for due in restart_due if due is not None]
+            timeout = max(min(pending) - time.time(), 0) if pending else None
+
+    def _open_spool(self, index):
+        """
+        :return: the spool for the connection with the given index, or None if spooling is disabled
+        """
+        if self._spool_path is None:
+            return None
+        path = self._spool_path
+        if self._connections > 1:
+            path = "{}.{}".format(path, index)
+        return spool.Spool(path, self._spool_size)
+
+    def wait_connected(self, timeout=None):
+        """
+        Wait until the client has connected to SAS, on all of its connections.
+        :param timeout: How long, in seconds, to wait, or None to wait indefinitely
+        :return: whether the client is connected
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        for worker in list(self._workers):
+            remaining = max(deadline - time.time(), 0) if deadline is not None else None
+            if not worker.wait_connected(remaining):
+                return False
+        return bool(self._workers)
+
+    def flush(self, timeout=None):
+        """
+        Wait until the messages queued before the call have been written to SAS (or spooled, or
+        discarded).  Messages sent meanwhile don't hold it up.  The senders write them as fast as
+        they can, in batches, without lingering for further messages.
+        :param timeout: How long, in seconds, to wait, or None to wait indefinitely
+        :return: dict of the number of messages written while waiting ("flushed"), and the number
+                 still waiting to be written when it returned ("unsent")
+        """
+        sent = sum(sender_stats.sent for sender_stats in self._sender_stats)
+        deadline = time.time() + timeout if timeout is not None else None
+        for worker in list(self._workers):
+            remaining = max(deadline - time.time(), 0) if deadline is not None else None
+            worker.flush(remaining)
+        return {
+            "flushed": sum(sender_stats.sent for sender_stats in self._sender_stats) - sent,
+            "unsent": (sum(len(queue) for queue in self._queues) +
+                       sum(worker.unsent() for worker in self._workers)),
+        }
+
+    def stop(self, drain_timeout=0):
         """
-        Stop the worker thread, closing the connection, and remove references to thread-related
+        Stop the worker threads, closing the connections, and remove references to thread-related
         objects. Queued messages will be left on the queue until the queue is garbage collected, or
-        the queue is reused and the messages are sent.
-        The worker thread is a daemon, so it isn't usually necessary to call this, but it is
+        the queue is reused and the messages are sent.  If spooling is enabled, they are moved to
+        the spool instead, and sent when the client is next started.
+        The worker threads are daemons, so it isn't usually necessary to call this, but it is
         preferred.
+        :param drain_timeout: How long, in seconds, to spend writing what has been queued to SAS
+                              (see flush) before stopping.  By default, the client stops straight
+                              away.
+        :return: dict of the number of messages written while draining ("flushed"), and the
+                 number left unsent (and not spooled) when the client stopped ("abandoned")
         """
         logger.info("Stopping SAS client")
+        flushed = 0
+        if drain_timeout > 0:
+            flushed = self.flush(drain_timeout)["flushed"]
+
         self._stopper.set()
-        self._worker.join()
-        if not self._queue.empty():
-            logger.warn("SAS client was stopped with messages still on the queue")
+        if self._supervisor is not None:
+            # Stop the supervisor first, so that it doesn't restart any workers.
+            self._worker_failed.set()
+            self._supervisor.join()
+        for queue in self._queues:
+            # Wake the workers, if they're waiting for messages.
+            queue.wake()
+        for worker in self._workers:
+            worker.join()
+
+        abandoned = (sum(len(queue) for queue in self._queues) +
+                     sum(worker.abandoned for worker in self._workers))
+        if abandoned:
+            logger.warning("SAS client was stopped with %d message(s) unsent", abandoned)
 
-        self._worker = None
+        self._workers = []
+        self._supervisor = None
+        self._worker_failed = None
         self._stopper = None
-        self._discarding = None
+        return {"flushed": flushed, "abandoned": abandoned}
+
+    def stats(self):
+        """
+        Take a snapshot of the client's statistics, since it was created (or since the process
+        forked).  Counts are summed over all connections:
+        - enqueued: messages queued for sending
+        - sent: messages sent to SAS from the queue
+        - dropped: messages discarded, because the queue (or spool) was full or SAS was unavailable
+        - rejected, evicted, sampled_out: messages discarded by the overflow policy: new messages
+          turned away, queued messages discarded to make room, and new messages on trails outside
+          the sample
+        - blocked: calls to send that waited for room on the queue
+        - spooled: messages moved to the spool, to be sent later
+        - bytes_sent: bytes written to SAS, including Init and Heartbeat messages
+        - queue_depth: messages currently queued
+        - queue_high_water: the most messages that have been queued (on each connection)
+        - queue_bytes, queue_bytes_high_water: the size of the messages currently queued, and the
+          most there has been (on each connection), if the queue has a byte budget
+        - reconnects: attempts to reconnect to SAS
+        - heartbeats: heartbeats sent on idle connections
+        - failed: messages discarded because they couldn't be serialized
+        - restarts: sender threads restarted after an unexpected exception
+        - compression: the compression policy's statistics (see CompressionPolicy.stats)
+        The queue_wait and write_latency histograms show how long messages spend on the queue (for a
+        sample of 1 in 16 messages), and how long each write to the socket takes.  Each is a dict
+        of the count, mean, maximum and percentiles in seconds, and the non-empty buckets as
+        (upper limit, count) pairs.
+        Statistics for each connection are under "connections".
+        :return: dict of statistics
+        """
+        result = stats.client_stats(self._queues, self._sender_stats)
+        result["compression"] = self._compression_policy.stats()
+        return result
 
     def send(self, message):
-        logger.debug("Queueing message for sending:\n%s", str(message))
-        try:
-            self._queue.put(message, block=False)
-        except Queue.Full:
-            # The message queue is full.  Inform the worker that it will need
-            # to start discarding messages.
-            if not self._discarding.is_set():
+        # Leave the logger to render the message, only if debug logging is enabled.
+        logger.debug("Queueing message for sending:\n%s", message)
+        if self._resource_bundle is not None:
+            self._resource_bundle.check_message(message)
+        if message.pending_params and not message.deferred:
+            # Deferred messages are left for the sender thread to encode.
+            message.encode_params(self._compression_policy)
+        self._enqueue(message, message_trail_id(message) if self._connections > 1 else 0)
+
+    def send_event(self, trail_id, event_id, instance_id=0, static_params=(), var_params=()):
+        """
+        Send an Event, serializing it straight away rather than building an Event object.  This is
+        the cheapest way to send an event.
+        :param trail_id: The ID of the trail (from Trail.get_trail_id())
+        :param event_id: The event ID, from the resource bundle
+        :param instance_id: Identifies where in the code the event was sent from
+        :param static_params: Sequence of integer parameters
+        :param var_params: Sequence of string parameters
+        """
+        logger.debug("Queueing event 0x%x on trail %d", event_id, trail_id)
+        if self._resource_bundle is not None:
+            self._resource_bundle.check_event(event_id, static_params, var_params)
+        self._enqueue(encode_event(trail_id, event_id, instance_id, static_params, var_params),
+                      trail_id)
+
+    def send_marker(self, trail_id, marker_id, instance_id=0, reactivate=True, scope=SCOPE_NONE,
+                    static_params=(), var_params=()):
+        """
+        Send a Marker, serializing it straight away rather than building a Marker object.  The
+        parameters are as for send_event and Marker.
+        """
+        logger.debug("Queueing marker 0x%x on trail %d", marker_id, trail_id)
+        self._enqueue(encode_marker(trail_id, marker_id, instance_id, reactivate, scope,
+                                    static_params, var_params),
+                      trail_id)
+
+    def send_template(self, template, trail_id, static_params=(), var_params=()):
+        """
+        Send a message encoded from a template (see messages.MessageTemplate).  Templates from a
+        ResourceBundle check their own parameters.
+        :param template: An EventTemplate, MarkerTemplate or AnalyticsTemplate
+        :param trail_id: The ID of the trail (from Trail.get_trail_id())
+        :param static_params: Sequence of the template's number of integer parameters
+        :param var_params: Sequence of the template's number of string parameters
+        """
+        logger.debug("Queueing %s on trail %d", type(template).__name__, trail_id)
+        self._enqueue(template.encode(trail_id, static_params, var_params), trail_id)
+
+    def _enqueue(self, message, trail_id):
+        """
+        Queue a message, or serialized message, for sending on the connection for its trail.
+        """
+        if self._pid != current_pid():
+            self._after_fork()
+
+        if self._connections == 1:
+            index = 0
+        else:
+            index = trail_id % self._connections
+
+        if self._tracer is not None:
+            self._tracer.trace(message)
+
+        if not self._queues[index].put(message):
+            # The message queue is full, and a message has been discarded.  Inform the worker
+            # that it will need to start discarding messages.
+            discarding = self._discarding[index]
+            if not discarding.is_set():
                 logger.error("The message queue is full.  Messages queued for sending to SAS will "
                              "be discarded")
-                self._discarding.set()
+                discarding.set()
+
+    def _after_fork(self, restart=True):
+        """
+        Called the first time the client is used (or started) in a forked child.  The child has a
+        copy of the parent's queues, whose messages the parent will send, copies of the parent's
+        sockets, and no sender threads.  Give the child its own queues, and if the client was
+        started (and restart is set), its own senders and connections.
+        """
+        with self._fork_lock:
+            if self._pid == current_pid():
+                # Another thread got here first.
+                return
+
+            logger.info("Process has forked, restarting SAS client in the child")
+            if self._spool_path is not None:
+                # The spool files belong to the parent.
+                logger.warning("Disabling the SAS spool in the forked child")
+                self._spool_path = None
+            self._create_queues()
+            running = bool(self._workers)
+            for worker in self._workers:
+                # Close our copy of the socket, without shutting down the parent's connection.
+                worker.close_inherited_socket()
+            self._workers = []
+            self._supervisor = None
+            self._worker_failed = None
+            self._stopper = None
+
+            self._pid = current_pid()
+            if running and restart:
+                self.start()
+
+
+def generate_trail_prefix():
+    """
+    Generate a trail ID prefix from the host name, process ID and current time, mixed with some
+    randomness, so that generators in different processes, on different hosts or created after a
+    restart use different ranges of trail IDs.
+    """
+    seed = ("{}:{}:{!r}:".format(socket.gethostname(), os.getpid(), time.time()).encode('UTF-8') +
+            os.urandom(8))
+    prefix = struct.unpack('!I', hashlib.sha1(seed).digest()[:4])[0] >> (32 - TRAIL_PREFIX_BITS)
+
+    # Avoid prefix 0, so trail IDs never collide with those of a restarted client that hands out
+    # IDs from 1.
+    return prefix or 1
+
+
+class TrailIdGenerator(object):
+    """
+    Allocates trail IDs without taking a lock.  Each ID is the generator's prefix followed by the
+    next value of a counter.  The counter is an itertools.count, which can be advanced atomically
+    by any thread.  If the counter is ever exhausted, or a generated prefix is inherited by a forked
+    child, the generator moves on to a fresh prefix.
+    """
+    def __init__(self, prefix=None, start=1):
+        """
+        :param prefix: The prefix for IDs from this generator.  By default, one is generated that
+                       is unique to this process and host.
+        :param start: The first counter value to hand out
+        """
+        self._generate_prefix = prefix is None
+        if prefix is None:
+            prefix = generate_trail_prefix()
+
+        # The base, counter and owning process are replaced together, so that threads never see a
+        # mixture of old and new.
+        self._state = (prefix << TRAIL_COUNTER_BITS, itertools.count(start), current_pid())
+        self._rollover_lock = threading.Lock()
+
+    def next_id(self):
+        state = self._state
+        if state[2] != current_pid() and self._generate_prefix:
+            return self._rollover(state)
+        count = next(state[1])
+        if count > TRAIL_COUNTER_MAX:
+            return self._rollover(state)
+        return state[0] | count
+
+    def _rollover(self, exhausted_state):
+        with self._rollover_lock:
+            # Only the first thread to notice moves the generator on to a new prefix.
+            if self._state is exhausted_state:
+                self._state = (generate_trail_prefix() << TRAIL_COUNTER_BITS,
+                               itertools.count(1),
+                               current_pid())
+        return self.next_id()
 
 
 class Trail(object):
-    next_trail = 1
-    next_trail_lock = threading.Lock()
+    id_generator = TrailIdGenerator()
 
     def __init__(self):
-        with Trail.next_trail_lock:
-            self._trail = Trail.next_trail
-            Trail.next_trail += 1
+        self._trail = Trail.id_generator.next_id()
 
     def get_trail_id(self):
         return self._trail
@@ -133,8 +583,28 @@ class TestClient(object):
     def start(self):
         pass
 
-    def stop(self):
-        pass
+    def stop(self, drain_timeout=0):
+        return {"flushed": 0, "abandoned": 0}
+
+    def wait_connected(self, timeout=None):
+        return True
+
+    def flush(self, timeout=None):
+        return {"flushed": 0, "unsent": 0}
 
     def send(self, message):
         self.message_queue.append(message)
+
+    def send_event(self, trail_id, event_id, instance_id=0, static_params=(), var_params=()):
+        # Messages sent this way are queued serialized, as they are by the real client.
+        self.message_queue.append(
+            encode_event(trail_id, event_id, instance_id, static_params, var_params))
+
+    def send_marker(self, trail_id, marker_id, instance_id=0, reactivate=True, scope=SCOPE_NONE,
+                    static_params=(), var_params=()):
+        self.message_queue.append(
+            encode_marker(trail_id, marker_id, instance_id, reactivate, scope,
+                          static_params, var_params))
+
+    def send_template(self, template, trail_id, static_params=(), var_params=()):
+        self.message_queue.append(template.encode(trail_id, static_params, var_params))
@@ -18,11 +18,63 @@ from metaswitch.sasclient.constants import (
     MESSAGE_TRAIL_ASSOCIATION,
     PROTOCOL_VERSION,
     SCOPE_NONE,
+    COMPRESS_AUTO,
     COMPRESS_ZLIB)
+from metaswitch.sasclient.compression import CompressionPolicy
 
 # The base event ID for all events specified by resource bundles.
 RESOURCE_BUNDLE_BASE = 0x0F000000
 
+# Precompiled structures for each message type.  Each covers the header together with the fixed
+# size part of the body, up to and including the length of the first variable length field, so
+# that it can all be packed in a single call.
+HEADER = struct.Struct('!hbbq')
+HEARTBEAT_HEADER = struct.Struct('!hbb')
+INIT_ENDIANNESS = struct.Struct('=i')
+TRAIL_ASSOC = struct.Struct('!hbbqqqb')
+EVENT_PREFIX = struct.Struct('!hbbqqiih')
+MARKER_PREFIX = struct.Struct('!hbbqqiibbh')
+ANALYTICS_PREFIX = struct.Struct('!hbbqqiibbh')
+STRING_LENGTH = struct.Struct('b')
+PARAM_LENGTH = struct.Struct('!h')
+
+# Static parameters are packed as a block of C ints in native byte order, as SAS expects.
+STATIC_PARAM_TYPECODE = 'i'
+STATIC_PARAM_SIZE = 4
+
+# Text, which is encoded as UTF-8 to be sent: unicode in Python 2, and str in Python 3.
+try:
+    text_type = unicode
+except NameError:
+    text_type = str
+
+# Binary parameters, which are sent as they are.  Python 3 can join and write bytearrays and
+# memoryviews without converting them to bytes first, but Python 2 can only join byte strings.
+if bytes is str:
+    BINARY_TYPES = (bytes,)
+    _BUFFER_TYPES = (bytearray, memoryview)
+else:
+    BINARY_TYPES = (bytes, bytearray, memoryview)
+    _BUFFER_TYPES = ()
+
+# Parameter values that are strings, rather than values converted to strings to be sent.
+STRING_TYPES = BINARY_TYPES + (text_type,)
+
+# Fields read back out of serialized messages: the message type, and the trail ID, which comes
+# straight after the header in every message that has one.
+RAW_MESSAGE_TYPE = struct.Struct('!3xb')
+RAW_TRAIL_ID = struct.Struct('!12xq')
+
+# Message templates pack the header and trail ID, which vary from one message to the next,
+# separately from the rest of the fixed size fields, which are packed once per template.
+TEMPLATE_HEADER = struct.Struct('!hbbqq')
+EVENT_IDS = struct.Struct('!iih')
+MARKER_IDS = struct.Struct('!iibbh')
+ANALYTICS_IDS = struct.Struct('!iibbh')
+
+# Precompiled structures for blocks of static parameters, by number of parameters.
+_static_param_structs = {}
+
 
 class Message(object):
     """
@@ -37,33 +89,57 @@ class Message(object):
     8 bytes - the timestamp of the message (in ms) (not present in heartbeat message)
 
     The body varies depending on the message type - see implementations.
+
+    Implementations serialize themselves as a list of byte strings (see serialize_parts), so that
+    parameter data is only copied once, when the parts are joined: into the serialized message, or
+    into the batch of messages that the sender writes (see MessageSender.fill).
     """
+    # Whether variable parameters are encoded and compressed by the sender rather than as they are
+    # added, and the (index, compress) pairs of those still to do (see DataMessage).
+    deferred = False
+    pending_params = None
 
     def __init__(self):
         self.timestamp = int(time.time() * 1000)
         self.msg_type = None
 
-    def serialize_header(self, body_length):
-        return struct.pack(
-            '!hbbq',
-            body_length + 12,
-            INTERFACE_VERSION,
-            self.msg_type,
-            self.timestamp)
+    def serialized_size(self):
+        """
+        The length of the serialized message, calculated without serializing it.
+        """
+        return HEADER.size
+
+    def serialize_parts(self, parts):
+        """
+        Append the serialized message to a list of byte strings. Implementations reserve a slot
+        for the header, add the body, then fill in the header once the length is known.
+        Default implementation for messages with no body.
+        :return: the length of the serialized message
+        """
+        parts.append(HEADER.pack(HEADER.size, INTERFACE_VERSION, self.msg_type, self.timestamp))
+        return HEADER.size
 
-    def serialize_body(self):
+    def serialize_into(self, buffer, offset=0):
         """
-        Default implementation for messages with no body (e.g. heartbeat).
+        Serialize the message into a writable buffer (e.g. a bytearray), which must have at least
+        serialized_size() bytes available at the given offset.
+        :return: the offset just past the end of the message
         """
-        return struct.pack('')
+        parts = []
+        self.serialize_parts(parts)
+        for part in parts:
+            end = offset + len(part)
+            buffer[offset:end] = part
+            offset = end
+        return offset
 
     def serialize(self):
         """
         Convert the python message into a serialized string conforming to the VPED protocol.
         """
-        body = self.serialize_body()
-        header = self.serialize_header(len(body))
-        return header + body
+        parts = []
+        self.serialize_parts(parts)
+        return b''.join(parts)
 
     def __str__(self):
         return "SAS Message: {0} ({1})".format(
@@ -100,14 +176,21 @@ class Init(Message):
         self.resource_version = resource_version
         self.msg_type = Init.msg_type
 
-    def serialize_body(self):
-        return ''.join([
+    def serialized_size(self):
+        return len(self.serialize())
+
+    def serialize_parts(self, parts):
+        body = b''.join([
             pack_string(self.system_name),
-            struct.pack('=i', 1),
+            INIT_ENDIANNESS.pack(1),
             pack_string(PROTOCOL_VERSION),
             pack_string(self.system_type),
             pack_string(self.resource_identifier),
             pack_string(self.resource_version)])
+        length = HEADER.size + len(body)
+        parts.append(HEADER.pack(length, INTERFACE_VERSION, self.msg_type, self.timestamp))
+        parts.append(body)
+        return length
 
     def __str__(self):
         return ("{string}\n" +
@@ -122,12 +205,282 @@ class Init(Message):
                     ver=self.resource_version)
 
 
+def message_trail_id(message):
+    """
+    :param message: A Message, or a serialized message
+    :return: the ID of the trail a message belongs to, for choosing which connection
+             to send it on, or sampling whole trails
+    """
+    if isinstance(message, bytes):
+        return RAW_TRAIL_ID.unpack_from(message)[0] if len(message) >= RAW_TRAIL_ID.size else 0
+    trail_id = getattr(message, 'trail_id', None)
+    if trail_id is None:
+        trail_id = getattr(message, 'trail_a_id', 0)
+    return trail_id
+
+
+def message_type(message):
+    """
+    :param message: A Message, or a serialized message
+    :return: the message type
+    """
+    if isinstance(message, bytes):
+        return RAW_MESSAGE_TYPE.unpack_from(message)[0]
+    return message.msg_type
+
+
+def serialized(message, compression_policy=None):
+    """
+    :param message: A Message, or a serialized message
+    :param compression_policy: The CompressionPolicy for parameters added with COMPRESS_AUTO
+    :return: the serialized message
+    """
+    if isinstance(message, bytes):
+        return message
+    if message.pending_params:
+        message.encode_params(compression_policy)
+    return message.serialize()
+
+
+def static_param_struct(count):
+    """
+    :return: a Struct that packs count static parameters as DataMessage does
+    """
+    packer = _static_param_structs.get(count)
+    if packer is None:
+        packer = struct.Struct('={}{}'.format(count, STATIC_PARAM_TYPECODE))
+        _static_param_structs[count] = packer
+    return packer
+
+
+def pack_static_params(static_params):
+    """
+    Pack static parameters as a block of C ints, with a structure precompiled for their number.
+    """
+    if not static_params:
+        return b''
+    return static_param_struct(len(static_params)).pack(*static_params)
+
+
+def pack_var_params(parts, var_params):
+    """
+    Append variable parameters, each preceded by its length, to a list of byte strings.
+    :return: the length of the data added
+    """
+    length = PARAM_LENGTH.size * len(var_params)
+    pack_length = PARAM_LENGTH.pack
+    for var_param in var_params:
+        if type(var_param) is not bytes:
+            var_param = encode(var_param)
+        parts.append(pack_length(len(var_param)))
+        parts.append(var_param)
+        length += len(var_param)
+    return length
+
+
+def encode_event(trail_id, event_id, instance_id=0, static_params=(), var_params=(),
+                 timestamp=None):
+    """
+    Serialize an Event straight from its fields, without building an Event.  The result is the
+    same as Event(...).serialize().
+    :param timestamp: The time of the event in milliseconds.  Defaults to now.
+    """
+    if timestamp is None:
+        timestamp = int(time.time() * 1000)
+    static_data = pack_static_params(static_params)
+    parts = [None, static_data]
+    length = EVENT_PREFIX.size + len(static_data) + pack_var_params(parts, var_params)
+    parts[0] = EVENT_PREFIX.pack(length,
+                                 INTERFACE_VERSION,
+                                 MESSAGE_EVENT,
+                                 timestamp,
+                                 trail_id,
+                                 event_id | RESOURCE_BUNDLE_BASE,
+                                 instance_id,
+                                 len(static_data))
+    return b''.join(parts)
+
+
+def encode_marker(trail_id, marker_id, instance_id=0, reactivate=True, scope=SCOPE_NONE,
+                  static_params=(), var_params=(), timestamp=None):
+    """
+    Serialize a Marker straight from its fields, without building a Marker.  The result is the
+    same as Marker(...).serialize().
+    :param timestamp: The time of the marker in milliseconds.  Defaults to now.
+    """
+    if timestamp is None:
+        timestamp = int(time.time() * 1000)
+    flags = 0
+    if scope != SCOPE_NONE:
+        flags |= FLAG_ASSOCIATE
+        if not reactivate:
+            flags |= FLAG_NO_REACTIVATE
+    static_data = pack_static_params(static_params)
+    parts = [None, static_data]
+    length = MARKER_PREFIX.size + len(static_data) + pack_var_params(parts, var_params)
+    parts[0] = MARKER_PREFIX.pack(length,
+                                  INTERFACE_VERSION,
+                                  MESSAGE_MARKER,
+                                  timestamp,
+                                  trail_id,
+                                  marker_id,
+                                  instance_id,
+                                  flags,
+                                  scope,
+                                  len(static_data))
+    return b''.join(parts)
+
+
+class MessageTemplate(object):
+    """
+    The encoding of a kind of message sent repeatedly from one place in the code, with the same
+    IDs and numbers of parameters each time.  Everything but the timestamp, trail ID and parameter
+    values is packed once, when the template is created, so encoding a message from a template
+    is cheaper still than encode_event or encode_marker.  Send the result with
+    Client.send_template.
+
+    The fixed part of the body follows the trail ID, and runs up to and including the length of the
+    static parameters.  See the implementations.
+    """
+    msg_type = None
+
+    def __init__(self, fixed_body, n_static, n_var):
+        """
+        :param fixed_body: The packed fields between the trail ID and the static parameters
+        :param n_static: The number of static parameters each message has
+        :param n_var: The number of variable parameters each message has
+        """
+        self.n_static = n_static
+        self.n_var = n_var
+        self._fixed_body = fixed_body
+        self._static_struct = static_param_struct(n_static)
+        self._fixed_length = (TEMPLATE_HEADER.size + len(fixed_body) +
+                              self._static_struct.size + PARAM_LENGTH.size * n_var)
+
+    def encode(self, trail_id, static_params=(), var_params=(), timestamp=None):
+        """
+        Serialize a message from the template.
+        :param trail_id: The ID of the trail (from Trail.get_trail_id())
+        :param static_params: Sequence of n_static integer parameters
+        :param var_params: Sequence of n_var string parameters
+        :param timestamp: The time of the message in milliseconds.  Defaults to now.
+        :return: the serialized message
+        """
+        if len(var_params) != self.n_var:
+            raise ValueError("Expecting {} variable parameters, got {}".format(
+                self.n_var, len(var_params)))
+        if timestamp is None:
+            timestamp = int(time.time() * 1000)
+
+        # struct.error is raised if the number of static parameters is wrong.
+        parts = [None, self._fixed_body, self._static_struct.pack(*static_params)]
+        length = self._fixed_length
+        pack_length = PARAM_LENGTH.pack
+        for var_param in var_params:
+            if type(var_param) is not bytes:
+                var_param = encode(var_param)
+            parts.append(pack_length(len(var_param)))
+            parts.append(var_param)
+            length += len(var_param)
+        parts[0] = TEMPLATE_HEADER.pack(length, INTERFACE_VERSION, self.msg_type, timestamp,
+                                        trail_id)
+        return b''.join(parts)
+
+
+class EventTemplate(MessageTemplate):
+    """
+    Template for Events.  EventTemplate(...).encode(trail_id, ...) gives the same result as
+    Event(trail, event_id, instance_id, ...).serialize().
+    """
+    msg_type = MESSAGE_EVENT
+
+    def __init__(self, event_id, instance_id=0, n_static=0, n_var=0):
+        super(EventTemplate, self).__init__(
+            EVENT_IDS.pack(event_id | RESOURCE_BUNDLE_BASE,
+                           instance_id,
+                           STATIC_PARAM_SIZE * n_static),
+            n_static,
+            n_var)
+        self.event_id = event_id
+        self.instance_id = instance_id
+
+
+class MarkerTemplate(MessageTemplate):
+    """
+    Template for Markers, giving the same result as the equivalent Marker.
+    """
+    msg_type = MESSAGE_MARKER
+
+    def __init__(self, marker_id, instance_id=0, reactivate=True, scope=SCOPE_NONE, n_static=0,
+                 n_var=0):
+        flags = 0
+        if scope != SCOPE_NONE:
+            flags |= FLAG_ASSOCIATE
+            if not reactivate:
+                flags |= FLAG_NO_REACTIVATE
+        super(MarkerTemplate, self).__init__(
+            MARKER_IDS.pack(marker_id,
+                            instance_id,
+                            flags,
+                            scope,
+                            STATIC_PARAM_SIZE * n_static),
+            n_static,
+            n_var)
+        self.marker_id = marker_id
+        self.instance_id = instance_id
+
+
+class AnalyticsTemplate(MessageTemplate):
+    """
+    Template for Analytics messages, giving the same result as the equivalent Analytics message.
+    The source type and friendly ID are part of the template.
+    """
+    msg_type = MESSAGE_ANALYTICS
+
+    def __init__(self, format_type, source_type, friendly_id, store_event=False, event_id=0,
+                 instance_id=0, n_static=0, n_var=0):
+        source_type = encode(source_type)
+        friendly_id = encode(friendly_id)
+        super(AnalyticsTemplate, self).__init__(
+            b''.join([ANALYTICS_IDS.pack(event_id | RESOURCE_BUNDLE_BASE,
+                                         instance_id,
+                                         format_type,
+                                         store_event,
+                                         len(source_type)),
+                      source_type,
+                      PARAM_LENGTH.pack(len(friendly_id)),
+                      friendly_id,
+                      PARAM_LENGTH.pack(STATIC_PARAM_SIZE * n_static)]),
+            n_static,
+            n_var)
+        self.event_id = event_id
+        self.instance_id = instance_id
+
+
+def encode(value):
+    """
+    Convert a value to bytes to send.  Binary values (see BINARY_TYPES) are returned as they are,
+    without copying, text is encoded as UTF-8, and anything else is converted to text first.
+    """
+    if isinstance(value, BINARY_TYPES):
+        if type(value) is memoryview and value.itemsize != 1:
+            # Only a view of bytes has a length in bytes.
+            return value.tobytes()
+        return value
+    if isinstance(value, text_type):
+        return value.encode('UTF-8')
+    if isinstance(value, _BUFFER_TYPES):
+        return bytes(value) if type(value) is bytearray else value.tobytes()
+    value = str(value)
+    return value if type(value) is bytes else value.encode('UTF-8')
+
+
 def pack_string(string):
     """
     Pack a string with its length.
     """
-    data = string.encode('UTF-8') if isinstance(string, unicode) else str(string)
-    return struct.pack('b', len(data)) + data
+    data = encode(string)
+    return STRING_LENGTH.pack(len(data)) + data
 
 
 class TrailAssoc(Message):
@@ -147,8 +500,19 @@ class TrailAssoc(Message):
         self.scope = scope
         self.msg_type = TrailAssoc.msg_type
 
-    def serialize_body(self):
-        return struct.pack('!qqb', self.trail_a_id, self.trail_b_id, self.scope)
+    def serialized_size(self):
+        return TRAIL_ASSOC.size
+
+    def serialize_parts(self, parts):
+        parts.append(TRAIL_ASSOC.pack(
+            TRAIL_ASSOC.size,
+            INTERFACE_VERSION,
+            self.msg_type,
+            self.timestamp,
+            self.trail_a_id,
+            self.trail_b_id,
+            self.scope))
+        return TRAIL_ASSOC.size
 
     def __str__(self):
         return ("{string}\n" +
@@ -172,29 +536,62 @@ class DataMessage(Message):
     2 + n bytes - variable length parameter 1 (+ length)
     2 + n bytes - variable length parameter 2 (+ length)
     ...etc.
+
+    The static parameters are held in a list, and packed in one go when the message is
+    serialized. The length of the static parameters is packed by the subclass along with its fixed
+    size fields.
+
+    Variable parameters are normally encoded (and compressed) as they are added.  A deferred
+    message instead keeps the parameters as they are given, for the sender thread to encode and
+    compress just before writing the message (see encode_params), so that adding a large parameter
+    costs the application no more than an append, and messages discarded from the queue are never
+    encoded at all.  Parameters added with COMPRESS_AUTO are also compressed by the client.
     """
-    def __init__(self, static_params, var_params):
+    prefix = None
+    # The (index, value) pairs of variable parameters that weren't strings, and were converted, so
+    # that a ResourceBundle can still reject them once they have been encoded.
+    converted_params = None
+
+    def __init__(self, static_params, var_params, deferred=False):
         super(DataMessage, self).__init__()
-        self.static_params = static_params[:]
+        self.deferred = deferred
+        self.static_params = list(static_params)
         self.var_params = []
         self.add_variable_params(var_params)
 
-    def serialize_params(self):
-        static_data = ''.join(
-            [struct.pack('=i', static_param) for static_param in self.static_params])
-        static_data = struct.pack('!h', len(static_data)) + static_data
-
-        var_data = ''.join([
-            struct.pack('!h', len(var_param)) + var_param
-            for var_param in self.var_params])
+    def serialized_size(self):
+        """
+        The length of the serialized message.  For a message with parameters yet to be encoded,
+        this is an estimate, taking each parameter's length as it is now.
+        """
+        return (self.prefix.size +
+                STATIC_PARAM_SIZE * len(self.static_params) +
+                PARAM_LENGTH.size * len(self.var_params) +
+                sum(len(var_param) for var_param in self.var_params))
 
-        return static_data + var_data
+    def serialize_params_parts(self, parts, static_data):
+        """
+        Append the static parameter data (whose length has already been packed) and the length
+        prefixed variable parameters to the list of parts.
+        :return: the length of the data added
+        """
+        if self.pending_params:
+            self.encode_params()
+        if static_data:
+            parts.append(static_data)
+        length = len(static_data)
+        pack_length = PARAM_LENGTH.pack
+        for var_param in self.var_params:
+            parts.append(pack_length(len(var_param)))
+            parts.append(var_param)
+            length += PARAM_LENGTH.size + len(var_param)
+        return length
 
     # Fluent interfaces to add params
     def add_static_params(self, static_params):
         if not isinstance(static_params, list):
             raise TypeError("Expecting a list")
-        self.static_params += static_params
+        self.static_params.extend(static_params)
         return self
 
     def add_static_param(self, static_param):
@@ -208,18 +605,69 @@ class DataMessage(Message):
         return self
 
     def add_variable_param(self, var_param, compress=None):
-        enc_value = var_param.encode('UTF-8') if isinstance(var_param, unicode) else str(var_param)
-
+        """
+        :param compress: None, COMPRESS_ZLIB, COMPRESS_AUTO, or a CompressionPolicy to compress
+                         the parameter with
+        :return: self, for fluent interface
+        """
+        if (compress is not None and compress not in (COMPRESS_ZLIB, COMPRESS_AUTO) and
+                not isinstance(compress, CompressionPolicy)):
+            # Unrecognised compression type
+            raise ValueError("Unrecognised compression type: {}".format(compress))
+        if not isinstance(var_param, STRING_TYPES):
+            if self.converted_params is None:
+                self.converted_params = []
+            self.converted_params.append((len(self.var_params), var_param))
+
+        if compress is None and not self.deferred:
+            self.var_params.append(encode(var_param))
+            return self
+
+        if self.deferred or compress == COMPRESS_AUTO:
+            # Leave the parameter for encode_params.
+            if self.pending_params is None:
+                self.pending_params = []
+            self.pending_params.append((len(self.var_params), compress))
+            if not self.deferred or not isinstance(var_param, BINARY_TYPES + (text_type,)):
+                # Only strings are worth deferring, and they can be measured as they are.
+                var_param = encode(var_param)
+            self.var_params.append(var_param)
+            return self
+
+        enc_value = encode(var_param)
         if compress == COMPRESS_ZLIB:
             # Compress with zlib
             enc_value = zlib.compress(enc_value)
-        elif compress is not None:
-            # Unrecognised compression type
-            raise ValueError("Unrecognised compression type: {}".format(compress))
+        else:
+            enc_value = compress.compress(enc_value)
 
         self.var_params.append(enc_value)
         return self
 
+    def encode_params(self, policy=None):
+        """
+        Encode and compress the variable parameters left to be done as the message is sent.
+        :param policy: The client's CompressionPolicy, for parameters added with COMPRESS_AUTO.
+                       Without one, they are encoded but left uncompressed, and still to do.
+        """
+        remaining = None
+        for index, compress in self.pending_params:
+            value = self.var_params[index]
+            if type(value) is not bytes:
+                value = encode(value)
+            if compress == COMPRESS_ZLIB:
+                value = zlib.compress(value)
+            elif compress == COMPRESS_AUTO:
+                if policy is not None:
+                    value = policy.compress(value)
+                else:
+                    remaining = remaining or []
+                    remaining.append((index, compress))
+            elif compress is not None:
+                value = compress.compress(value)
+            self.var_params[index] = value
+        self.pending_params = remaining
+
     def __str__(self):
         return ("{string}\n" +
                 "   Static parameters: {static_params}\n" +
@@ -240,27 +688,35 @@ class Event(DataMessage):
     static and variable params (see above)
     """
     msg_type = MESSAGE_EVENT
+    prefix = EVENT_PREFIX
 
-    def __init__(self, trail, event_id, instance_id=0, static_params=None, var_params=None):
+    def __init__(self, trail, event_id, instance_id=0, static_params=None, var_params=None,
+                 deferred=False):
         if var_params is None:
             var_params = []
         if static_params is None:
             static_params = []
-        super(Event, self).__init__(static_params, var_params)
+        super(Event, self).__init__(static_params, var_params, deferred)
         self.trail_id = trail.get_trail_id()
         self.event_id = event_id
         self.instance_id = instance_id
         self.msg_type = Event.msg_type
 
-    def serialize_body(self):
-        return self.serialize_event_headers() + self.serialize_params()
-
-    def serialize_event_headers(self):
-        """Serialise the headers that are specific to Events"""
-        return struct.pack(
-            '!qii', self.trail_id,
+    def serialize_parts(self, parts):
+        static_data = pack_static_params(self.static_params)
+        index = len(parts)
+        parts.append(None)
+        length = EVENT_PREFIX.size + self.serialize_params_parts(parts, static_data)
+        parts[index] = EVENT_PREFIX.pack(
+            length,
+            INTERFACE_VERSION,
+            self.msg_type,
+            self.timestamp,
+            self.trail_id,
             self.event_id | RESOURCE_BUNDLE_BASE,
-            self.instance_id)
+            self.instance_id,
+            len(static_data))
+        return length
 
     def set_instance_id(self, instance_id):
         """
@@ -293,6 +749,7 @@ class Marker(DataMessage):
     1 byte - scope, either SCOPE_NONE, SCOPE_BRANCH or SCOPE_TRACE
     """
     msg_type = MESSAGE_MARKER
+    prefix = MARKER_PREFIX
 
     def __init__(
             self,
@@ -302,12 +759,13 @@ class Marker(DataMessage):
             reactivate=True,
             scope=SCOPE_NONE,
             static_params=None,
-            var_params=None):
+            var_params=None,
+            deferred=False):
         if var_params is None:
             var_params = []
         if static_params is None:
             static_params = []
-        super(Marker, self).__init__(static_params, var_params)
+        super(Marker, self).__init__(static_params, var_params, deferred)
         self.trail_id = trail.get_trail_id()
         self.marker_id = marker_id
         self.instance_id = instance_id
@@ -315,19 +773,28 @@ class Marker(DataMessage):
         self.scope = scope
         self.msg_type = Marker.msg_type
 
-    def serialize_body(self):
+    def serialize_parts(self, parts):
         flags = 0
         if self.scope != SCOPE_NONE:
             flags |= FLAG_ASSOCIATE
             if not self.reactivate:
                 flags |= FLAG_NO_REACTIVATE
-        return struct.pack(
-            '!qiibb',
+        static_data = pack_static_params(self.static_params)
+        index = len(parts)
+        parts.append(None)
+        length = MARKER_PREFIX.size + self.serialize_params_parts(parts, static_data)
+        parts[index] = MARKER_PREFIX.pack(
+            length,
+            INTERFACE_VERSION,
+            self.msg_type,
+            self.timestamp,
             self.trail_id,
             self.marker_id,
             self.instance_id,
             flags,
-            self.scope) + self.serialize_params()
+            self.scope,
+            len(static_data))
+        return length
 
     def set_association_scope(self, scope):
         """
@@ -387,6 +854,7 @@ class Analytics(Event):
     FORMAT_XML = 2
 
     msg_type = MESSAGE_ANALYTICS
+    prefix = ANALYTICS_PREFIX
 
     def __init__(self,
                  trail,
@@ -397,13 +865,15 @@ class Analytics(Event):
                  event_id=0,
                  inst_id=0,
                  static_params=None,
-                 var_params=None):
+                 var_params=None,
+                 deferred=False):
 
         super(Analytics, self).__init__(trail,
                                         event_id,
                                         inst_id,
                                         static_params,
-                                        var_params)
+                                        var_params,
+                                        deferred)
         self.trail = trail
         self.format_type = format_type
         self.source_type = source_type
@@ -411,17 +881,54 @@ class Analytics(Event):
         self.store_event = store_event
         self.msg_type = Analytics.msg_type
 
-    def serialize_event_headers(self):
-        # The initial headers are the same as for Events so call into the
-        # superclass method.
-        analytics_headers = super(Analytics, self).serialize_event_headers()
+        # The source type and friendly ID, and their encodings (see _encoded_strings).
+        self._encoded = None
 
-        # Now add Analytics specific headers
-        analytics_headers += struct.pack('!bb',
-                                         self.format_type, self.store_event)
-        analytics_headers += struct.pack('!h', len(self.source_type)) + str(self.source_type)
-        analytics_headers += struct.pack('!h', len(self.friendly_id)) + str(self.friendly_id)
-        return analytics_headers
+    def _encoded_strings(self):
+        """
+        :return: the source type and friendly ID, encoded.  The encodings are kept, rather than
+                 redone each time the message is serialized, until either attribute is changed.
+        """
+        encoded = self._encoded
+        if (encoded is None or encoded[0] is not self.source_type or
+                encoded[1] is not self.friendly_id):
+            encoded = (self.source_type, self.friendly_id,
+                       encode(self.source_type), encode(self.friendly_id))
+            self._encoded = encoded
+        return encoded[2], encoded[3]
+
+    def serialized_size(self):
+        source_type, friendly_id = self._encoded_strings()
+        return (super(Analytics, self).serialized_size() +
+                2 * PARAM_LENGTH.size +
+                len(source_type) +
+                len(friendly_id))
+
+    def serialize_parts(self, parts):
+        # The fixed size headers are the same as for Events, plus the format type and store flag,
+        # followed by the source type and friendly ID strings.
+        source_type, friendly_id = self._encoded_strings()
+        static_data = pack_static_params(self.static_params)
+        index = len(parts)
+        parts.append(None)
+        parts.append(source_type)
+        parts.append(PARAM_LENGTH.pack(len(friendly_id)) + friendly_id +
+                     PARAM_LENGTH.pack(len(static_data)))
+        length = (ANALYTICS_PREFIX.size + len(source_type) +
+                  2 * PARAM_LENGTH.size + len(friendly_id) +
+                  self.serialize_params_parts(parts, static_data))
+        parts[index] = ANALYTICS_PREFIX.pack(
+            length,
+            INTERFACE_VERSION,
+            self.msg_type,
+            self.timestamp,
+            self.trail_id,
+            self.event_id | RESOURCE_BUNDLE_BASE,
+            self.instance_id,
+            self.format_type,
+            self.store_event,
+            len(source_type))
+        return length
 
     def get_format_type(self):
         format_str = "Unknown"
@@ -457,8 +964,12 @@ class Heartbeat(Message):
         super(Heartbeat, self).__init__()
         self.msg_type = Heartbeat.msg_type
 
-    def serialize_header(self, body_length):
-        return struct.pack('!hbb', body_length + 4, INTERFACE_VERSION, self.msg_type)
+    def serialized_size(self):
+        return HEARTBEAT_HEADER.size
+
+    def serialize_parts(self, parts):
+        parts.append(HEARTBEAT_HEADER.pack(HEARTBEAT_HEADER.size, INTERFACE_VERSION, self.msg_type))
+        return HEARTBEAT_HEADER.size
 
     def __str__(self):
         return "SAS Heartbeat"
@@ -0,0 +1,280 @@
+# @file msgbuffer.py
+# Copyright (C) 2015  Metaswitch Networks Ltd
+
+import collections
+import threading
+import time
+
+from metaswitch.sasclient import overflow
+from metaswitch.sasclient.stats import Histogram
+
+# Timing every message's wait on the queue would add noticeably to the cost of a put and pop, so
+# only one in this many (a power of two) is timed.
+WAIT_SAMPLE_INTERVAL = 16
+
+
+class MessageBuffer(object):
+    """
+    Bounded buffer of messages waiting to be sent to SAS, shared by any number of producer threads
+    and a single consumer (the MessageSender).
+
+    This replaces Queue.Queue, which takes a mutex and signals condition variables on every put and
+    get, and tracks unfinished tasks that nothing waits on. Here, producers hold a plain lock just
+    long enough to check the bound and append, and only signal the consumer if it is asleep, so a
+    burst of messages costs a single wakeup. The consumer takes messages off without the lock, as
+    deque operations are atomic.
+
+    The buffer is bounded either by the number of messages it holds, or (given max_bytes) by their
+    total serialized size, measured as each message is put.  Messages may be Message objects, or
+    already serialized.  Each entry on the deque is a tuple of
+    (message, enqueue time, size), where the size is 1 if the buffer is bounded by message count.
+    Producers total the size of what is put, and the consumer of what is taken, separately, so that
+    the consumer still doesn't need the lock.
+
+    What happens when the buffer is full is up to its overflow policy (see the overflow module).
+
+    The buffer keeps statistics as it goes: the number of items put, and discarded or delayed by the
+    overflow policy, the most it has held, and how long (a sample of) items wait before the consumer
+    takes them.
+    """
+
+    def __init__(self, maxsize, policy=None, max_bytes=None):
+        """
+        :param maxsize: The maximum number of messages to hold, unless max_bytes is given
+        :param policy: The overflow policy.  Defaults to overflow.DropNewest()
+        :param max_bytes: The maximum total serialized size of the messages to hold
+        """
+        self._max_bytes = max_bytes
+        self._limit = max_bytes if max_bytes is not None else maxsize
+        self._items = collections.deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Event()
+        self._consumer_waiting = False
+        self._woken = False
+
+        self.policy = policy if policy is not None else overflow.DropNewest()
+        self._pressure_limit = self.policy.pressure_depth(self._limit)
+        self._not_full = threading.Condition(self._lock)
+        self._producers_waiting = 0
+
+        # The total size of the items put (updated under the lock), taken by the consumer, and
+        # discarded from the buffer (under the lock).
+        self._size_in = 0
+        self._size_out = 0
+        self._size_dropped = 0
+
+        # Updated under the lock by producers
+        self.put_count = 0
+        self.rejected = 0
+        self.evicted = 0
+        self.sampled_out = 0
+        self.blocked = 0
+        self.high_water = 0
+        self.bytes_high_water = 0
+
+        # Updated by the consumer
+        self.wait_latency = Histogram()
+
+    def put(self, item):
+        """
+        Add an item to the buffer.  This doesn't block, unless the buffer is full and the overflow
+        policy says to wait for room.
+        :return: True if the item was added without discarding anything, False if the item, or one
+                 already in the buffer, was discarded
+        """
+        size = 1
+        if self._max_bytes is not None:
+            size = len(item) if isinstance(item, bytes) else item.serialized_size()
+        with self._lock:
+            evicted = self.evicted
+            used = self._size_in - self._size_out - self._size_dropped
+            if used + size > self._pressure_limit and not self._overflow(item, size):
+                return False
+
+            if self.put_count & (WAIT_SAMPLE_INTERVAL - 1):
+                self._items.append((item, None, size))
+            else:
+                self._items.append((item, time.time(), size))
+            self.put_count += 1
+            self._size_in += size
+            depth = len(self._items)
+            if depth > self.high_water:
+                self.high_water = depth
+            if used + size > self.bytes_high_water and self._max_bytes is not None:
+                self.bytes_high_water = self.used()
+            wake = self._consumer_waiting
+            self._consumer_waiting = False
+
+        if wake:
+            self._not_empty.set()
+        return self.evicted == evicted
+
+    def _overflow(self, item, size):
+        """
+        Consult the overflow policy about an item that would take the buffer past its pressure
+        limit.  Called with the lock held.
+        :return: whether to add the item
+        """
+        if size > self._limit:
+            # This message would never fit.
+            self.rejected += 1
+            return False
+
+        while self.used() + size > self._pressure_limit:
+            action = self.policy.overflow(self, item, self.used() + size > self._limit)
+            if action == overflow.ADMIT:
+                break
+            elif action == overflow.WAIT:
+                self.blocked += 1
+                action = self._wait_for_room(size, self.policy.timeout)
+            if action == overflow.REJECT:
+                self.rejected += 1
+                return False
+            elif action == overflow.SAMPLE_OUT:
+                self.sampled_out += 1
+                return False
+        return True
+
+    def used(self):
+        """
+        :return: how much of the buffer's limit is in use: the number of messages held, or their
+                 total size if the buffer is bounded by bytes
+        """
+        return self._size_in - self._size_out - self._size_dropped
+
+    def queued_bytes(self):
+        """
+        :return: the total serialized size of the messages held, or 0 if the buffer is bounded by
+                 message count (and so doesn't measure messages)
+        """
+        return self.used() if self._max_bytes is not None else 0
+
+    def evict_oldest(self):
+        """
+        For overflow policies: discard the oldest item.  Must be called with the lock held.
+        :return: whether there was an item to discard
+        """
+        try:
+            entry = self._items.popleft()
+        except IndexError:
+            return False
+        self._size_dropped += entry[2]
+        self.evicted += 1
+        return True
+
+    def evict_first(self, condition):
+        """
+        For overflow policies: discard the oldest item for which condition(item) is true.  Must be
+        called with the lock held.
+        :return: False if no item matched, otherwise True (including if the consumer took items
+                 while we were looking, which has made room)
+        """
+        try:
+            for entry in self._items:
+                if condition(entry[0]):
+                    break
+            else:
+                return False
+            self._items.remove(entry)
+        except (RuntimeError, ValueError):
+            # The consumer took items off while we were looking.
+            return True
+        self._size_dropped += entry[2]
+        self.evicted += 1
+        return True
+
+    def _wait_for_room(self, size, timeout):
+        """
+        Wait, with the lock held, for the consumer to make room in the buffer.
+        :return: ADMIT if there is room, or REJECT if there still isn't after the timeout
+        """
+        deadline = time.time() + timeout
+        self._producers_waiting += 1
+        try:
+            while self.used() + size > self._limit:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return overflow.REJECT
+                self._not_full.wait(remaining)
+        finally:
+            self._producers_waiting -= 1
+        return overflow.ADMIT
+
+    def _notify_not_full(self):
+        with self._lock:
+            self._not_full.notify_all()
+
+    def pop(self):
+        """
+        Take the oldest item from the buffer, without blocking.
+        :return: the item, or None if the buffer is empty
+        """
+        try:
+            item, enqueued, size = self._items.popleft()
+        except IndexError:
+            return None
+        self._size_out += size
+        if enqueued is not None:
+            self.wait_latency.record(time.time() - enqueued)
+        if self._producers_waiting:
+            self._notify_not_full()
+        return item
+
+    def get(self, timeout):
+        """
+        Take the oldest item from the buffer, waiting up to timeout seconds for one to arrive.
+        Must only be called from the consumer thread.
+        :return: the item, or None if the buffer is still empty after the timeout
+        """
+        item = self.pop()
+        if item is not None:
+            return item
+
+        with self._lock:
+            waiting = not self._items and not self._woken
+            self._woken = False
+            if waiting:
+                self._not_empty.clear()
+                self._consumer_waiting = True
+
+        if waiting:
+            self._not_empty.wait(timeout)
+            self._consumer_waiting = False
+        return self.pop()
+
+    def wake(self):
+        """
+        Wake the consumer if it is waiting in get, or if it isn't, stop it waiting next time.
+        """
+        with self._lock:
+            self._woken = True
+            self._consumer_waiting = False
+        self._not_empty.set()
+
+    def clear(self):
+        """
+        Discard everything in the buffer.  Must only be called from the consumer thread.
+        :return: the number of items discarded
+        """
+        discarded = 0
+        with self._lock:
+            while self._items:
+                self._size_dropped += self._items.popleft()[2]
+                discarded += 1
+            self._not_full.notify_all()
+        return discarded
+
+    def removed(self):
+        """
+        :return: the number of items that have left the buffer, whether taken by the consumer or
+                 discarded.  Items leave in the order they were put, apart from those evicted by
+                 an overflow policy.
+        """
+        with self._lock:
+            return self.put_count - len(self._items)
+
+    def empty(self):
+        return not self._items
+
+    def __len__(self):
+        return len(self._items)
@@ -0,0 +1,167 @@
+# @file outgoing.py
+# Copyright (C) 2015  Metaswitch Networks Ltd
+
+import bisect
+import collections
+import itertools
+
+# The maximum number of buffers to pass to a single sendmsg call.  Linux rejects more than IOV_MAX
+# (1024) buffers.
+MAX_IOVECS = 1024
+
+
+class OutgoingBuffer(object):
+    """
+    Serialized messages waiting to be written to a non-blocking socket, and how far the writes
+    have got through them.
+
+    Messages are added in chunks (typically a batch taken off the queue at once), and only dropped
+    from the buffer once they have been written completely.  If the connection fails part way
+    through a message, rewind() goes back to the start of it, so that it can be sent whole on the
+    next connection rather than leaving half of it on the old one.
+
+    Chunks of data that only mean something on the connection they are written to (Init messages,
+    heartbeats), or that are accounted for elsewhere (spooled messages being replayed), aren't
+    counted as messages.  Only the buffer's owner may use it.
+    """
+
+    def __init__(self):
+        # The chunks not yet completely written, as (data, ends, counted) tuples, where ends lists
+        # the offset in data of the end of each message.
+        self._chunks = collections.deque()
+
+        # How many bytes, and whole messages, of the first chunk have been written
+        self._offset = 0
+        self._completed = 0
+
+        self._bytes = 0
+        self._count = 0
+
+    def __len__(self):
+        """
+        :return: the number of counted messages not yet completely written
+        """
+        return self._count
+
+    def __nonzero__(self):
+        return bool(self._chunks)
+
+    __bool__ = __nonzero__
+
+    def unwritten_bytes(self):
+        """
+        :return: the number of bytes still to be written
+        """
+        return self._bytes
+
+    def append(self, data, ends=None, counted=True):
+        """
+        Add a chunk of serialized messages to the end of the buffer.
+        :param data: The serialized messages
+        :param ends: List of the offset in data of the end of each message, if there is more than
+                     one
+        :param counted: Whether the messages are counted
+        """
+        if ends is None:
+            ends = [len(data)]
+        self._chunks.append((data, ends, counted))
+        self._bytes += len(data)
+        if counted:
+            self._count += len(ends)
+
+    def prepend(self, data):
+        """
+        Add a message, which isn't counted, to the front of the buffer, to be written before
+        anything else.  Only allowed when nothing is partially written, e.g. after rewind().
+        """
+        assert not self._offset
+        self._chunks.appendleft((data, [len(data)], False))
+        self._bytes += len(data)
+
+    def write(self, sock):
+        """
+        Write as much of the buffer as the socket will take in one call.  Uses sendmsg (writev)
+        to write several chunks at once where the platform supports it.
+        :return: the number of bytes written, and the number of counted messages completed
+        :raises socket.error: if the write fails, including with EAGAIN or EWOULDBLOCK if the
+                              socket can't take any more data
+        """
+        data = self._chunks[0][0]
+        if self._offset:
+            data = memoryview(data)[self._offset:]
+        if len(self._chunks) > 1 and hasattr(sock, 'sendmsg'):
+            buffers = [data]
+            buffers.extend(chunk[0] for chunk in itertools.islice(self._chunks, 1, MAX_IOVECS))
+            sent = sock.sendmsg(buffers)
+        else:
+            sent = sock.send(data)
+        return sent, self._advance(sent)
+
+    def _advance(self, sent):
+        """
+        Move past sent bytes, dropping any chunks that are now completely written.
+        :return: the number of counted messages completed
+        """
+        self._bytes -= sent
+        completed = 0
+        while sent:
+            data, ends, counted = self._chunks[0]
+            remaining = len(data) - self._offset
+            if sent < remaining:
+                self._offset += sent
+                if counted:
+                    done = bisect.bisect_right(ends, self._offset)
+                    completed += done - self._completed
+                    self._completed = done
+                break
+
+            sent -= remaining
+            self._chunks.popleft()
+            if counted:
+                completed += len(ends) - self._completed
+            self._offset = 0
+            self._completed = 0
+
+        self._count -= completed
+        return completed
+
+    def rewind(self):
+        """
+        Go back to the start of the first message that hasn't been completely written, after the
+        connection has failed.  Chunks that aren't counted are dropped from the front of the
+        buffer, as there is no point writing them on another connection.
+        """
+        while self._chunks and not self._chunks[0][2]:
+            self._bytes -= len(self._chunks.popleft()[0]) - self._offset
+            self._offset = 0
+
+        if self._offset:
+            data, ends, _ = self._chunks.popleft()
+            start = ends[self._completed - 1] if self._completed else 0
+            self._chunks.appendleft(
+                (data[start:], [end - start for end in ends[self._completed:]], True))
+            self._bytes += self._offset - start
+        self._offset = 0
+        self._completed = 0
+
+    def take(self):
+        """
+        Rewind and empty the buffer.
+        :return: the data of the counted messages that hadn't been completely written, joined,
+                 and the number of them
+        """
+        self.rewind()
+        data = b''.join(chunk[0] for chunk in self._chunks if chunk[2])
+        count = self._count
+        self.clear()
+        return data, count
+
+    def clear(self):
+        """
+        Drop everything in the buffer.
+        """
+        self._chunks.clear()
+        self._offset = 0
+        self._completed = 0
+        self._bytes = 0
+        self._count = 0
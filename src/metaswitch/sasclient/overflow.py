@@ -0,0 +1,131 @@
+# @file overflow.py
+# Copyright (C) 2015  Metaswitch Networks Ltd
+
+"""
+Policies deciding what happens to messages sent while the queue is full.
+
+A MessageBuffer consults its policy, holding its lock, whenever a new message would take it past
+the policy's pressure_depth (a number of messages, or bytes if the buffer has a byte budget).  The
+policy's overflow method returns one of the actions below, and may discard queued messages (using
+the buffer's evict methods) to make room.
+"""
+
+from metaswitch.sasclient.constants import MESSAGE_MARKER, MESSAGE_TRAIL_ASSOCIATION
+from metaswitch.sasclient.messages import message_trail_id, message_type
+
+# Add the new message.
+ADMIT = 'admit'
+# Check again whether the new message fits, the policy having discarded a queued message to make
+# room.
+EVICT = 'evict'
+# Discard the new message.
+REJECT = 'reject'
+# Discard the new message, as its trail isn't in the sample.
+SAMPLE_OUT = 'sample_out'
+# Wait for room on the queue, for up to the policy's timeout.
+WAIT = 'wait'
+
+# Message types that the Priority policy keeps in preference to others: Markers (which start, end
+# and correlate trails) and trail associations.
+DEFAULT_HIGH_PRIORITY_TYPES = (MESSAGE_MARKER, MESSAGE_TRAIL_ASSOCIATION)
+
+# Multiplier used to spread trail IDs evenly before sampling them (Knuth's multiplicative hash).
+TRAIL_HASH_MULTIPLIER = 0x9E3779B1
+TRAIL_HASH_RANGE = 1 << 32
+
+
+class DropNewest(object):
+    """
+    Discard new messages while the queue is full, and the rest of the queue once the sender
+    reconnects after an outage.  This is the default.
+    """
+    clear_on_reconnect = True
+
+    def pressure_depth(self, limit):
+        """
+        :return: how full the buffer can get, out of its limit, before the policy is consulted
+        """
+        return limit
+
+    def overflow(self, buffer, message, full):
+        """
+        :param buffer: The MessageBuffer
+        :param message: The new message
+        :param full: Whether the new message would take the buffer past its limit
+        :return: what to do with the new message
+        """
+        return REJECT
+
+
+class DropOldest(DropNewest):
+    """
+    Discard the oldest queued message to make room for each new one, so that the queue always holds
+    the most recent messages.
+    """
+    clear_on_reconnect = False
+
+    def overflow(self, buffer, message, full):
+        # If the sender has emptied the queue in the meantime, there's room.
+        return EVICT if buffer.evict_oldest() else ADMIT
+
+
+class Block(DropNewest):
+    """
+    Make Client.send wait for room on the queue, for up to timeout seconds, before discarding the
+    new message.  This slows the application down to the rate SAS accepts messages, so the timeout
+    should be short.
+    """
+    clear_on_reconnect = False
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+
+    def overflow(self, buffer, message, full):
+        return WAIT
+
+
+class Sample(DropNewest):
+    """
+    Once the queue is more than threshold full, only queue messages on a sample of trails, so that
+    SAS still gets complete trails rather than fragments of every one.  The sample is chosen by
+    hashing the trail ID, so the same trails are kept throughout.  New messages are discarded if
+    the queue fills up regardless.
+    """
+    def __init__(self, fraction, threshold=0.5):
+        """
+        :param fraction: The proportion of trails to keep, between 0 and 1
+        :param threshold: The proportion of the queue that can fill before sampling starts
+        """
+        self._sample_limit = int(fraction * TRAIL_HASH_RANGE)
+        self._threshold = threshold
+
+    def pressure_depth(self, limit):
+        return int(limit * self._threshold)
+
+    def overflow(self, buffer, message, full):
+        if full:
+            return REJECT
+        trail_hash = (message_trail_id(message) * TRAIL_HASH_MULTIPLIER) % TRAIL_HASH_RANGE
+        return ADMIT if trail_hash < self._sample_limit else SAMPLE_OUT
+
+
+class Priority(DropNewest):
+    """
+    When the queue is full, make room for a high priority message (by default, a Marker or trail
+    association) by discarding the oldest queued message of lower priority.  New messages of lower
+    priority are discarded.
+    """
+    clear_on_reconnect = False
+
+    def __init__(self, high_priority_types=DEFAULT_HIGH_PRIORITY_TYPES):
+        self._high_priority_types = frozenset(high_priority_types)
+
+    def overflow(self, buffer, message, full):
+        if message_type(message) not in self._high_priority_types:
+            return REJECT
+        if buffer.evict_first(self._low_priority):
+            return EVICT
+        return REJECT
+
+    def _low_priority(self, message):
+        return message_type(message) not in self._high_priority_types
@@ -0,0 +1,271 @@
+# @file resources.py
+# Copyright (C) 2015  Metaswitch Networks Ltd
+
+"""
+Loads the definitions of events from a resource bundle, so that events can be checked against them
+before they are sent, rather than showing up garbled in SAS.
+
+The bundle is a JSON file of the form:
+    {
+        "identifier": "org.projectclearwater.20151201",
+        "version": "1",
+        "events": {
+            "HTTP_REQUEST": {
+                "id": "0x000001",
+                "static_params": ["port"],
+                "var_params": ["method", "uri"]
+            },
+            ...
+        }
+    }
+where each event's ID is a number, or a string in hex, and its static and variable parameters are
+lists of names.  Other fields of each event (its summary, details and so on) are ignored.
+"""
+
+import json
+import numbers
+
+from metaswitch.sasclient.constants import MESSAGE_ANALYTICS, MESSAGE_EVENT
+from metaswitch.sasclient.messages import STRING_TYPES, EventTemplate
+
+# Event IDs are ORed with RESOURCE_BUNDLE_BASE, so must fit in 24 bits.
+MAX_EVENT_ID = 0xFFFFFF
+
+# The types of messages that carry an event ID, and so are checked against the bundle.
+CHECKED_MESSAGE_TYPES = (MESSAGE_EVENT, MESSAGE_ANALYTICS)
+
+# Static parameters are packed as C ints.
+MIN_STATIC_PARAM = -(1 << 31)
+MAX_STATIC_PARAM = (1 << 31) - 1
+
+
+class EventDefinition(object):
+    """
+    An event defined in a resource bundle: its ID, and the names of its parameters.
+    """
+
+    def __init__(self, name, event_id, static_params=(), var_params=()):
+        self.name = name
+        self.event_id = event_id
+        self.static_params = tuple(static_params)
+        self.var_params = tuple(var_params)
+        self._n_static = len(self.static_params)
+        self._n_var = len(self.var_params)
+
+    def check(self, static_params, var_params):
+        """
+        Check that an event's parameters match the definition.
+        :raises ValueError: if there are the wrong number of parameters, or a static parameter is
+                            out of range
+        :raises TypeError: if a static parameter isn't an integer, or a variable parameter isn't a
+                           string
+        """
+        # This is on the path of every event sent, so the common case of ints and byte strings is
+        # checked quickly, leaving anything else to the full check.
+        if len(static_params) != self._n_static or len(var_params) != self._n_var:
+            self._check_fully(static_params, var_params)
+        for value in static_params:
+            if type(value) is not int or not MIN_STATIC_PARAM <= value <= MAX_STATIC_PARAM:
+                self._check_fully(static_params, var_params)
+                break
+        for value in var_params:
+            if type(value) is not bytes:
+                self._check_fully(static_params, var_params)
+                break
+
+    def _check_fully(self, static_params, var_params):
+        if len(static_params) != len(self.static_params):
+            raise ValueError("Event {} expects {} static parameters, got {}".format(
+                self.name, len(self.static_params), len(static_params)))
+        if len(var_params) != len(self.var_params):
+            raise ValueError("Event {} expects {} variable parameters, got {}".format(
+                self.name, len(self.var_params), len(var_params)))
+
+        for name, value in zip(self.static_params, static_params):
+            if not isinstance(value, numbers.Integral):
+                raise TypeError("Event {} static parameter {} must be an integer, got {!r}".format(
+                    self.name, name, value))
+            if not MIN_STATIC_PARAM <= value <= MAX_STATIC_PARAM:
+                raise ValueError("Event {} static parameter {} is out of range: {}".format(
+                    self.name, name, value))
+        for name, value in zip(self.var_params, var_params):
+            if not isinstance(value, STRING_TYPES):
+                raise TypeError("Event {} variable parameter {} must be a string, got {!r}".format(
+                    self.name, name, value))
+
+    def check_converted(self, converted_params):
+        """
+        Check that none of a message's variable parameters had to be converted to strings (see
+        DataMessage.converted_params).
+        :raises TypeError: if any did
+        """
+        if converted_params:
+            index, value = converted_params[0]
+            raise TypeError("Event {} variable parameter {} must be a string, got {!r}".format(
+                self.name, self.var_params[index], value))
+
+    def template(self, instance_id=0, validate=True):
+        """
+        :param instance_id: Identifies where in the code the event is sent from
+        :param validate: Whether to check the parameters of each event encoded
+        :return: an EventTemplate for encoding the event
+        """
+        if validate:
+            return CheckedEventTemplate(self, instance_id)
+        return EventTemplate(self.event_id, instance_id, len(self.static_params),
+                             len(self.var_params))
+
+    def __repr__(self):
+        return "EventDefinition({!r}, 0x{:06x}, {!r}, {!r})".format(
+            self.name, self.event_id, self.static_params, self.var_params)
+
+
+class CheckedEventTemplate(EventTemplate):
+    """
+    EventTemplate that checks the parameters of each event against its definition.
+    """
+
+    def __init__(self, definition, instance_id=0):
+        super(CheckedEventTemplate, self).__init__(definition.event_id, instance_id,
+                                                   len(definition.static_params),
+                                                   len(definition.var_params))
+        self.definition = definition
+
+    def encode(self, trail_id, static_params=(), var_params=(), timestamp=None):
+        self.definition.check(static_params, var_params)
+        return EventTemplate.encode(self, trail_id, static_params, var_params, timestamp)
+
+
+class ResourceBundle(object):
+    """
+    The event definitions from a resource bundle, indexed by name and ID.
+    """
+
+    def __init__(self, identifier, version, events, validate=True):
+        """
+        :param identifier: The resource bundle's identifier, as passed to the Client
+        :param version: The resource bundle's version
+        :param events: Iterable of EventDefinitions
+        :param validate: Whether to check events against their definitions as they are sent.
+                         Checking costs a little on every event, so may be turned off in
+                         production once the application is known to send valid events.
+        """
+        self.identifier = identifier
+        self.version = version
+        self.validate = validate
+        self._events_by_name = {}
+        self._events_by_id = {}
+        for definition in events:
+            if definition.event_id in self._events_by_id:
+                raise ValueError("Events {} and {} have the same ID 0x{:06x}".format(
+                    self._events_by_id[definition.event_id].name, definition.name,
+                    definition.event_id))
+            self._events_by_name[definition.name] = definition
+            self._events_by_id[definition.event_id] = definition
+
+    def event(self, name):
+        """
+        :return: the EventDefinition with the given name
+        :raises KeyError: if there is no such event
+        """
+        return self._events_by_name[name]
+
+    def event_by_id(self, event_id):
+        """
+        :return: the EventDefinition with the given ID
+        :raises ValueError: if there is no such event
+        """
+        try:
+            return self._events_by_id[event_id]
+        except KeyError:
+            raise ValueError("Event ID 0x{:06x} is not in resource bundle {}".format(
+                event_id, self.identifier))
+
+    def template(self, name, instance_id=0):
+        """
+        :return: an EventTemplate for the named event, which checks the parameters of each event
+                 encoded if the bundle is validating
+        """
+        return self.event(name).template(instance_id, self.validate)
+
+    def check_event(self, event_id, static_params, var_params):
+        """
+        Check an event against its definition, if the bundle is validating.
+        :raises ValueError, TypeError: if the event isn't valid (see EventDefinition.check)
+        """
+        if self.validate:
+            self.event_by_id(event_id).check(static_params, var_params)
+
+    def check_message(self, message):
+        """
+        Check a Message against its definition, if it is an Event or Analytics message and the
+        bundle is validating.  Other types of messages, and serialized messages, aren't checked.
+        Variable parameters have already been encoded, so their types are checked as they were
+        added (see DataMessage.converted_params).
+        """
+        if self.validate and getattr(message, 'msg_type', None) in CHECKED_MESSAGE_TYPES:
+            definition = self.event_by_id(message.event_id)
+            definition.check(message.static_params, message.var_params)
+            definition.check_converted(message.converted_params)
+
+    def __len__(self):
+        return len(self._events_by_id)
+
+    def __iter__(self):
+        return iter(self._events_by_id.values())
+
+
+def load_resource_bundle(path, validate=True):
+    """
+    Read a resource bundle file.  The file itself is always checked, however validate is set.
+    :param path: Path of the JSON resource bundle
+    :param validate: Whether to check events against their definitions as they are sent
+    :return: a ResourceBundle
+    :raises ValueError: if the file isn't a valid resource bundle
+    """
+    with open(path) as bundle_file:
+        try:
+            data = json.load(bundle_file)
+        except ValueError as e:
+            raise ValueError("Resource bundle {} is not valid JSON: {}".format(path, e))
+
+    if not isinstance(data, dict) or not isinstance(data.get("events"), dict):
+        raise ValueError("Resource bundle {} has no events".format(path))
+
+    events = []
+    for name, fields in sorted(data["events"].items()):
+        try:
+            events.append(parse_event(name, fields))
+        except ValueError as e:
+            raise ValueError("Resource bundle {}: {}".format(path, e))
+
+    return ResourceBundle(data.get("identifier"), data.get("version"), events, validate)
+
+
+def parse_event(name, fields):
+    """
+    :param name: The name of the event
+    :param fields: dict of the event's fields from the resource bundle
+    :return: an EventDefinition
+    :raises ValueError: if the fields aren't valid
+    """
+    if not isinstance(fields, dict) or "id" not in fields:
+        raise ValueError("Event {} has no ID".format(name))
+
+    event_id = fields["id"]
+    try:
+        if not isinstance(event_id, numbers.Integral):
+            event_id = int(event_id, 0)
+    except (TypeError, ValueError):
+        raise ValueError("Event {} has an invalid ID: {!r}".format(name, fields["id"]))
+    if not 0 <= event_id <= MAX_EVENT_ID:
+        raise ValueError("Event {} has an ID out of range: 0x{:x}".format(name, event_id))
+
+    params = {}
+    for kind in ("static_params", "var_params"):
+        names = fields.get(kind, [])
+        if not isinstance(names, list):
+            raise ValueError("Event {} {} must be a list of names".format(name, kind))
+        params[kind] = names
+
+    return EventDefinition(name, event_id, params["static_params"], params["var_params"])
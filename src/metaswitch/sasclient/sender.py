@@ -1,21 +1,136 @@
 # @file sender.py
 # Copyright (C) 2015  Metaswitch Networks Ltd
 
+import errno
+import os
 import threading
+import select
 import socket
-import Queue
+import sys
 import logging
+import time
 import traceback
 
 from metaswitch.sasclient import messages
+from metaswitch.sasclient.outgoing import OutgoingBuffer
+from metaswitch.sasclient.stats import SenderStats
 
 MIN_RECONNECT_WAIT_TIME = 0.1
 MAX_RECONNECT_WAIT_TIME = 5
 CONNECTION_TIMEOUT = 10
 
+# How often, in seconds, to check whether we've been told to stop while waiting for a connection to
+# be made.
+CONNECT_POLL_INTERVAL = 0.1
+
+# Limits on how much queued data is coalesced into a single write to the socket, and how long (in
+# seconds) to wait for further messages once the queue has been drained.
+DEFAULT_BATCH_MAX_MESSAGES = 1000
+DEFAULT_BATCH_MAX_BYTES = 64 * 1024
+DEFAULT_BATCH_LINGER = 0
+
+# While SAS is slow to take what we write, messages keep being moved off the queue into the
+# outgoing buffer until it holds this many bytes.  The socket is checked for room this often (in
+# seconds) meanwhile.
+DEFAULT_OUTGOING_MAX_BYTES = 1024 * 1024
+WRITE_POLL_INTERVAL = 0.01
+
+# The rate (in bytes per second) at which to replay spooled messages once SAS is available again, so
+# that we don't flood it, and how often (in seconds) to move messages to the spool while we can't
+# connect.
+DEFAULT_SPOOL_REPLAY_RATE = 4 * 1024 * 1024
+SPOOL_INTERVAL = 0.1
+
+# How long, in seconds, the connection may be idle before we send a heartbeat.  Heartbeats have no
+# timestamp, so are serialized once.
+DEFAULT_HEARTBEAT_INTERVAL = 1
+HEARTBEAT = messages.Heartbeat().serialize()
+
+# TCP_USER_TIMEOUT is only defined by the socket module from Python 3.6, but Linux has supported it
+# for longer.
+TCP_USER_TIMEOUT = getattr(socket, 'TCP_USER_TIMEOUT',
+                           18 if sys.platform.startswith('linux') else None)
+
 logger = logging.getLogger(__name__)
 
 
+class SocketOptions(object):
+    """
+    Options for the TCP connection to SAS.  Any left as None keep the operating system's default.
+    """
+
+    def __init__(self,
+                 connect_timeout=CONNECTION_TIMEOUT,
+                 send_timeout=CONNECTION_TIMEOUT,
+                 tcp_nodelay=False,
+                 send_buffer_size=None,
+                 keepalive=False,
+                 keepalive_idle=None,
+                 keepalive_interval=None,
+                 keepalive_count=None,
+                 user_timeout=None):
+        """
+        :param connect_timeout: How long, in seconds, to wait for the connection to be made
+        :param send_timeout: How long, in seconds, the sender may go without managing to write
+                             anything, while it has data waiting to be written, before the
+                             connection is given up on.  None to wait indefinitely.
+        :param tcp_nodelay: Whether to disable Nagle's algorithm.  The sender already coalesces
+                            queued messages into as few writes as it can, so there is little to
+                            gain by the kernel delaying writes to coalesce them further.
+        :param send_buffer_size: The size of the socket's send buffer (SO_SNDBUF), in bytes
+        :param keepalive: Whether to send TCP keepalives, so that a SAS that has gone away is
+                          noticed while the connection is idle
+        :param keepalive_idle: Seconds of idleness before the first keepalive (TCP_KEEPIDLE)
+        :param keepalive_interval: Seconds between keepalives (TCP_KEEPINTVL)
+        :param keepalive_count: Unanswered keepalives before the connection is dropped
+                                (TCP_KEEPCNT)
+        :param user_timeout: How long, in seconds, written data may remain unacknowledged before
+                             the connection is dropped (TCP_USER_TIMEOUT, Linux only)
+        """
+        self.connect_timeout = connect_timeout
+        self.send_timeout = send_timeout
+        self.tcp_nodelay = tcp_nodelay
+        self.send_buffer_size = send_buffer_size
+        self.keepalive = keepalive
+        self.keepalive_idle = keepalive_idle
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_count = keepalive_count
+        self.user_timeout = user_timeout
+
+    def apply(self, sock):
+        """
+        Set the options on a connected socket.  Options the platform doesn't support are skipped,
+        with a warning.  The send timeout isn't a socket option: the sender's socket is
+        non-blocking, and the sender times out writes itself.
+        """
+        options = []
+        if self.tcp_nodelay:
+            options.append((socket.IPPROTO_TCP, 'TCP_NODELAY', 1))
+        if self.send_buffer_size is not None:
+            options.append((socket.SOL_SOCKET, 'SO_SNDBUF', self.send_buffer_size))
+        if self.keepalive:
+            options.append((socket.SOL_SOCKET, 'SO_KEEPALIVE', 1))
+            for name, value in [('TCP_KEEPIDLE', self.keepalive_idle),
+                                ('TCP_KEEPINTVL', self.keepalive_interval),
+                                ('TCP_KEEPCNT', self.keepalive_count)]:
+                if value is not None:
+                    options.append((socket.IPPROTO_TCP, name, value))
+        if self.user_timeout is not None:
+            options.append((socket.IPPROTO_TCP, 'TCP_USER_TIMEOUT', int(self.user_timeout * 1000)))
+
+        for level, name, value in options:
+            option = getattr(socket, name, None)
+            if name == 'TCP_USER_TIMEOUT':
+                option = TCP_USER_TIMEOUT
+            if option is None:
+                logger.warning("Socket option %s is not supported on this platform", name)
+                continue
+            try:
+                sock.setsockopt(level, option, value)
+            except socket.error as e:
+                logger.warning("Failed to set socket option %s: %s", name, str(e))
+
+
 class MessageSender(threading.Thread):
     """
     The thread which does work on the message queue.
@@ -30,7 +145,19 @@ class MessageSender(threading.Thread):
             system_type,
             resource_identifier,
             sas_address,
-            sas_port):
+            sas_port,
+            batch_max_messages=DEFAULT_BATCH_MAX_MESSAGES,
+            batch_max_bytes=DEFAULT_BATCH_MAX_BYTES,
+            batch_linger=DEFAULT_BATCH_LINGER,
+            spool=None,
+            spool_watermark=0,
+            spool_replay_rate=DEFAULT_SPOOL_REPLAY_RATE,
+            stats=None,
+            compression_policy=None,
+            heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL,
+            socket_options=None,
+            outgoing_max_bytes=DEFAULT_OUTGOING_MAX_BYTES,
+            failed_event=None):
         super(MessageSender, self).__init__()
 
         # Objects that the thread runs on
@@ -47,67 +174,180 @@ class MessageSender(threading.Thread):
         self._sas_address = sas_address
         self._sas_port = sas_port
         self._sas_sock = None
+        self._socket_options = socket_options if socket_options is not None else SocketOptions()
         self._reconnect_wait = MIN_RECONNECT_WAIT_TIME
         self._connected = False
+        self._connected_event = threading.Event()
+
+        # Heartbeats are sent once nothing has been written for heartbeat_interval seconds.
+        self._heartbeat_interval = heartbeat_interval
+        self._last_write = 0
+
+        # Batching configuration
+        self._batch_max_messages = max(batch_max_messages, 1)
+        self._batch_max_bytes = batch_max_bytes
+        self._batch_linger = batch_linger
+
+        # Messages taken off the queue that haven't yet been completely written to the socket, and
+        # when a write last made any progress with them.
+        self._outgoing = OutgoingBuffer()
+        self._outgoing_max_bytes = outgoing_max_bytes
+        self._last_progress = 0
+
+        # Spool for messages that can't be sent, or are beyond the watermark on the queue
+        self._spool = spool
+        self._spool_watermark = spool_watermark
+        self._spool_replay_rate = spool_replay_rate
+        self._replaying = 0
+
+        # Counters for what this thread has sent and discarded
+        self._stats = stats if stats is not None else SenderStats()
+        self.abandoned = 0
+
+        # Whether the thread was ended by an unexpected exception, rather than by being stopped,
+        # and an Event to set when it is, to wake whoever restarts the thread.
+        self.failed = False
+        self._failed_event = failed_event
+
+        # Threads waiting in flush() for the messages queued before they called it to be written,
+        # and how many of the messages ever queued have been written (or spooled or discarded).
+        self._flush_condition = threading.Condition()
+        self._flush_waiters = 0
+        self._flushed = 0
+        self._finished = False
+
+        # For encoding deferred messages' parameters
+        self._compression_policy = compression_policy
 
     def run(self):
         """
-        Picks an item off the queue, calls message.serialize() on it, and sends it.
-        If there's not been any messages sent for a while, then send a heartbeat.
+        Picks messages off the queue, calls message.serialize() on each, and adds them to the
+        outgoing buffer, then writes as much of the buffer as the socket will take.  The socket is
+        non-blocking: while SAS is slow to take what is written, messages keep being moved off the
+        queue into the buffer, up to its limit.
+        If nothing has been written for the heartbeat interval, then send a heartbeat.  While
+        idle, the thread sleeps until the next heartbeat is due, or a message is queued.
         If the queue has been terminated (via _stopper), then stop.
-        Maintains the connection - if the connection is down then reconnect using connect()
+        Maintains the connection - if the connection is down then reconnect using connect().  The
+        connection is given up on if SAS closes it, a write fails, or nothing can be written for
+        the send timeout.  Messages that weren't completely written are sent again on the next
+        connection.
+        If there is a spool, messages that can't be sent, or that are beyond the spool watermark
+        on the queue, are spooled, and sent ahead of the queue once we can.
         """
         try:
+            # Make the first connection here, rather than on the thread that started the client,
+            # so that the application isn't held up when SAS can't be reached.
+            self.connect()
+
             while not self._stopper.is_set():
+                if self._spool is not None:
+                    self.spool_overflow()
+
+                if self._flush_waiters:
+                    self.check_flushed()
+
                 if not self._connected:
                     # Try to reconnect and have another go at the loop.
                     self.reconnect()
                     continue
 
-                # Try to get a message off of the queue.  If there's nothing there after a second,
-                # send a heartbeat.
-                try:
-                    message = self._queue.get(True, 1)
-                    self._queue.task_done()
-                except Queue.Empty:
-                    message = messages.Heartbeat()
-
-                # Send the message.  If we fail, we'll want to reconnect.
-                if not self.send_message(message):
-                    logger.debug("Failed to send a message, flag that we need to reconnect")
-                    self._connected = False
-                elif self._discarding.is_set():
-                    # Successfully sent a message - clear the discarding flag.
-                    self._discarding.clear()
+                spooling = self._spool is not None and (self._replaying or
+                                                        not self._spool.empty())
+                if self._outgoing:
+                    # Carry on taking messages off the queue while earlier ones are being written.
+                    # Spooled messages are sent before anything on the queue.
+                    if not spooling:
+                        self.fill(0)
+                elif spooling:
+                    self.replay_spool()
+                else:
+                    # Wait for a message on the queue until the next heartbeat is due.  If there's
+                    # nothing there by then, send a heartbeat.
+                    heartbeat_due = self._last_write + self._heartbeat_interval
+                    if not self.fill(max(heartbeat_due - time.time(), 0)):
+                        if time.time() < heartbeat_due:
+                            # Woken early, without a message (e.g. to stop).
+                            continue
+                        self.buffer_data(HEARTBEAT, counted=False)
+                        self._stats.heartbeats += 1
+
+                # If we failed to send, we'll want to reconnect.
+                if not self.write_outgoing():
+                    self.connection_failed()
 
             self.disconnect()
             self._connected = False
 
-        except Exception as e:
+            if self._spool is not None:
+                # Keep anything we haven't sent for next time.
+                data, count = self._outgoing.take()
+                if count:
+                    self.spool_data(data, count)
+                self.spool_overflow(0)
+                self._spool.close()
+            elif self._outgoing:
+                logger.warning("Discarding %d SAS message(s) not sent before stopping",
+                               len(self._outgoing))
+                self.abandoned = len(self._outgoing)
+                self._stats.discarded += self.abandoned
+                self._outgoing.clear()
+
+        except Exception:
             # Ensure that we record any unexpected exceptions in the logs.  We also print out
             # the error, in order to still produce diagnosable output when we're hitting
-            # exceptions in the logging library.
+            # exceptions in the logging library.  The thread then exits, leaving its queue for the
+            # Client to give to a new sender.
             details = traceback.format_exc()
             error = (
-                "ERROR - Hit exception in SAS sender thread!  SAS logs will no longer be made.\n{}"
+                "ERROR - Hit exception in SAS sender thread!  SAS logs will not be sent until it "
+                "is restarted.\n{}"
             ).format(details)
             print(error)
             logger.error(error)
-            raise e
+            self.failed = True
+            self.release_after_failure()
+            if self._failed_event is not None:
+                self._failed_event.set()
+
+        finally:
+            # Don't leave anyone waiting for a flush.
+            with self._flush_condition:
+                self._finished = True
+                self._flush_condition.notify_all()
+
+    def release_after_failure(self):
+        """
+        Close the connection and the spool after an unexpected exception, so that a new sender can
+        take over the queue.  Messages that weren't completely written are spooled, if there is a
+        spool, and otherwise discarded.
+        """
+        try:
+            self.disconnect()
+            self._connected = False
+            if self._spool is not None:
+                data, count = self._outgoing.take()
+                if count:
+                    self.spool_data(data, count)
+                self._spool.close()
+            elif self._outgoing:
+                self._stats.discarded += len(self._outgoing)
+                self._outgoing.clear()
+        except Exception as e:
+            logger.error("Hit error cleaning up failed SAS sender thread - ignore: %s", str(e))
 
     def connect(self):
         """
-        Connects to the SAS. This involves sending an Init message, which is sent immediately and
-        bypasses the queue.
+        Connects to the SAS. This involves sending an Init message, which is written ahead of
+        anything else in the outgoing buffer, and bypasses the queue.
         If this fails, immediately call reconnect()
         """
         # Connect. This has a long timeout, but this is fine because without a connection there is
-        # nothing else to do. If this fails, then we'll notice when we try to send the heartbeat,
-        # which will prompt the reconnect.
+        # nothing else to do, and we stop waiting as soon as we're told to stop. If this fails, then
+        # the run loop will prompt the reconnect.
         try:
             logger.info("Connecting to: %s:%s", self._sas_address, self._sas_port)
-            self._sas_sock = socket.create_connection((self._sas_address, self._sas_port),
-                                                      CONNECTION_TIMEOUT)
+            self._sas_sock = self.open_connection()
         except IOError as e:
             logger.error(
                 "An I/O error occurred whilst opening socket to %s on port %s: %s",
@@ -115,24 +355,30 @@ class MessageSender(threading.Thread):
                 self._sas_port,
                 str(e))
         else:
-            # Send the Init message, bypassing the queue.
+            if self._sas_sock is None:
+                # Told to stop while connecting.
+                return
+
+            # Connection is successful. Reset the time to wait between reconnects.
+            logger.debug("Successfully connected")
+            self._reconnect_wait = MIN_RECONNECT_WAIT_TIME
+            self._connected = True
+            self._connected_event.set()
+
+            # Send the Init message first, bypassing the queue.
             init = messages.Init(self._system_name, self._system_type, self._resource_identifier)
-            if self.send_message(init):
-                # Connection is successful. Reset the time to wait between reconnects.
-                logger.debug("Successfully connected")
-                self._reconnect_wait = MIN_RECONNECT_WAIT_TIME
-                self._connected = True
-
-        if self._discarding.is_set():
-            # We've filled the message queue while trying to connect.  Discard all queued messages.
-            # We do so by repeatedly pulling items from the queue, as there is no thread-safe way
-            # of clearing a Queue.Queue in one shot.
-            try:
-                while True:
-                    message = self._queue.get(block=False)
-                    self._queue.task_done()
-            except Queue.Empty:
-                pass
+            self._outgoing.prepend(init.serialize())
+            self._last_progress = time.time()
+
+        if self._discarding.is_set() and self._spool is not None:
+            # We've filled the message queue while trying to connect.  Spool all queued messages.
+            self.spool_overflow(0)
+            self._discarding.clear()
+        elif self._discarding.is_set():
+            # We've filled the message queue while trying to connect.  Unless the overflow policy
+            # has already chosen which messages to keep, discard all queued messages.
+            if self._queue.policy.clear_on_reconnect:
+                self._stats.discarded += self._queue.clear()
 
             # Make a log to indicate that messages have been discarded.
             msg = ("The SAS client library has filled its message queue, and has discarded "
@@ -148,8 +394,103 @@ class MessageSender(threading.Thread):
                         "is restored.")
             logger.error(msg)
 
+    def open_connection(self):
+        """
+        Opens a non-blocking TCP connection to SAS, trying each address the SAS address resolves
+        to in turn, until the connect timeout.  Gives up as soon as the sender is told to stop.
+        :return: the connected socket, with the socket options applied, or None if the sender has
+                 been told to stop
+        :raises IOError: if the connection can't be made
+        """
+        timeout = self._socket_options.connect_timeout
+        error = IOError("No addresses found for {}".format(self._sas_address))
+        for family, socktype, proto, _, address in socket.getaddrinfo(
+                self._sas_address, self._sas_port, 0, socket.SOCK_STREAM):
+            sock = socket.socket(family, socktype, proto)
+            try:
+                sock.setblocking(False)
+                result = sock.connect_ex(address)
+                deadline = time.time() + timeout if timeout is not None else None
+                while result in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+                    wait = CONNECT_POLL_INTERVAL
+                    if deadline is not None:
+                        wait = min(wait, deadline - time.time())
+                        if wait <= 0:
+                            raise socket.timeout("timed out")
+                    _, writable, _ = select.select([], [sock], [], wait)
+                    if self._stopper.is_set():
+                        sock.close()
+                        return None
+                    if self._spool is not None:
+                        self.spool_overflow()
+                    if writable:
+                        result = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if result:
+                    raise socket.error(result, os.strerror(result))
+
+                self._socket_options.apply(sock)
+                sock.setblocking(False)
+                return sock
+            except IOError as e:
+                error = e
+                sock.close()
+        raise error
+
+    def flush(self, timeout=None):
+        """
+        Wait until the messages queued before the call have been written to SAS (or spooled, or
+        discarded), as fast as they can be.  Messages queued meanwhile don't hold it up.  Must not
+        be called from the sender thread.
+        :param timeout: How long, in seconds, to wait, or None to wait indefinitely
+        :return: whether they were all written within the timeout
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        target = self._queue.put_count
+        with self._flush_condition:
+            self._flush_waiters += 1
+        try:
+            # Wake the sender, if it's waiting for messages, to check whether it's done.
+            self._queue.wake()
+            with self._flush_condition:
+                while self._flushed < target and not self._finished:
+                    remaining = None
+                    if deadline is not None:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            break
+                    self._flush_condition.wait(remaining)
+                return self._flushed >= target
+        finally:
+            with self._flush_condition:
+                self._flush_waiters -= 1
+
+    def check_flushed(self):
+        """
+        Tell anyone waiting for a flush how many of the messages queued have been written: those
+        that have left the queue, apart from those still in the outgoing buffer.
+        """
+        flushed = self._queue.removed() - len(self._outgoing)
+        with self._flush_condition:
+            if flushed > self._flushed:
+                self._flushed = flushed
+                self._flush_condition.notify_all()
+
+    def unsent(self):
+        """
+        :return: the number of messages taken off the queue, but not yet written to SAS
+        """
+        return len(self._outgoing)
+
+    def wait_connected(self, timeout=None):
+        """
+        Wait until there is a connection to SAS.
+        :return: whether there is a connection
+        """
+        return self._connected_event.wait(timeout)
+
     def disconnect(self):
         logger.debug("Disconnecting")
+        self._connected_event.clear()
         # It's possible that the socket doesn't even exist yet, so we have nothing to do.
         if self._sas_sock is None:
             return
@@ -161,36 +502,243 @@ class MessageSender(threading.Thread):
             # connection has gone away, we don't have anything more to do.
             logger.debug("Hit error closing socket - ignore: %s", str(e))
 
-    def send_message(self, message):
+    def close_inherited_socket(self):
         """
-        Sends a message on the socket
-        :param message: Message to send
-        :return: boolean success
+        Close this process's handle on a socket inherited across a fork, leaving the connection
+        itself open for the parent.
         """
-        heartbeat = isinstance(message, messages.Heartbeat)
+        if self._sas_sock is not None:
+            self._sas_sock.close()
+            self._sas_sock = None
+        self._connected = False
+
+    def fill(self, timeout):
+        """
+        Waits up to timeout seconds for a message, then keeps taking messages off the queue until
+        it is empty or the batch has reached its message or byte limit, and adds the batch to the
+        outgoing buffer.  The messages are serialized as parts, which are joined into one string
+        for the batch, so their parameters are copied just once before the write.  If batch_linger
+        is set, waits up to that long for further messages before giving up on filling the batch.
+        Nothing is taken off the queue while the outgoing buffer is full.
+        :return: the number of messages in the batch
+        """
+        if self._outgoing.unwritten_bytes() >= self._outgoing_max_bytes:
+            return 0
+        message = self._queue.get(timeout) if timeout > 0 else self._queue.pop()
+        if message is None:
+            return 0
+
+        batch = []
+        batch_bytes = 0
+        ends = []
+        # Don't hold up anyone waiting for a flush by lingering.
+        deadline = time.time() + (self._batch_linger if not self._flush_waiters else 0)
+        while True:
+            length = self.serialize_message(message, batch)
+            if length:
+                batch_bytes += length
+                ends.append(batch_bytes)
+            if len(ends) >= self._batch_max_messages or batch_bytes >= self._batch_max_bytes:
+                break
+            timeout = deadline - time.time()
+            message = self._queue.get(timeout) if timeout > 0 else self._queue.pop()
+            if message is None:
+                break
 
-        if not heartbeat:
-            logger.debug("Sending message:\n%s", str(message))
+        if ends:
+            self.buffer_data(b''.join(batch), ends)
+        return len(ends)
 
-        msg_array = message.serialize()
+    def serialize_message(self, message, batch):
+        """
+        Serializes a message that has been taken off the queue for sending, adding it to the batch.
+        Messages queued by Client.send_event and send_marker are already serialized.  Deferred
+        messages have their parameters encoded here.  A message that can't be serialized is
+        discarded, leaving the batch as it was.
+        :return: the length of the serialized message, or 0 if it was discarded
+        """
+        if isinstance(message, bytes):
+            batch.append(message)
+            return len(message)
+        logger.debug("Sending message:\n%s", message)
+        parts = len(batch)
         try:
-            self._sas_sock.sendall(msg_array)
+            if message.pending_params:
+                message.encode_params(self._compression_policy)
+            return message.serialize_parts(batch)
+        except Exception as e:
+            del batch[parts:]
+            self.serialize_failed(message, e)
+            return 0
+
+    def serialize_failed(self, message, error):
+        """
+        Count and log a message that has been discarded because it couldn't be serialized (e.g.
+        because a parameter is too long), so that one bad message doesn't stop the rest being sent.
+        """
+        self._stats.failed += 1
+        logger.error("Discarding %s that could not be serialized: %s",
+                     type(message).__name__, str(error))
+
+    def buffer_data(self, data, ends=None, counted=True):
+        """
+        Add serialized messages to the outgoing buffer.
+        :param ends: List of the offset in data of the end of each message, if there is more than
+                     one
+        :param counted: Whether the messages are counted as sent once they have been written
+        """
+        if not self._outgoing:
+            self._last_progress = time.time()
+        self._outgoing.append(data, ends, counted)
 
-            if not heartbeat:
-                logger.debug("Successfully sent message")
+    def write_outgoing(self):
+        """
+        Waits (briefly) for the socket to have room, then writes as much of the outgoing buffer as
+        it will take.
+        :return: False if the connection has failed: SAS has closed it, a write has failed, or
+                 nothing could be written for the send timeout
+        """
+        try:
+            readable, writable, _ = select.select([self._sas_sock], [self._sas_sock], [],
+                                                  WRITE_POLL_INTERVAL)
+            if readable and self.peer_closed():
+                logger.error("Connection to %s on port %s has been closed",
+                             self._sas_address, self._sas_port)
+                return False
 
-            return True
+            while writable and self._outgoing:
+                start = time.time()
+                try:
+                    sent, completed = self._outgoing.write(self._sas_sock)
+                except socket.error as e:
+                    if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                        raise
+                    break
+                self._last_write = self._last_progress = time.time()
+                self._stats.write_latency.record(self._last_write - start)
+                self._stats.bytes_sent += sent
+                if completed:
+                    logger.debug("Successfully sent %d message(s)", completed)
+                    self._stats.sent += completed
+                    if self._discarding.is_set():
+                        # Successfully sent a message - clear the discarding flag.
+                        self._discarding.clear()
         except IOError as e:
             logger.error("An I/O error occurred whilst sending message to %s on port %s: %s",
                          self._sas_address, self._sas_port, str(e))
             return False
-        except socket.timeout as e:
-            logger.error("Socket timeout occurred whilst sending message to %s on port %s: %s",
-                         self._sas_address, self._sas_port, str(e))
+
+        if self._replaying and not self._outgoing:
+            self.replayed()
+        elif (self._outgoing and self._socket_options.send_timeout is not None and
+              time.time() - self._last_progress > self._socket_options.send_timeout):
+            logger.error("Timed out sending messages to %s on port %s: nothing written for %s "
+                         "seconds", self._sas_address, self._sas_port,
+                         self._socket_options.send_timeout)
             return False
+        return True
+
+    def peer_closed(self):
+        """
+        Check, without blocking, whether SAS has closed the connection.
+        """
+        # SAS doesn't send us anything we need, so any data can be thrown away.  An empty read
+        # means the connection has been closed.
+        try:
+            return not self._sas_sock.recv(4096)
+        except socket.error as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return False
+            raise
+
+    def connection_failed(self):
+        """
+        Flag that we need to reconnect.  Messages that weren't completely written are kept to be
+        sent again on the next connection, or spooled if there is a spool.
+        """
+        logger.debug("Failed to send a message, flag that we need to reconnect")
+        self._connected = False
+        self._connected_event.clear()
+        self._replaying = 0
+        if self._spool is not None:
+            data, count = self._outgoing.take()
+            if count:
+                self.spool_data(data, count)
+        else:
+            self._outgoing.rewind()
+
+    def spool_overflow(self, watermark=None):
+        """
+        Move messages from the front of the queue to the spool until there are no more than
+        watermark (by default, the spool watermark) left.
+        """
+        if watermark is None:
+            watermark = self._spool_watermark
+        while len(self._queue) > watermark:
+            message = self._queue.pop()
+            if message is None:
+                break
+            try:
+                data = messages.serialized(message, self._compression_policy)
+            except Exception as e:
+                self.serialize_failed(message, e)
+                continue
+            self.spool_data(data)
+
+    def spool_data(self, data, count=1):
+        """
+        Add serialized messages to the spool.
+        :param count: the number of messages in data
+        """
+        self._stats.spooled += count
+        if self._spool.empty():
+            logger.warning("Spooling SAS messages to %s", self._spool.path)
+        evicted = self._spool.evicted
+        self._spool.append(data)
+        if self._spool.evicted > evicted:
+            logger.debug("Evicted %d messages from the SAS spool", self._spool.evicted - evicted)
+            self._stats.discarded += self._spool.evicted - evicted
+
+    def replay_spool(self):
+        """
+        Add the oldest batch of messages from the spool to the outgoing buffer.  They stay in the
+        spool until they have been completely written.
+        """
+        data = self._spool.peek(self._batch_max_bytes)
+        if data:
+            self.buffer_data(data, counted=False)
+            self._replaying = len(data)
+
+    def replayed(self):
+        """
+        Remove a batch of messages that has been written from the spool, then wait long enough to
+        keep to the replay rate.
+        """
+        self._spool.consume(self._replaying)
+        if self._spool.empty():
+            logger.info("Finished sending spooled SAS messages")
+        self._stopper.wait(float(self._replaying) / self._spool_replay_rate)
+        self._replaying = 0
+
+    def wait(self, timeout):
+        """
+        Interruptible sleep, which keeps moving messages to the spool (if there is one) while it
+        waits.
+        :return: True if the sender has been told to stop
+        """
+        if self._spool is None:
+            return self._stopper.wait(timeout)
+
+        deadline = time.time() + timeout
+        while not self._stopper.wait(max(min(SPOOL_INTERVAL, deadline - time.time()), 0)):
+            self.spool_overflow()
+            if time.time() >= deadline:
+                return False
+        return True
 
     def reconnect(self):
         logger.debug("Attempting to reconnect.")
+        self._stats.reconnects += 1
         self.disconnect()
 
         # If our connection is being rejected, don't spam the SAS with attempts. Use exponential
@@ -200,5 +748,5 @@ class MessageSender(threading.Thread):
 
         # Interruptible sleep. Returns False if it reaches the timeout, and True if it was
         # interrupted.
-        if not self._stopper.wait(reconnect_wait):
+        if not self.wait(reconnect_wait):
             self.connect()
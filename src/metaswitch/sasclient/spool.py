@@ -0,0 +1,172 @@
+# @file spool.py
+# Copyright (C) 2015  Metaswitch Networks Ltd
+
+import logging
+import mmap
+import os
+import struct
+
+# The spool file starts with a header:
+# 8 bytes - magic string
+# 4 bytes - file format version
+# 8 bytes - capacity of the data area
+# 8 bytes - offset of the oldest message in the data area
+# 8 bytes - number of bytes of messages in the data area
+SPOOL_HEADER = struct.Struct('!8sIQQQ')
+SPOOL_MAGIC = b'SASSPOOL'
+SPOOL_VERSION = 1
+
+# Spooled messages are stored back to back as they are sent to SAS, so each starts with its length.
+MESSAGE_LENGTH = struct.Struct('!H')
+MIN_MESSAGE_LENGTH = 4
+
+logger = logging.getLogger(__name__)
+
+
+class Spool(object):
+    """
+    A bounded ring of serialized messages in a memory-mapped file, used to hold messages while SAS
+    is unavailable.  When the ring is full, the oldest messages are evicted to make room.  The ring
+    is persisted in the file, so messages spooled before a restart are still there afterwards.
+
+    Not thread-safe: a spool belongs to a single MessageSender.
+    """
+
+    def __init__(self, path, capacity):
+        """
+        Open the spool file, creating it if necessary.  If the file holds a spool of a different
+        capacity, or is corrupt, its contents are discarded.
+        :param path: Path of the spool file
+        :param capacity: Maximum number of bytes of messages to hold
+        """
+        self.path = path
+        self.capacity = capacity
+        self.evicted = 0
+        self._head = 0
+        self._used = 0
+
+        size = SPOOL_HEADER.size + capacity
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        existing_size = os.fstat(self._fd).st_size
+        if existing_size != size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+
+        magic, version, stored_capacity, head, used = SPOOL_HEADER.unpack_from(self._map, 0)
+        if magic == SPOOL_MAGIC and version == SPOOL_VERSION and stored_capacity == capacity:
+            if head < capacity and used <= capacity:
+                self._head = head
+                self._used = used
+                if used:
+                    logger.info("Recovered %d bytes of spooled SAS messages from %s", used, path)
+            else:
+                logger.error("SAS spool file %s is corrupt, discarding its contents", path)
+        elif existing_size:
+            logger.warning("SAS spool file %s has a different format or size, discarding its "
+                           "contents", path)
+        self._write_header()
+
+    def close(self):
+        self._map.flush()
+        self._map.close()
+        os.close(self._fd)
+
+    def empty(self):
+        return self._used == 0
+
+    def __len__(self):
+        """
+        :return: the number of bytes of messages held
+        """
+        return self._used
+
+    def append(self, data):
+        """
+        Add serialized messages to the spool, evicting the oldest messages if there isn't room.
+        :param data: One or more whole serialized messages
+        :return: False if none of the messages could be added, because they're too big to ever fit
+        """
+        while len(data) > self.capacity:
+            # Drop messages from the front of the data until the rest fits.
+            length = MESSAGE_LENGTH.unpack_from(data)[0]
+            if length < MIN_MESSAGE_LENGTH or length >= len(data):
+                return False
+            data = data[length:]
+            self.evicted += 1
+
+        while self._used + len(data) > self.capacity:
+            length = self._message_length(self._head)
+            if length is None:
+                break
+            self._consume(length)
+            self.evicted += 1
+
+        self._write((self._head + self._used) % self.capacity, data)
+        self._used += len(data)
+        self._write_header()
+        return True
+
+    def peek(self, max_bytes):
+        """
+        :return: the oldest messages in the spool, up to max_bytes of them (but at least one
+                 message, if there are any)
+        """
+        length = 0
+        while length < self._used:
+            message_length = self._message_length((self._head + length) % self.capacity)
+            if message_length is None:
+                return b''
+            if length and length + message_length > max_bytes:
+                break
+            length += message_length
+        return self._read(self._head, length)
+
+    def consume(self, length):
+        """
+        Remove messages, which have been returned by peek, from the front of the spool.
+        """
+        self._consume(length)
+        self._write_header()
+
+    def _consume(self, length):
+        self._head = (self._head + length) % self.capacity
+        self._used -= length
+        if self._used == 0:
+            self._head = 0
+
+    def _message_length(self, offset):
+        """
+        :return: the length of the message at offset, or None if the spool turns out to be corrupt
+                 (in which case it is emptied)
+        """
+        length = MESSAGE_LENGTH.unpack(self._read(offset, MESSAGE_LENGTH.size))[0]
+        if length < MIN_MESSAGE_LENGTH or length > self._used:
+            # This can only happen if the file has been corrupted.  There's no way to find the next
+            # message, so start again.
+            logger.error("SAS spool file %s is corrupt, discarding its contents", self.path)
+            self._head = 0
+            self._used = 0
+            self._write_header()
+            return None
+        return length
+
+    def _read(self, offset, length):
+        start = SPOOL_HEADER.size + offset
+        first = min(length, self.capacity - offset)
+        data = self._map[start:start + first]
+        if first < length:
+            # The data wraps around the end of the ring.
+            data += self._map[SPOOL_HEADER.size:SPOOL_HEADER.size + length - first]
+        return data
+
+    def _write(self, offset, data):
+        start = SPOOL_HEADER.size + offset
+        first = min(len(data), self.capacity - offset)
+        self._map[start:start + first] = data[:first]
+        if first < len(data):
+            # The data wraps around the end of the ring.
+            self._map[SPOOL_HEADER.size:SPOOL_HEADER.size + len(data) - first] = data[first:]
+
+    def _write_header(self):
+        SPOOL_HEADER.pack_into(self._map, 0, SPOOL_MAGIC, SPOOL_VERSION, self.capacity,
+                               self._head, self._used)
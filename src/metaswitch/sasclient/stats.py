@@ -0,0 +1,141 @@
+# @file stats.py
+# Copyright (C) 2015  Metaswitch Networks Ltd
+
+# Latency histograms have a bucket for each power of two microseconds: bucket 0 counts values under
+# 1us, bucket n values from 2^(n-1)us up to 2^n us, and the last bucket everything longer.
+HISTOGRAM_BUCKETS = 32
+
+
+class Histogram(object):
+    """
+    A histogram of durations, in logarithmic buckets, cheap enough to record every message.  Only
+    one thread may record into a histogram, but any thread may take a snapshot of it.
+    """
+
+    def __init__(self):
+        self.counts = [0] * HISTOGRAM_BUCKETS
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        bucket = int(seconds * 1000000).bit_length()
+        self.counts[min(bucket, HISTOGRAM_BUCKETS - 1)] += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        """
+        Add the values recorded in another histogram to this one.
+        :return: self
+        """
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, other.counts)]
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        return self
+
+    def percentile(self, fraction):
+        """
+        :return: an upper bound, in seconds, on the given fraction of the values recorded
+        """
+        remaining = sum(self.counts) * fraction
+        for bucket, count in enumerate(self.counts):
+            remaining -= count
+            if remaining <= 0:
+                return min(bucket_limit(bucket), self.max)
+        return self.max
+
+    def snapshot(self):
+        """
+        :return: dict of the number, mean, maximum and percentiles of the values recorded (in
+                 seconds), and the count in each non-empty bucket, keyed by the bucket's upper limit
+        """
+        count = sum(self.counts)
+        return {
+            "count": count,
+            "mean": self.total / count if count else 0.0,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "buckets": [(bucket_limit(bucket), bucket_count)
+                        for bucket, bucket_count in enumerate(self.counts) if bucket_count],
+        }
+
+
+def bucket_limit(bucket):
+    """
+    :return: the upper limit, in seconds, of values counted in a histogram bucket
+    """
+    if bucket == HISTOGRAM_BUCKETS - 1:
+        return float('inf')
+    return (1 << bucket) / 1000000.0
+
+
+class SenderStats(object):
+    """
+    Counters for one connection to SAS, updated by its MessageSender.  They belong to the Client
+    rather than the sender thread, so that they carry on across restarts.
+    """
+
+    def __init__(self):
+        self.sent = 0
+        self.bytes_sent = 0
+        self.discarded = 0
+        self.spooled = 0
+        self.reconnects = 0
+        self.heartbeats = 0
+        self.failed = 0
+        self.restarts = 0
+        self.write_latency = Histogram()
+
+
+def connection_stats(queue, stats):
+    """
+    :param queue: The MessageBuffer for a connection
+    :param stats: The SenderStats for the connection
+    :return: dict of statistics for the connection
+    """
+    return {
+        "enqueued": queue.put_count,
+        "sent": stats.sent,
+        "dropped": (queue.rejected + queue.evicted + queue.sampled_out + stats.discarded +
+                    stats.failed),
+        "rejected": queue.rejected,
+        "evicted": queue.evicted,
+        "sampled_out": queue.sampled_out,
+        "blocked": queue.blocked,
+        "spooled": stats.spooled,
+        "bytes_sent": stats.bytes_sent,
+        "queue_depth": len(queue),
+        "queue_high_water": queue.high_water,
+        "queue_bytes": queue.queued_bytes(),
+        "queue_bytes_high_water": queue.bytes_high_water,
+        "reconnects": stats.reconnects,
+        "heartbeats": stats.heartbeats,
+        "failed": stats.failed,
+        "restarts": stats.restarts,
+        "queue_wait": queue.wait_latency,
+        "write_latency": stats.write_latency,
+    }
+
+
+def client_stats(queues, sender_stats):
+    """
+    :return: dict of statistics summed over all of a client's connections, with the histograms as
+             snapshots, and a list of the statistics for each connection
+    """
+    connections = [connection_stats(queue, stats) for queue, stats in zip(queues, sender_stats)]
+
+    totals = {}
+    for name in connections[0]:
+        if name in ("queue_wait", "write_latency"):
+            combined = Histogram()
+            for connection in connections:
+                combined.merge(connection[name])
+                connection[name] = connection[name].snapshot()
+            totals[name] = combined.snapshot()
+        else:
+            totals[name] = sum(connection[name] for connection in connections)
+    totals["connections"] = connections
+    return totals
@@ -0,0 +1,83 @@
+# @file tracer.py
+# Copyright (C) 2015  Metaswitch Networks Ltd
+
+import binascii
+import collections
+import itertools
+import threading
+import time
+
+from metaswitch.sasclient.constants import MESSAGE_STRINGS
+from metaswitch.sasclient.messages import message_trail_id, message_type
+
+# The default number of rendered messages to keep.
+DEFAULT_TRACE_CAPACITY = 1000
+
+
+class MessageTracer(object):
+    """
+    Keeps the most recent of a sample of the messages sent, rendered as text, to be dumped on
+    demand.  Rendering a message is expensive, so rather than logging every message at debug level,
+    trace one in every sample_interval messages, and every message on the trails of interest.
+    """
+
+    def __init__(self, sample_interval=None, trail_ids=(), capacity=DEFAULT_TRACE_CAPACITY):
+        """
+        :param sample_interval: Trace one in this many messages.  By default, only messages on the
+                                given trails are traced.
+        :param trail_ids: IDs of trails whose messages are all traced
+        :param capacity: The number of traced messages to keep
+        """
+        self._sample_interval = sample_interval
+        self._trail_ids = set(trail_ids)
+        self._messages = collections.deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+        # Counting with itertools.count is atomic, so threads sending at once don't need a lock to
+        # choose which messages to sample.
+        self._counter = itertools.count()
+
+    def trace_trail(self, trail_id):
+        """
+        Start tracing every message on a trail.
+        """
+        with self._lock:
+            self._trail_ids = self._trail_ids | set([trail_id])
+
+    def untrace_trail(self, trail_id):
+        """
+        Stop tracing every message on a trail.
+        """
+        with self._lock:
+            self._trail_ids = self._trail_ids - set([trail_id])
+
+    def trace(self, message):
+        """
+        Render and keep a message, if it is one to trace.
+        """
+        sampled = (self._sample_interval is not None and
+                   next(self._counter) % self._sample_interval == 0)
+        if sampled or (self._trail_ids and message_trail_id(message) in self._trail_ids):
+            self._messages.append((time.time(), render(message)))
+
+    def dump(self):
+        """
+        :return: list of (time traced, rendered message) pairs for the messages kept, oldest first
+        """
+        return list(self._messages)
+
+    def clear(self):
+        self._messages.clear()
+
+
+def render(message):
+    """
+    :param message: A Message, or a serialized message
+    :return: a description of the message
+    """
+    if isinstance(message, bytes):
+        return "Serialized SAS Message: {} on trail {}\n   {}".format(
+            MESSAGE_STRINGS.get(message_type(message), "Unknown type"),
+            message_trail_id(message),
+            binascii.hexlify(message).decode("ascii"))
+    return str(message)
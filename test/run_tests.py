@@ -4,6 +4,8 @@ import unittest
 
 if __name__ == "__main__":
     directory = os.path.dirname(os.path.realpath(__file__))
+    # The tests import their helpers (e.g. fake_sas) by name, which Python 3 only finds on the path.
+    sys.path.insert(0, os.path.join(directory, "tests"))
     suite = unittest.TestLoader().discover(directory)
 
     args = sys.argv[1:]
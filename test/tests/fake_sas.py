@@ -0,0 +1,148 @@
+import socket
+import struct
+import threading
+import time
+import unittest
+from metaswitch.sasclient import Event, Trail, main
+from metaswitch.sasclient.constants import MESSAGE_EVENT
+
+
+class FakeSAS(object):
+    """
+    A local listener that SAS clients can connect to, recording everything sent on each connection.
+    While it is in use, clients connect to it by default.
+    """
+    def __init__(self, port=0):
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(('127.0.0.1', port))
+        self._server.listen(16)
+        self.address = '127.0.0.1'
+        self.port = self._server.getsockname()[1]
+
+        self._lock = threading.Lock()
+        self._stopped = False
+        self._sockets = []
+        self.connections = []
+
+        self._original_port = main.DEFAULT_SAS_PORT
+        main.DEFAULT_SAS_PORT = self.port
+
+        acceptor = threading.Thread(target=self._accept)
+        acceptor.daemon = True
+        acceptor.start()
+
+    def stop(self):
+        main.DEFAULT_SAS_PORT = self._original_port
+        try:
+            # Wake the acceptor, so the port is free for another FakeSAS.
+            self._server.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self._server.close()
+        with self._lock:
+            # Any connection accepted from now on is closed by the acceptor.
+            self._stopped = True
+            for sock in self._sockets:
+                self._close(sock)
+
+    @staticmethod
+    def _close(sock):
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        sock.close()
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self._server.accept()
+            except (socket.error, OSError):
+                return
+            data = bytearray()
+            with self._lock:
+                if self._stopped:
+                    self._close(sock)
+                    return
+                self._sockets.append(sock)
+                self.connections.append(data)
+            reader = threading.Thread(target=self._read, args=(sock, data))
+            reader.daemon = True
+            reader.start()
+
+    def _read(self, sock, data):
+        while True:
+            try:
+                chunk = sock.recv(65536)
+            except (socket.error, OSError):
+                return
+            if not chunk:
+                return
+            with self._lock:
+                data.extend(chunk)
+
+    def messages(self, connection):
+        """
+        :return: the complete messages received on a connection, as a list of
+                 (message type, serialized message) pairs (none, if the connection hasn't been
+                 made yet)
+        """
+        with self._lock:
+            if connection >= len(self.connections):
+                return []
+            data = bytes(self.connections[connection])
+        result = []
+        while len(data) >= 4:
+            length = struct.unpack('!h', data[:2])[0]
+            if len(data) < length:
+                break
+            result.append((bytearray(data[3:4])[0], data[:length]))
+            data = data[length:]
+        return result
+
+    def received(self, msg_type=MESSAGE_EVENT, connection=None):
+        """
+        :return: the complete messages of a type received on a connection, or on every connection
+        """
+        connections = [connection] if connection is not None else range(len(self.connections))
+        return [msg for index in connections
+                for received_type, msg in self.messages(index) if received_type == msg_type]
+
+    def wait_for(self, condition, timeout=5):
+        """
+        Wait until condition() returns True.
+        :return: whether it did so within the timeout
+        """
+        deadline = time.time() + timeout
+        while not condition():
+            if time.time() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+
+def sequence_number(event):
+    """
+    :return: the sequence number of a serialized event sent by FakeSASTestCase.send_events
+    """
+    return struct.unpack('=i', event[30:34])[0]
+
+
+class FakeSASTestCase(unittest.TestCase):
+    """
+    Base class for tests of clients against a FakeSAS, which is started for each test.
+    """
+    def setUp(self):
+        self.sas = FakeSAS()
+
+    def tearDown(self):
+        self.sas.stop()
+
+    def send_events(self, client, count, var_params=()):
+        """
+        Send events on a trail, each with its sequence number as its static parameter.
+        """
+        trail = Trail()
+        for sequence in range(count):
+            client.send(Event(trail, 1, 0, [sequence], list(var_params)))
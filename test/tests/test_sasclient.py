@@ -1,5 +1,6 @@
 import unittest
 from metaswitch.sasclient import Trail
+from metaswitch.sasclient.main import TrailIdGenerator
 
 TRAIL_ID = 111
 
@@ -11,9 +12,9 @@ TRAIL_ID = 111
 class SASClientTestCase(unittest.TestCase):
 
     def setUp(self):
-        # Make the trail something fixed
-        with Trail.next_trail_lock:
-            Trail.next_trail = TRAIL_ID
+        # Make the trail something fixed, for this test only.
+        self.addCleanup(setattr, Trail, 'id_generator', Trail.id_generator)
+        Trail.id_generator = TrailIdGenerator(prefix=0, start=TRAIL_ID)
 
     def tearDown(self):
         pass
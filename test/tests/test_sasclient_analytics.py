@@ -4,23 +4,23 @@ from test_sasclient import SASClientTestCase
 TIMESTAMP = 1450180692598
 
 MSG_XML_NO_STORE = (
-    '\x00Y\x03\x07\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x0f\x00'
-    '\x00\x00\x00\x00\x00\x00\x02\x00\x00\nTestFormat\x00\x0eTestFriendlyID'
-    '\x00\x00\x00\x1b<data>Analytics data</data>'
+    b'\x00Y\x03\x07\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x0f\x00'
+    b'\x00\x00\x00\x00\x00\x00\x02\x00\x00\nTestFormat\x00\x0eTestFriendlyID'
+    b'\x00\x00\x00\x1b<data>Analytics data</data>'
 )
 MSG_JSON_NO_STORE = (
-    '\x00T\x03\x07\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x0f\x00'
-    '\x00\x00\x00\x00\x00\x00\x01\x00\x00\nTestFormat\x00\x0eTestFriendlyID'
-    '\x00\x00\x00\x16data: {"key": "value"}')
+    b'\x00T\x03\x07\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x0f\x00'
+    b'\x00\x00\x00\x00\x00\x00\x01\x00\x00\nTestFormat\x00\x0eTestFriendlyID'
+    b'\x00\x00\x00\x16data: {"key": "value"}')
 MSG_XML_STORE = (
-    '\x00Y\x03\x07\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x0f\x00'
-    '\x00\xde\x00\x00\x00\x00\x02\x01\x00\nTestFormat\x00\x0eTestFriendlyID'
-    '\x00\x00\x00\x1b<data>Analytics data</data>'
+    b'\x00Y\x03\x07\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x0f\x00'
+    b'\x00\xde\x00\x00\x00\x00\x02\x01\x00\nTestFormat\x00\x0eTestFriendlyID'
+    b'\x00\x00\x00\x1b<data>Analytics data</data>'
 )
 MSG_JSON_STORE = (
-    '\x00T\x03\x07\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x0f\x00'
-    '\x00\xde\x00\x00\x00\x00\x01\x01\x00\nTestFormat\x00\x0eTestFriendlyID'
-    '\x00\x00\x00\x16data: {"key": "value"}'
+    b'\x00T\x03\x07\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x0f\x00'
+    b'\x00\xde\x00\x00\x00\x00\x01\x01\x00\nTestFormat\x00\x0eTestFriendlyID'
+    b'\x00\x00\x00\x16data: {"key": "value"}'
 )
 
 
@@ -72,6 +72,29 @@ class SASClientAnalyticsTest(SASClientTestCase):
         self.assertEqual(message.serialize(), MSG_JSON_STORE)
         self.assertEqual(message.get_format_type(), "JSON")
 
+    def test_serialized_size(self):
+        message = Analytics(Trail(),
+                            Analytics.FORMAT_XML,
+                            'TestFormat',
+                            'TestFriendlyID',
+                            False).set_timestamp(TIMESTAMP)
+        message.add_variable_param('<data>Analytics data</data>')
+        self.assertEqual(message.serialized_size(), len(MSG_XML_NO_STORE))
+
+    def test_changed_strings(self):
+        # The source type and friendly ID can be changed after the message has been serialized.
+        message = Analytics(Trail(),
+                            Analytics.FORMAT_XML,
+                            'Other',
+                            'Other',
+                            False).set_timestamp(TIMESTAMP)
+        message.add_variable_param('<data>Analytics data</data>')
+        message.serialize()
+        message.source_type = 'TestFormat'
+        message.friendly_id = 'TestFriendlyID'
+        self.assertEqual(message.serialized_size(), len(MSG_XML_NO_STORE))
+        self.assertEqual(message.serialize(), MSG_XML_NO_STORE)
+
     def test_string_format(self):
         message = Analytics(Trail(),
                             Analytics.FORMAT_JSON,
@@ -0,0 +1,106 @@
+import struct
+import unittest
+
+try:
+    import asyncio
+    from metaswitch.sasclient import AsyncClient
+except ImportError:
+    asyncio = None
+
+from metaswitch.sasclient import Event, Trail
+from metaswitch.sasclient.constants import (
+    MESSAGE_EVENT, MESSAGE_INITIALISATION, MESSAGE_MARKER)
+
+
+def split_messages(data):
+    """
+    Split a stream of serialized SAS messages into a list of (message type, message) pairs.
+    """
+    result = []
+    while data:
+        length = struct.unpack('!h', data[:2])[0]
+        result.append((bytearray(data[3:4])[0], data[:length]))
+        data = data[length:]
+    return result
+
+
+@unittest.skipIf(asyncio is None, "asyncio is not available")
+class SASClientAsyncClientTest(unittest.TestCase):
+    """
+    Test the asyncio client against a local listener.
+    """
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        # Before Python 3.10, asyncio.Event and asyncio.sleep bind to the current event loop when
+        # they're created, so make it the test's loop.
+        asyncio.set_event_loop(self.loop)
+        self.received = bytearray()
+        self.connected = asyncio.Event()
+        test = self
+
+        class Listener(asyncio.Protocol):
+            def connection_made(self, transport):
+                test.connected.set()
+
+            def data_received(self, data):
+                test.received.extend(data)
+
+        self.server = self.loop.run_until_complete(
+            self.loop.create_server(Listener, '127.0.0.1', 0))
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    def tearDown(self):
+        self.server.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def run_briefly(self, delay=0.1):
+        self.loop.run_until_complete(asyncio.sleep(delay))
+
+    def test_send(self):
+        client = AsyncClient("system", "type", "resource", '127.0.0.1',
+                             loop=self.loop, sas_port=self.port)
+        self.loop.run_until_complete(asyncio.wait_for(self.connected.wait(), 5))
+        self.run_briefly()
+        for i in range(10):
+            client.send(Event(Trail(), i))
+        self.run_briefly()
+        client.stop()
+        self.run_briefly()
+
+        types = [msg_type for msg_type, _ in split_messages(bytes(self.received))]
+        self.assertEqual(types, [MESSAGE_INITIALISATION] + [MESSAGE_EVENT] * 10)
+
+    def test_send_event(self):
+        client = AsyncClient("system", "type", "resource", '127.0.0.1',
+                             loop=self.loop, sas_port=self.port)
+        self.loop.run_until_complete(asyncio.wait_for(self.connected.wait(), 5))
+        self.run_briefly()
+        client.send_event(Trail().get_trail_id(), 1, static_params=[1], var_params=["a"])
+        client.send_marker(Trail().get_trail_id(), 2)
+        self.run_briefly()
+        client.stop()
+        self.run_briefly()
+
+        types = [msg_type for msg_type, _ in split_messages(bytes(self.received))]
+        self.assertEqual(types, [MESSAGE_INITIALISATION, MESSAGE_EVENT, MESSAGE_MARKER])
+
+    def test_discard_when_paused(self):
+        client = AsyncClient("system", "type", "resource", '127.0.0.1',
+                             loop=self.loop, sas_port=self.port)
+        self.loop.run_until_complete(asyncio.wait_for(self.connected.wait(), 5))
+        self.run_briefly()
+
+        # Simulate the transport's write buffer passing its high watermark.
+        client._pause_writing()
+        client.send(Event(Trail(), 1))
+        client._resume_writing()
+        client.send(Event(Trail(), 2))
+        self.run_briefly()
+        client.stop()
+        self.run_briefly()
+
+        events = [msg for msg_type, msg in split_messages(bytes(self.received))
+                  if msg_type == MESSAGE_EVENT]
+        self.assertEqual(len(events), 1)
@@ -0,0 +1,120 @@
+import unittest
+import zlib
+from metaswitch.sasclient import Client, Event, Trail, COMPRESS_AUTO, COMPRESS_ZLIB
+from metaswitch.sasclient.compression import CompressionPolicy
+from metaswitch.sasclient.constants import MESSAGE_EVENT
+from fake_sas import FakeSAS
+
+LONG_PARAM = b"<sip:alice@example.com>;tag=1234 " * 20
+
+
+class SASClientCompressionTest(unittest.TestCase):
+    """
+    Test compression of variable parameters by a CompressionPolicy.
+    """
+    def test_threshold(self):
+        policy = CompressionPolicy(threshold=64)
+        self.assertEqual(policy.compress("short"), "short")
+        self.assertEqual(zlib.decompress(policy.compress(LONG_PARAM)), LONG_PARAM)
+
+        stats = policy.stats()
+        self.assertEqual(stats["params"], 2)
+        self.assertEqual(stats["compressed"], 1)
+        self.assertEqual(stats["bytes_in"], len("short") + len(LONG_PARAM))
+        self.assertLess(stats["ratio"], 0.5)
+        self.assertGreater(stats["cpu_time"], 0)
+
+    def test_incompressible(self):
+        # Data that zlib can't shrink is sent as it is.
+        data = zlib.compress(LONG_PARAM)
+        policy = CompressionPolicy(threshold=0)
+        self.assertEqual(policy.compress(data), data)
+        self.assertEqual(policy.stats()["compressed"], 0)
+
+    def test_level(self):
+        fast = CompressionPolicy(level=1).compress(LONG_PARAM)
+        self.assertEqual(zlib.decompress(fast), LONG_PARAM)
+        self.assertEqual(fast, zlib.compress(LONG_PARAM, 1))
+
+    def test_zlib_unconditional(self):
+        # COMPRESS_ZLIB compresses however short the parameter.
+        event = Event(Trail(), 1).add_variable_param("a", compress=COMPRESS_ZLIB)
+        self.assertEqual(zlib.decompress(event.var_params[0]), b"a")
+
+    def test_policy_param(self):
+        policy = CompressionPolicy()
+        event = Event(Trail(), 1).add_variable_params(["a", LONG_PARAM], compress=policy)
+        self.assertEqual(event.var_params[0], b"a")
+        self.assertEqual(zlib.decompress(event.var_params[1]), LONG_PARAM)
+
+    def test_auto(self):
+        # Parameters added with COMPRESS_AUTO are compressed by the client's policy as the message
+        # is sent.
+        policy = CompressionPolicy(threshold=64)
+        client = Client("system", "type", "resource", "localhost", start=False,
+                        compression_policy=policy)
+        event = Event(Trail(), 1).add_variable_param("a", compress=COMPRESS_AUTO)
+        event.add_variable_param(LONG_PARAM, compress=COMPRESS_AUTO)
+        event.add_variable_param(LONG_PARAM)
+        self.assertEqual(event.var_params, [b"a", LONG_PARAM, LONG_PARAM])
+
+        client.send(event)
+        self.assertEqual(event.var_params[0], b"a")
+        self.assertEqual(zlib.decompress(event.var_params[1]), LONG_PARAM)
+        self.assertEqual(event.var_params[2], LONG_PARAM)
+        self.assertEqual(event.serialized_size(), len(event.serialize()))
+
+        stats = client.stats()["compression"]
+        self.assertEqual(stats["params"], 2)
+        self.assertEqual(stats["compressed"], 1)
+
+    def test_auto_unsent(self):
+        # Until the message is sent, it serializes with the parameter uncompressed.
+        event = Event(Trail(), 1).add_variable_param(LONG_PARAM, compress=COMPRESS_AUTO)
+        self.assertIn(LONG_PARAM, event.serialize())
+
+
+class SASClientDeferredEncodingTest(unittest.TestCase):
+    """
+    Test messages whose parameters are encoded and compressed by the sender.
+    """
+    def test_same_as_immediate(self):
+        trail = Trail()
+        messages = []
+        for deferred in (False, True):
+            event = Event(trail, 1, 0, [5], [u"caf\xe9", 42], deferred=deferred)
+            event.add_variable_param(LONG_PARAM, compress=COMPRESS_ZLIB)
+            event.set_timestamp(1)
+            messages.append(event.serialize())
+        self.assertEqual(messages[0], messages[1])
+
+    def test_left_for_sender(self):
+        client = Client("system", "type", "resource", "localhost", start=False)
+        param = u"caf\xe9" * 100
+        event = Event(Trail(), 1, deferred=True).add_variable_param(param, compress=COMPRESS_ZLIB)
+        client.send(event)
+        self.assertIs(event.var_params[0], param)
+        self.assertEqual(client.stats()["enqueued"], 1)
+
+    def test_sent(self):
+        sas = FakeSAS()
+        policy = CompressionPolicy(threshold=64)
+        client = Client("system", "type", "resource", sas.address, compression_policy=policy)
+        try:
+            trail = Trail()
+            event = Event(trail, 1, var_params=[u"caf\xe9"], deferred=True)
+            event.add_variable_param(LONG_PARAM, compress=COMPRESS_AUTO)
+            event.add_variable_param(LONG_PARAM, compress=COMPRESS_ZLIB)
+            client.send(event)
+
+            self.assertTrue(sas.wait_for(lambda: len(sas.messages(0)) == 2))
+            msg_type, data = sas.messages(0)[1]
+            self.assertEqual(msg_type, MESSAGE_EVENT)
+            expected = Event(trail, 1, var_params=[u"caf\xe9"])
+            expected.add_variable_param(LONG_PARAM, compress=policy)
+            expected.add_variable_param(LONG_PARAM, compress=COMPRESS_ZLIB)
+            self.assertEqual(data[12:], expected.serialize()[12:])
+            self.assertEqual(policy.stats()["compressed"], 2)
+        finally:
+            client.stop()
+            sas.stop()
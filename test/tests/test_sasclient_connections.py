@@ -0,0 +1,52 @@
+import struct
+from metaswitch.sasclient import Client, Event, Trail
+from metaswitch.sasclient.constants import MESSAGE_EVENT, MESSAGE_INITIALISATION
+from fake_sas import FakeSASTestCase
+
+CONNECTIONS = 3
+TRAILS = 30
+EVENTS_PER_TRAIL = 10
+
+
+class SASClientConnectionsTest(FakeSASTestCase):
+    """
+    Test sending over several connections to SAS.
+    """
+    def setUp(self):
+        super(SASClientConnectionsTest, self).setUp()
+        self.client = Client("system", "type", "resource", self.sas.address,
+                             connections=CONNECTIONS)
+
+    def tearDown(self):
+        self.client.stop()
+        super(SASClientConnectionsTest, self).tearDown()
+
+    def test_trails_stay_on_one_connection_in_order(self):
+        trails = [Trail() for _ in range(TRAILS)]
+        for sequence in range(EVENTS_PER_TRAIL):
+            for trail in trails:
+                self.client.send(Event(trail, 1, static_params=[sequence]))
+
+        def events(connection):
+            # (trail ID, sequence number) of each event received on a connection
+            return [struct.unpack('!q', msg[12:20])[0:1] + struct.unpack('=i', msg[30:34])
+                    for msg_type, msg in self.sas.messages(connection)
+                    if msg_type == MESSAGE_EVENT]
+
+        # The client connects in the background, so wait for all of its connections.
+        self.assertTrue(self.client.wait_connected(5))
+        self.assertTrue(self.sas.wait_for(lambda: len(self.sas.connections) == CONNECTIONS))
+        self.assertTrue(self.sas.wait_for(
+            lambda: sum(len(events(c)) for c in range(CONNECTIONS)) == TRAILS * EVENTS_PER_TRAIL))
+
+        trails_seen = set()
+        for connection in range(CONNECTIONS):
+            self.assertEqual(self.sas.messages(connection)[0][0], MESSAGE_INITIALISATION)
+            received = events(connection)
+            connection_trails = set(trail_id for trail_id, _ in received)
+            self.assertFalse(connection_trails & trails_seen)
+            trails_seen |= connection_trails
+            for trail_id in connection_trails:
+                sequence = [seq for trail, seq in received if trail == trail_id]
+                self.assertEqual(sequence, list(range(EVENTS_PER_TRAIL)))
+        self.assertEqual(trails_seen, set(trail.get_trail_id() for trail in trails))
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import unittest
+from metaswitch.sasclient import (
+    Client, Event, Marker, Trail, TestClient, MARKER_ID_END, SCOPE_BRANCH, SCOPE_TRACE)
+from metaswitch.sasclient import overflow
+from metaswitch.sasclient.constants import MESSAGE_EVENT, MESSAGE_MARKER
+from metaswitch.sasclient.messages import (
+    encode_event, encode_marker, message_trail_id, message_type)
+from metaswitch.sasclient.msgbuffer import MessageBuffer
+from fake_sas import FakeSAS
+
+
+class SASClientDirectEncodeTest(unittest.TestCase):
+    """
+    Test sending events and markers without building Message objects.
+    """
+    def setUp(self):
+        self.trail = Trail()
+        self.trail_id = self.trail.get_trail_id()
+
+    def test_event_matches(self):
+        for static_params, var_params in [
+                ([], []),
+                ([1, -2, 0x7fffffff], []),
+                ([], ["an.example.host", u"caf\xe9", ""]),
+                ([80, 200], ["POST", "x" * 300])]:
+            event = Event(self.trail, 0x900001, 7, static_params, var_params)
+            self.assertEqual(
+                encode_event(self.trail_id, 0x900001, 7, static_params, var_params,
+                             timestamp=event.timestamp),
+                event.serialize())
+
+    def test_marker_matches(self):
+        for reactivate, scope in [(True, 0), (True, SCOPE_BRANCH), (False, SCOPE_TRACE)]:
+            marker = Marker(self.trail, MARKER_ID_END, 3, reactivate, scope, [5], ["sip:a@b"])
+            self.assertEqual(
+                encode_marker(self.trail_id, MARKER_ID_END, 3, reactivate, scope, [5],
+                              ["sip:a@b"], timestamp=marker.timestamp),
+                marker.serialize())
+
+    def test_fields(self):
+        data = encode_marker(self.trail_id, MARKER_ID_END)
+        self.assertEqual(message_type(data), MESSAGE_MARKER)
+        self.assertEqual(message_trail_id(data), self.trail_id)
+
+    def test_sent(self):
+        sas = FakeSAS()
+        client = Client("system", "type", "resource", sas.address)
+        try:
+            client.send_event(self.trail_id, 1, static_params=[10], var_params=["a"])
+            client.send(Event(self.trail, 2))
+            client.send_marker(self.trail_id, MARKER_ID_END)
+
+            def received():
+                return [msg_type for msg_type, _ in sas.messages(0)[1:]]
+            self.assertTrue(sas.wait_for(lambda: len(received()) == 3))
+            self.assertEqual(received(), [MESSAGE_EVENT, MESSAGE_EVENT, MESSAGE_MARKER])
+            # The event is as serialized, apart from the timestamp.
+            self.assertEqual(sas.messages(0)[1][1][20:],
+                             encode_event(self.trail_id, 1, 0, [10], ["a"])[20:])
+        finally:
+            client.stop()
+            sas.stop()
+
+    def test_test_client(self):
+        client = TestClient()
+        client.send_event(self.trail_id, 1)
+        client.send_marker(self.trail_id, MARKER_ID_END)
+        self.assertEqual([message_type(data) for data in client.message_queue],
+                         [MESSAGE_EVENT, MESSAGE_MARKER])
+
+    def test_queue_policies(self):
+        # Serialized messages are measured and prioritised like Message objects.
+        event = encode_event(self.trail_id, 1)
+        buf = MessageBuffer(1, overflow.Priority(), max_bytes=2 * len(event))
+        buf.put(event)
+        buf.put(event)
+        self.assertEqual(buf.queued_bytes(), 2 * len(event))
+        self.assertFalse(buf.put(event))
+
+        # The Marker is bigger than an Event, so displaces both.
+        self.assertFalse(buf.put(encode_marker(self.trail_id, MARKER_ID_END)))
+        self.assertEqual(buf.evicted, 2)
+        self.assertEqual(buf.rejected, 1)
@@ -1,34 +1,36 @@
+import array
+import unittest
 from metaswitch.sasclient import Event, Trail, COMPRESS_ZLIB
 from test_sasclient import SASClientTestCase
 
 TIMESTAMP = 1450180692598
 EVENT_STRING_EMPTY = (
-    '\x00\x1e\x03\x03\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x0f\x00\x00\xde\x00\x00'
-    '\x00\x00\x00\x00'
+    b'\x00\x1e\x03\x03\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x0f\x00\x00\xde\x00\x00'
+    b'\x00\x00\x00\x00'
 )
 EVENT_STRING_ONE_STATIC = (
-    '\x00"\x03\x03\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x0f\x00\x00\xde\x00\x00\x00'
-    '\x00\x00\x04M\x01\x00\x00'
+    b'\x00"\x03\x03\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x0f\x00\x00\xde\x00\x00\x00'
+    b'\x00\x00\x04M\x01\x00\x00'
 )
 EVENT_STRING_TWO_STATIC = (
-    '\x00&\x03\x03\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x0f\x00\x00\xde\x00\x00\x00'
-    '\x00\x00\x08M\x01\x00\x00\xbc\x01\x00\x00'
+    b'\x00&\x03\x03\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x0f\x00\x00\xde\x00\x00\x00'
+    b'\x00\x00\x08M\x01\x00\x00\xbc\x01\x00\x00'
 )
 EVENT_STRING_ONE_VAR = (
-    '\x00.\x03\x03\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x0f\x00\x00\xde\x00\x00\x00'
-    '\x00\x00\x00\x00\x0etest parameter'
+    b'\x00.\x03\x03\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x0f\x00\x00\xde\x00\x00\x00'
+    b'\x00\x00\x00\x00\x0etest parameter'
 )
 EVENT_STRING_TWO_VAR = (
-    '\x00D\x03\x03\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x0f\x00\x00\xde\x00\x00\x00'
-    '\x00\x00\x00\x00\x0etest parameter\x00\x14other test parameter'
+    b'\x00D\x03\x03\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x0f\x00\x00\xde\x00\x00\x00'
+    b'\x00\x00\x00\x00\x0etest parameter\x00\x14other test parameter'
 )
 EVENT_STRING_COMPRESSED_VAR = (
-    '\x006\x03\x03\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x0f\x00\x00\xde\x00\x00\x00'
-    '\x00\x00\x00\x00\x16x\x9c+I-.Q(H,J\xccM-I-\x02\x00)\xd0\x05\xa2'
+    b'\x006\x03\x03\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x0f\x00\x00\xde\x00\x00\x00'
+    b'\x00\x00\x00\x00\x16x\x9c+I-.Q(H,J\xccM-I-\x02\x00)\xd0\x05\xa2'
 )
 EVENT_STRING_ALL = (
-    '\x00L\x03\x03\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x0f\x00\x00\xde\x00\x00\x02'
-    '+\x00\x08M\x01\x00\x00\xbc\x01\x00\x00\x00\x0etest parameter\x00\x14other test parameter'
+    b'\x00L\x03\x03\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x0f\x00\x00\xde\x00\x00\x02'
+    b'+\x00\x08M\x01\x00\x00\xbc\x01\x00\x00\x00\x0etest parameter\x00\x14other test parameter'
 )
 
 
@@ -49,6 +51,7 @@ class SASClientEventTest(SASClientTestCase):
     def test_two_static_params(self):
         event = Event(Trail(), 222).set_timestamp(TIMESTAMP)
         event.add_static_params([333, 444])
+        self.assertEqual(event.static_params, [333, 444])
         self.assertEqual(event.serialize(), EVENT_STRING_TWO_STATIC)
 
     def test_one_variable_param(self):
@@ -113,3 +116,35 @@ class SASClientEventTest(SASClientTestCase):
         self.assertEqual(event_constructor.serialize(), event_plurals.serialize())
         self.assertEqual(event_constructor.serialize(), event_singles.serialize())
         self.assertEqual(event_constructor.serialize(), EVENT_STRING_ALL)
+
+    def test_serialize_into(self):
+        event = Event(Trail(), 222, 555, [333, 444], ["test parameter", "other test parameter"])
+        event.set_timestamp(TIMESTAMP)
+        self.assertEqual(event.serialized_size(), len(EVENT_STRING_ALL))
+        buf = bytearray(len(EVENT_STRING_ALL) + 4)
+        self.assertEqual(event.serialize_into(buf, 2), len(EVENT_STRING_ALL) + 2)
+        self.assertEqual(buf[2:-2], EVENT_STRING_ALL)
+
+    def test_binary_variable_params(self):
+        first = bytearray(b"test parameter")
+        second = memoryview(b"other test parameter")
+        event = Event(Trail(), 222).set_timestamp(TIMESTAMP)
+        event.add_variable_params([first, second])
+        self.assertEqual(event.serialize(), EVENT_STRING_TWO_VAR)
+        if bytes is not str:
+            # Python 3 keeps binary parameters as they are, until the message is serialized.
+            self.assertIs(event.var_params[0], first)
+            self.assertIs(event.var_params[1], second)
+
+    def test_text_variable_params(self):
+        event = Event(Trail(), 222).set_timestamp(TIMESTAMP)
+        event.add_variable_params([u"test parameter", b"other test parameter"])
+        self.assertEqual(event.serialize(), EVENT_STRING_TWO_VAR)
+        self.assertEqual(event.var_params, [b"test parameter", b"other test parameter"])
+
+    @unittest.skipIf(bytes is str, "Python 2 arrays don't support memoryview")
+    def test_wide_memoryview_param(self):
+        # Views of anything but bytes are measured in bytes, not items.
+        param = memoryview(array.array('i', [1, 2]))
+        event = Event(Trail(), 222).add_variable_param(param)
+        self.assertEqual(len(event.var_params[0]), 8)
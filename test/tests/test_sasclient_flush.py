@@ -0,0 +1,131 @@
+import socket
+import threading
+import time
+import unittest
+from metaswitch.sasclient import Client, Event, Trail, TestClient
+from fake_sas import FakeSASTestCase
+
+EVENTS = 1000
+VAR_PARAMS = ["an.example.host"]
+
+
+class SASClientFlushTest(FakeSASTestCase):
+    """
+    Test flushing the queue, and draining it when the client stops, against a local listener.
+    """
+
+    def test_flush(self):
+        client = Client("system", "type", "resource", self.sas.address)
+        try:
+            self.send_events(client, EVENTS, VAR_PARAMS)
+            self.assertEqual(client.flush(5)["unsent"], 0)
+            self.assertEqual(client.stats()["sent"], EVENTS)
+            self.assertTrue(self.sas.wait_for(lambda: len(self.sas.received()) == EVENTS))
+        finally:
+            client.stop()
+
+    def test_flush_doesnt_linger(self):
+        # The sender would otherwise wait for more messages to fill the batch.
+        client = Client("system", "type", "resource", self.sas.address, batch_linger=10)
+        try:
+            self.assertTrue(client.wait_connected(5))
+            self.send_events(client, 10, VAR_PARAMS)
+            start = time.time()
+            self.assertEqual(client.flush(5), {"flushed": 10, "unsent": 0})
+            self.assertLess(time.time() - start, 1)
+        finally:
+            client.stop()
+
+    def test_flush_during_traffic(self):
+        # Messages sent after the flush starts don't hold it up.
+        client = Client("system", "type", "resource", self.sas.address)
+        stopper = threading.Event()
+
+        def keep_sending():
+            while not stopper.is_set():
+                self.send_events(client, 10, VAR_PARAMS)
+                time.sleep(0.001)
+        sender = threading.Thread(target=keep_sending)
+        try:
+            self.assertTrue(client.wait_connected(5))
+            self.send_events(client, EVENTS, VAR_PARAMS)
+            sender.start()
+            start = time.time()
+            client.flush(5)
+            self.assertLess(time.time() - start, 1)
+            self.assertGreaterEqual(client.stats()["sent"], EVENTS)
+        finally:
+            stopper.set()
+            if sender.is_alive():
+                sender.join()
+            client.stop()
+
+    def test_flush_idle(self):
+        client = Client("system", "type", "resource", self.sas.address)
+        try:
+            self.assertTrue(client.wait_connected(5))
+            start = time.time()
+            self.assertEqual(client.flush(5), {"flushed": 0, "unsent": 0})
+            self.assertLess(time.time() - start, 0.5)
+        finally:
+            client.stop()
+
+    def test_stop_drains(self):
+        client = Client("system", "type", "resource", self.sas.address)
+        self.assertTrue(client.wait_connected(5))
+        self.send_events(client, EVENTS, VAR_PARAMS)
+        start = time.time()
+        result = client.stop(drain_timeout=5)
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(result["abandoned"], 0)
+        self.assertEqual(client.stats()["sent"], EVENTS)
+        self.assertTrue(self.sas.wait_for(lambda: len(self.sas.received()) == EVENTS))
+
+    def test_stop_without_draining(self):
+        client = Client("system", "type", "resource", self.sas.address, start=False)
+        self.send_events(client, EVENTS, VAR_PARAMS)
+        client.start()
+        self.assertEqual(client.stop()["flushed"], 0)
+
+
+class SASClientDrainTimeoutTest(unittest.TestCase):
+    """
+    Test that draining is bounded when SAS can't be reached.
+    """
+    def setUp(self):
+        # A listener whose backlog is full, so that further connections to it hang.
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(0)
+        self.port = self.listener.getsockname()[1]
+        self.backlog = socket.create_connection(('127.0.0.1', self.port))
+
+    def tearDown(self):
+        self.backlog.close()
+        self.listener.close()
+
+    def test_stop(self):
+        client = Client("system", "type", "resource", '127.0.0.1', sas_port=self.port)
+        trail = Trail()
+        for _ in range(EVENTS):
+            client.send(Event(trail, 1))
+
+        start = time.time()
+        result = client.stop(drain_timeout=0.5)
+        elapsed = time.time() - start
+        self.assertGreaterEqual(elapsed, 0.5)
+        self.assertLess(elapsed, 1.5)
+        self.assertEqual(result, {"flushed": 0, "abandoned": EVENTS})
+
+    def test_flush(self):
+        client = Client("system", "type", "resource", '127.0.0.1', sas_port=self.port)
+        try:
+            client.send(Event(Trail(), 1))
+            self.assertEqual(client.flush(0.2), {"flushed": 0, "unsent": 1})
+        finally:
+            client.stop()
+
+    def test_test_client(self):
+        client = TestClient()
+        self.assertEqual(client.flush(1), {"flushed": 0, "unsent": 0})
+        self.assertEqual(client.stop(drain_timeout=1), {"flushed": 0, "abandoned": 0})
@@ -0,0 +1,124 @@
+import os
+import struct
+import threading
+import time
+import unittest
+from metaswitch.sasclient import Client, Event, Trail, sender
+from metaswitch.sasclient.constants import MESSAGE_EVENT, MESSAGE_INITIALISATION
+from metaswitch.sasclient.main import TrailIdGenerator
+from metaswitch.sasclient.messages import RESOURCE_BUNDLE_BASE
+from fake_sas import FakeSASTestCase
+
+CHILDREN = 3
+EVENTS_PER_CHILD = 20
+
+
+def event_ids(messages):
+    """
+    :return: the event IDs of the Events in a list of received messages
+    """
+    return [struct.unpack('!i', msg[20:24])[0] & ~RESOURCE_BUNDLE_BASE
+            for msg_type, msg in messages if msg_type == MESSAGE_EVENT]
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), "fork is not available")
+class SASClientForkTest(FakeSASTestCase):
+    """
+    Test that a client created before a fork works in each child.
+    """
+    def setUp(self):
+        super(SASClientForkTest, self).setUp()
+        self.client = Client("system", "type", "resource", self.sas.address)
+
+    def tearDown(self):
+        self.client.stop()
+        super(SASClientForkTest, self).tearDown()
+
+    def run_child(self, child):
+        """
+        Send some events from a forked child, wait for them to go, and exit.
+        """
+        try:
+            for _ in range(EVENTS_PER_CHILD):
+                self.client.send(Event(Trail(), child))
+            deadline = time.time() + 5
+            while not self.client._queues[0].empty() and time.time() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.1)
+            self.client.stop()
+        finally:
+            os._exit(0)
+
+    def test_messages_sent_from_each_child(self):
+        self.assertTrue(self.sas.wait_for(lambda: len(self.sas.connections) == 1))
+
+        pids = []
+        for child in range(1, CHILDREN + 1):
+            pid = os.fork()
+            if pid == 0:
+                self.run_child(child)
+            pids.append(pid)
+        for pid in pids:
+            os.waitpid(pid, 0)
+
+        # Each child should have made its own connection, starting with an Init message.
+        self.assertTrue(self.sas.wait_for(lambda: len(self.sas.connections) == CHILDREN + 1))
+        self.assertTrue(self.sas.wait_for(
+            lambda: sum(len(event_ids(self.sas.messages(c)))
+                        for c in range(1, CHILDREN + 1)) == CHILDREN * EVENTS_PER_CHILD))
+        children_seen = set()
+        for connection in range(1, CHILDREN + 1):
+            messages = self.sas.messages(connection)
+            self.assertEqual(messages[0][0], MESSAGE_INITIALISATION)
+            ids = event_ids(messages)
+            self.assertEqual(len(set(ids)), 1)
+            self.assertEqual(len(ids), EVENTS_PER_CHILD)
+            children_seen.add(ids[0])
+        self.assertEqual(children_seen, set(range(1, CHILDREN + 1)))
+
+        # The parent's connection is unaffected.
+        self.client.send(Event(Trail(), 100))
+        self.assertTrue(self.sas.wait_for(lambda: event_ids(self.sas.messages(0)) == [100]))
+
+    def test_started_in_child(self):
+        # A client created before the fork, but only started in the child (as by a pre-fork
+        # server's post-fork hook), gets one sender and one connection.
+        client = Client("system", "type", "resource", self.sas.address, start=False)
+        self.assertTrue(self.sas.wait_for(lambda: len(self.sas.connections) == 1))
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                client.start()
+                for _ in range(EVENTS_PER_CHILD):
+                    client.send(Event(Trail(), 1))
+                unsent = client.flush(5)["unsent"]
+                senders = [thread for thread in threading.enumerate()
+                           if isinstance(thread, sender.MessageSender) and thread.is_alive()]
+                # The client from setUp has no senders in the child.
+                if unsent == 0 and senders == client._workers and len(senders) == 1:
+                    status = 0
+                client.stop()
+            finally:
+                os._exit(status)
+        self.assertEqual(os.waitpid(pid, 0)[1], 0)
+
+        self.assertTrue(self.sas.wait_for(
+            lambda: len(event_ids(self.sas.messages(1))) == EVENTS_PER_CHILD))
+        self.assertEqual(len(self.sas.connections), 2)
+
+    def test_trail_ids_differ_in_child(self):
+        self.addCleanup(setattr, Trail, 'id_generator', Trail.id_generator)
+        Trail.id_generator = TrailIdGenerator()
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.write(write_fd, struct.pack('!q', Trail().get_trail_id()))
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        child_trail = struct.unpack('!q', os.read(read_fd, 8))[0]
+        os.close(read_fd)
+        os.close(write_fd)
+        self.assertNotEqual(child_trail >> 32, Trail().get_trail_id() >> 32)
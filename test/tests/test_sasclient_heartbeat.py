@@ -1,7 +1,11 @@
+import time
+from metaswitch.sasclient import Client, Event, Trail
+from metaswitch.sasclient.constants import MESSAGE_HEARTBEAT
 from metaswitch.sasclient.messages import Heartbeat
 from test_sasclient import SASClientTestCase
+from fake_sas import FakeSASTestCase
 
-HEARTBEAT_STRING = '\x00\x04\x03\x05'
+HEARTBEAT_STRING = b'\x00\x04\x03\x05'
 
 
 class SASClientHeartbeatTest(SASClientTestCase):
@@ -14,3 +18,41 @@ class SASClientHeartbeatTest(SASClientTestCase):
         self.assertEqual(heartbeat.serialize(), HEARTBEAT_STRING)
         # Now just check that __str__ doesn't throw
         self.assertGreater(len(str(heartbeat)), 0)
+
+
+class SASClientHeartbeatTimingTest(FakeSASTestCase):
+    """
+    Test when the sender sends heartbeats.
+    """
+    def heartbeats(self):
+        return self.sas.received(MESSAGE_HEARTBEAT, 0)
+
+    def test_idle(self):
+        client = Client("system", "type", "resource", self.sas.address, heartbeat_interval=0.1)
+        try:
+            self.assertTrue(self.sas.wait_for(lambda: len(self.heartbeats()) >= 3))
+            self.assertEqual(self.heartbeats()[0], HEARTBEAT_STRING)
+            self.assertGreaterEqual(client.stats()["heartbeats"], 3)
+        finally:
+            client.stop()
+
+    def test_busy(self):
+        # A connection with messages being sent more often than the interval sends no heartbeats.
+        client = Client("system", "type", "resource", self.sas.address, heartbeat_interval=0.5)
+        try:
+            trail = Trail()
+            for _ in range(20):
+                client.send(Event(trail, 1))
+                time.sleep(0.05)
+            self.assertTrue(self.sas.wait_for(lambda: client.stats()["sent"] == 20))
+            self.assertEqual(self.heartbeats(), [])
+        finally:
+            client.stop()
+
+    def test_stop_while_idle(self):
+        # The sender sleeps until the next heartbeat is due, but stops straight away.
+        client = Client("system", "type", "resource", self.sas.address, heartbeat_interval=30)
+        self.assertTrue(self.sas.wait_for(lambda: len(self.sas.messages(0)) == 1))
+        start = time.time()
+        client.stop()
+        self.assertLess(time.time() - start, 1)
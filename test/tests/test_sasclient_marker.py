@@ -8,41 +8,41 @@ from test_sasclient import SASClientTestCase
 
 TIMESTAMP = 1450180692598
 MARKER_STRING_EMPTY = (
-    '\x00 \x03\x04\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\xde\x00\x00\x00'
-    '\x00\x00\x00\x00\x00'
+    b'\x00 \x03\x04\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\xde\x00\x00\x00'
+    b'\x00\x00\x00\x00\x00'
 )
 MARKER_STRING_ONE_STATIC = (
-    '\x00$\x03\x04\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\xde\x00\x00\x00'
-    '\x00\x00\x00\x00\x04M\x01\x00\x00'
+    b'\x00$\x03\x04\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\xde\x00\x00\x00'
+    b'\x00\x00\x00\x00\x04M\x01\x00\x00'
 )
 MARKER_STRING_TWO_STATIC = (
-    '\x00(\x03\x04\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\xde\x00\x00\x00'
-    '\x00\x00\x00\x00\x08M\x01\x00\x00\xbc\x01\x00\x00'
+    b'\x00(\x03\x04\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\xde\x00\x00\x00'
+    b'\x00\x00\x00\x00\x08M\x01\x00\x00\xbc\x01\x00\x00'
 )
 MARKER_STRING_ONE_VAR = (
-    '\x000\x03\x04\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\xde\x00\x00\x00'
-    '\x00\x00\x00\x00\x00\x00\x0etest parameter'
+    b'\x000\x03\x04\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\xde\x00\x00\x00'
+    b'\x00\x00\x00\x00\x00\x00\x0etest parameter'
 )
 MARKER_STRING_TWO_VAR = (
-    '\x00F\x03\x04\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\xde\x00\x00\x00'
-    '\x00\x00\x00\x00\x00\x00\x0etest parameter\x00\x14other test parameter'
+    b'\x00F\x03\x04\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\xde\x00\x00\x00'
+    b'\x00\x00\x00\x00\x00\x00\x0etest parameter\x00\x14other test parameter'
 )
 MARKER_STRING_ALL = (
-    '\x00N\x03\x04\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\xde\x00\x00\x02'
-    '+\x00\x00\x00\x08M\x01\x00\x00\xbc\x01\x00\x00\x00\x0etest parameter\x00\x14other test parame'
-    'ter'
+    b'\x00N\x03\x04\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\xde\x00\x00\x02'
+    b'+\x00\x00\x00\x08M\x01\x00\x00\xbc\x01\x00\x00\x00\x0etest parameter\x00\x14other test parame'
+    b'ter'
 )
 MARKER_STRING_BRANCH = (
-    '\x00 \x03\x04\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\xde\x00\x00\x00'
-    '\x00\x01\x01\x00\x00'
+    b'\x00 \x03\x04\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\xde\x00\x00\x00'
+    b'\x00\x01\x01\x00\x00'
 )
 MARKER_STRING_TRACE = (
-    '\x00 \x03\x04\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\xde\x00\x00\x00'
-    '\x00\x01\x02\x00\x00'
+    b'\x00 \x03\x04\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\xde\x00\x00\x00'
+    b'\x00\x01\x02\x00\x00'
 )
 MARKER_STRING_REACTIVATE = (
-    '\x00 \x03\x04\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\xde\x00\x00\x00'
-    '\x00\x03\x01\x00\x00'
+    b'\x00 \x03\x04\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\xde\x00\x00\x00'
+    b'\x00\x03\x01\x00\x00'
 )
 
 
@@ -0,0 +1,85 @@
+import threading
+import unittest
+from metaswitch.sasclient import Event, Trail, overflow
+from metaswitch.sasclient.msgbuffer import MessageBuffer
+
+
+class SASClientMessageBufferTest(unittest.TestCase):
+    """
+    Test the bounded buffer that holds messages waiting to be sent.
+    """
+    def test_fifo(self):
+        buf = MessageBuffer(10)
+        for i in range(1, 4):
+            self.assertTrue(buf.put(i))
+        self.assertEqual(len(buf), 3)
+        self.assertEqual([buf.pop(), buf.get(0), buf.pop()], [1, 2, 3])
+        self.assertIsNone(buf.pop())
+        self.assertTrue(buf.empty())
+
+    def test_bounded(self):
+        buf = MessageBuffer(2)
+        self.assertTrue(buf.put(1))
+        self.assertTrue(buf.put(2))
+        self.assertFalse(buf.put(3))
+        self.assertEqual(buf.clear(), 2)
+        self.assertTrue(buf.put(3))
+
+    def test_get_timeout(self):
+        buf = MessageBuffer(2)
+        self.assertIsNone(buf.get(0.01))
+
+    def test_get_woken_by_put(self):
+        buf = MessageBuffer(2)
+        timer = threading.Timer(0.05, buf.put, [1])
+        timer.start()
+        self.assertEqual(buf.get(5), 1)
+        timer.join()
+
+    def test_statistics(self):
+        buf = MessageBuffer(2)
+        for i in range(3):
+            buf.put(i)
+        buf.pop()
+        buf.get(0)
+        self.assertEqual(buf.put_count, 2)
+        self.assertEqual(buf.rejected, 1)
+        self.assertEqual(buf.high_water, 2)
+        self.assertEqual(buf.wait_latency.snapshot()["count"], 1)
+
+    def test_byte_budget(self):
+        trail = Trail()
+        small = Event(trail, 1)
+        large = Event(trail, 1, var_params=["x" * 100])
+        buf = MessageBuffer(1, max_bytes=2 * small.serialized_size() + large.serialized_size())
+        self.assertTrue(buf.put(small))
+        self.assertTrue(buf.put(large))
+        self.assertTrue(buf.put(small))
+        self.assertFalse(buf.put(small))
+        self.assertEqual(len(buf), 3)
+        self.assertEqual(buf.queued_bytes(), buf.bytes_high_water)
+
+        # Taking off the large message makes room for several small ones.
+        buf.pop()
+        buf.pop()
+        for _ in range(4):
+            self.assertTrue(buf.put(small))
+        self.assertEqual(buf.queued_bytes(), 5 * small.serialized_size())
+        self.assertEqual(buf.clear(), 5)
+        self.assertEqual(buf.queued_bytes(), 0)
+
+    def test_byte_budget_evicts_enough(self):
+        trail = Trail()
+        small = Event(trail, 1)
+        large = Event(trail, 1, var_params=["x" * 100])
+        buf = MessageBuffer(1, overflow.DropOldest(), max_bytes=large.serialized_size())
+        for _ in range(large.serialized_size() // small.serialized_size()):
+            self.assertTrue(buf.put(small))
+        self.assertFalse(buf.put(large))
+        self.assertEqual(len(buf), 1)
+        self.assertEqual(buf.queued_bytes(), large.serialized_size())
+
+    def test_too_big_for_budget(self):
+        buf = MessageBuffer(1, max_bytes=10)
+        self.assertFalse(buf.put(Event(Trail(), 1)))
+        self.assertEqual(buf.rejected, 1)
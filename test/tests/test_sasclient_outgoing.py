@@ -0,0 +1,175 @@
+import socket
+import time
+import unittest
+from metaswitch.sasclient import Client, Event, Trail
+from metaswitch.sasclient.constants import MESSAGE_INITIALISATION
+from metaswitch.sasclient.outgoing import OutgoingBuffer
+from metaswitch.sasclient.sender import SocketOptions
+from fake_sas import FakeSAS, sequence_number
+
+EVENTS = 100
+
+
+class TrickleSocket(object):
+    """
+    Stands in for a socket that takes no more than limit bytes per write.
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.data = b''
+
+    def send(self, data):
+        data = bytes(data[:self.limit]) if isinstance(data, bytes) else data[:self.limit].tobytes()
+        self.data += data
+        return len(data)
+
+
+class VectoredTrickleSocket(TrickleSocket):
+    def sendmsg(self, buffers):
+        return self.send(b''.join(buffer.tobytes() if isinstance(buffer, memoryview) else buffer
+                                  for buffer in buffers))
+
+
+class OutgoingBufferTest(unittest.TestCase):
+    """
+    Test the outgoing buffer's tracking of partial writes.
+    """
+    def fill(self, outgoing):
+        outgoing.append(b'aaabbbbccccc', [7, 12])
+        outgoing.append(b'ddeee')
+
+    def test_partial_writes(self):
+        for sock in (TrickleSocket(5), VectoredTrickleSocket(5)):
+            outgoing = OutgoingBuffer()
+            self.fill(outgoing)
+            self.assertEqual((len(outgoing), outgoing.unwritten_bytes()), (3, 17))
+
+            completed = []
+            while outgoing:
+                sent, count = outgoing.write(sock)
+                self.assertLessEqual(sent, 5)
+                completed.append(count)
+            self.assertEqual(sock.data, b'aaabbbbcccccddeee')
+            self.assertEqual(completed, [0, 1, 1, 1])
+            self.assertEqual((len(outgoing), outgoing.unwritten_bytes()), (0, 0))
+
+    def test_vectored(self):
+        # Where the socket supports it, several chunks are written at once.
+        outgoing = OutgoingBuffer()
+        self.fill(outgoing)
+        self.assertEqual(outgoing.write(TrickleSocket(100)), (12, 2))
+        outgoing = OutgoingBuffer()
+        self.fill(outgoing)
+        self.assertEqual(outgoing.write(VectoredTrickleSocket(100)), (17, 3))
+
+    def test_rewind(self):
+        # A message that was only partly written is written whole after rewinding.
+        outgoing = OutgoingBuffer()
+        self.fill(outgoing)
+        outgoing.write(TrickleSocket(9))
+        outgoing.rewind()
+        self.assertEqual((len(outgoing), outgoing.unwritten_bytes()), (2, 10))
+
+        sock = VectoredTrickleSocket(100)
+        self.assertEqual(outgoing.write(sock), (10, 2))
+        self.assertEqual(sock.data, b'cccccddeee')
+
+    def test_uncounted(self):
+        # Init messages and heartbeats aren't counted, and are dropped when rewinding.
+        outgoing = OutgoingBuffer()
+        outgoing.append(b'hb', counted=False)
+        self.fill(outgoing)
+        outgoing.rewind()
+        outgoing.prepend(b'init')
+        self.assertEqual((len(outgoing), outgoing.unwritten_bytes()), (3, 21))
+
+        self.assertEqual(outgoing.write(TrickleSocket(2)), (2, 0))
+        outgoing.rewind()
+        sock = VectoredTrickleSocket(100)
+        self.assertEqual(outgoing.write(sock), (17, 3))
+        self.assertEqual(sock.data, b'aaabbbbcccccddeee')
+
+    def test_take(self):
+        outgoing = OutgoingBuffer()
+        outgoing.prepend(b'init')
+        self.fill(outgoing)
+        outgoing.write(TrickleSocket(6))
+        self.assertEqual(outgoing.take(), (b'aaabbbbcccccddeee', 3))
+        self.assertFalse(outgoing)
+
+
+class SASClientBackedUpTest(unittest.TestCase):
+    """
+    Test the sender against a SAS that stops reading what it is sent.
+    """
+    def setUp(self):
+        # A listener that never accepts, so nothing sent to it is read.
+        self.stalled = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.stalled.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.stalled.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        self.stalled.bind(('127.0.0.1', 0))
+        self.stalled.listen(16)
+        self.port = self.stalled.getsockname()[1]
+        self.sas = None
+        self.client = None
+
+    def tearDown(self):
+        if self.client is not None:
+            self.client.stop()
+        if self.sas is not None:
+            self.sas.stop()
+        self.stalled.close()
+
+    def test_queue_drained_and_messages_whole(self):
+        options = SocketOptions(send_timeout=0.3, send_buffer_size=4096)
+        self.client = Client("system", "type", "resource", '127.0.0.1', sas_port=self.port,
+                             socket_options=options)
+        trail = Trail()
+        for sequence in range(EVENTS):
+            self.client.send(Event(trail, 1, 0, [sequence], ["x" * 2000]))
+
+        # The queue is emptied into the outgoing buffer, although SAS isn't taking the messages,
+        # and the connection is given up on once nothing more can be written.
+        deadline = time.time() + 5
+        while self.client.stats()["reconnects"] < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        stats = self.client.stats()
+        self.assertGreaterEqual(stats["reconnects"], 2)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertLess(stats["sent"], EVENTS)
+
+        # Once SAS is reading again, every message not completely written to the stalled
+        # connection arrives whole, in order.
+        self.stalled.close()
+        self.sas = FakeSAS(self.port)
+        self.assertTrue(self.sas.wait_for(lambda: EVENTS - 1 in self.received(), timeout=10))
+        received = self.received()
+        self.assertEqual(received, list(range(received[0], EVENTS)))
+        for connection, data in enumerate(self.sas.connections):
+            messages = self.sas.messages(connection)
+            self.assertEqual(messages[0][0], MESSAGE_INITIALISATION)
+            self.assertEqual(sum(len(message) for _, message in messages), len(data))
+
+    def test_no_send_timeout(self):
+        # Without a send timeout, the sender waits for SAS to take what is written, however long
+        # that is, rather than giving up on the connection.
+        options = SocketOptions(send_timeout=None, send_buffer_size=4096)
+        self.client = Client("system", "type", "resource", '127.0.0.1', sas_port=self.port,
+                             socket_options=options)
+        self.assertTrue(self.client.wait_connected(5))
+        reconnects = self.client.stats()["reconnects"]
+        trail = Trail()
+        for sequence in range(EVENTS):
+            self.client.send(Event(trail, 1, 0, [sequence], ["x" * 2000]))
+
+        time.sleep(1)
+        stats = self.client.stats()
+        self.assertLess(stats["sent"], EVENTS)
+        self.assertEqual(stats["reconnects"], reconnects)
+        self.assertEqual(stats["restarts"], 0)
+
+    def received(self):
+        """
+        :return: the sequence numbers of the events SAS has received, on any connection
+        """
+        return [sequence_number(event) for event in self.sas.received()]
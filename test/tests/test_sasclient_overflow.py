@@ -0,0 +1,102 @@
+import threading
+import unittest
+from metaswitch.sasclient import Event, Marker, Trail, MARKER_ID_END
+from metaswitch.sasclient.msgbuffer import MessageBuffer
+from metaswitch.sasclient import overflow
+
+
+class SASClientOverflowTest(unittest.TestCase):
+    """
+    Test the policies for messages sent while the queue is full.
+    """
+    def setUp(self):
+        self.trail = Trail()
+
+    def drain(self, buf):
+        items = []
+        while not buf.empty():
+            items.append(buf.pop())
+        return items
+
+    def test_drop_newest(self):
+        buf = MessageBuffer(2)
+        self.assertTrue(overflow.DropNewest.clear_on_reconnect)
+        self.assertTrue(buf.put(1))
+        self.assertTrue(buf.put(2))
+        self.assertFalse(buf.put(3))
+        self.assertEqual(self.drain(buf), [1, 2])
+        self.assertEqual(buf.rejected, 1)
+
+    def test_drop_oldest(self):
+        buf = MessageBuffer(2, overflow.DropOldest())
+        self.assertTrue(buf.put(1))
+        self.assertTrue(buf.put(2))
+        self.assertFalse(buf.put(3))
+        self.assertEqual(self.drain(buf), [2, 3])
+        self.assertEqual(buf.evicted, 1)
+        self.assertEqual(buf.rejected, 0)
+
+    def test_block_until_room(self):
+        buf = MessageBuffer(1, overflow.Block(5))
+        buf.put(1)
+        timer = threading.Timer(0.05, buf.pop)
+        timer.start()
+        self.assertTrue(buf.put(2))
+        timer.join()
+        self.assertEqual(self.drain(buf), [2])
+        self.assertEqual(buf.blocked, 1)
+
+    def test_block_timeout(self):
+        buf = MessageBuffer(1, overflow.Block(0.01))
+        buf.put(1)
+        self.assertFalse(buf.put(2))
+        self.assertEqual(buf.blocked, 1)
+        self.assertEqual(buf.rejected, 1)
+
+    def test_sample_keeps_whole_trails(self):
+        buf = MessageBuffer(1000, overflow.Sample(0.5, threshold=0.1))
+        for _ in range(100):
+            buf.put(Event(self.trail, 1))
+        trails = [Trail() for _ in range(100)]
+        for _ in range(3):
+            for trail in trails:
+                buf.put(Event(trail, 1))
+
+        kept = [message.trail_id for message in self.drain(buf)[100:]]
+        kept_trails = set(kept)
+        self.assertTrue(20 < len(kept_trails) < 80)
+        for trail_id in kept_trails:
+            self.assertEqual(kept.count(trail_id), 3)
+        self.assertEqual(buf.sampled_out, 3 * (100 - len(kept_trails)))
+
+    def test_sample_full(self):
+        buf = MessageBuffer(2, overflow.Sample(1.0))
+        for _ in range(3):
+            buf.put(Event(self.trail, 1))
+        self.assertEqual(len(buf), 2)
+        self.assertEqual(buf.rejected, 1)
+
+    def test_priority(self):
+        buf = MessageBuffer(3, overflow.Priority())
+        first = Event(self.trail, 1)
+        marker = Marker(self.trail, MARKER_ID_END)
+        buf.put(first)
+        buf.put(marker)
+        buf.put(Event(self.trail, 2))
+
+        # Events are turned away, but Markers displace the oldest Event.
+        self.assertFalse(buf.put(Event(self.trail, 3)))
+        end = Marker(self.trail, MARKER_ID_END)
+        self.assertFalse(buf.put(end))
+        self.assertEqual(buf.rejected, 1)
+        self.assertEqual(buf.evicted, 1)
+        remaining = self.drain(buf)
+        self.assertNotIn(first, remaining)
+        self.assertEqual(remaining[0], marker)
+        self.assertEqual(remaining[2], end)
+
+    def test_priority_full_of_markers(self):
+        buf = MessageBuffer(1, overflow.Priority())
+        buf.put(Marker(self.trail, MARKER_ID_END))
+        self.assertFalse(buf.put(Marker(self.trail, MARKER_ID_END)))
+        self.assertEqual(buf.rejected, 1)
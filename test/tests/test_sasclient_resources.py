@@ -0,0 +1,112 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from metaswitch.sasclient import Analytics, Client, Event, Marker, Trail, MARKER_ID_START
+from metaswitch.sasclient.resources import load_resource_bundle
+
+BUNDLE = {
+    "identifier": "org.example.test",
+    "version": "1",
+    "events": {
+        "HTTP_REQUEST": {
+            "id": "0x000001",
+            "summary": "HTTP request",
+            "static_params": ["port"],
+            "var_params": ["method", "uri"],
+        },
+        "TIMEOUT": {"id": 2},
+    },
+}
+
+
+class SASClientResourceBundleTest(unittest.TestCase):
+    """
+    Test loading resource bundles, and checking events against them.
+    """
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.trail = Trail()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write_bundle(self, bundle):
+        path = os.path.join(self.dir, "bundle.json")
+        with open(path, "w") as bundle_file:
+            json.dump(bundle, bundle_file)
+        return path
+
+    def test_load(self):
+        bundle = load_resource_bundle(self.write_bundle(BUNDLE))
+        self.assertEqual(bundle.identifier, "org.example.test")
+        self.assertEqual(len(bundle), 2)
+        self.assertEqual(bundle.event("HTTP_REQUEST").event_id, 1)
+        self.assertEqual(bundle.event_by_id(1).static_params, ("port",))
+        self.assertEqual(bundle.event_by_id(2).var_params, ())
+
+    def test_invalid_bundles(self):
+        for events in [
+                {"NO_ID": {}},
+                {"BAD_ID": {"id": "one"}},
+                {"BIG_ID": {"id": 0x1000000}},
+                {"BAD_PARAMS": {"id": 1, "var_params": "uri"}},
+                {"FIRST": {"id": 1}, "SECOND": {"id": "0x1"}}]:
+            path = self.write_bundle({"events": events})
+            self.assertRaises(ValueError, load_resource_bundle, path)
+
+        with open(path, "w") as bundle_file:
+            bundle_file.write("{")
+        self.assertRaises(ValueError, load_resource_bundle, path)
+
+    def test_check_event(self):
+        bundle = load_resource_bundle(self.write_bundle(BUNDLE))
+        bundle.check_event(1, [80], ["GET", u"/caf\xe9"])
+        self.assertRaises(ValueError, bundle.check_event, 3, [], [])
+        self.assertRaises(ValueError, bundle.check_event, 1, [], ["GET", "/"])
+        self.assertRaises(ValueError, bundle.check_event, 1, [80], ["GET"])
+        self.assertRaises(ValueError, bundle.check_event, 1, [1 << 31], ["GET", "/"])
+        self.assertRaises(TypeError, bundle.check_event, 1, ["80"], ["GET", "/"])
+        self.assertRaises(TypeError, bundle.check_event, 1, [80], ["GET", 404])
+
+        bundle.check_message(Event(self.trail, 1, 0, [80], ["GET", "/"]))
+        bundle.check_message(Marker(self.trail, MARKER_ID_START))
+        self.assertRaises(ValueError, bundle.check_message, Event(self.trail, 1))
+        self.assertRaises(TypeError, bundle.check_message,
+                          Event(self.trail, 1, 0, [80], ["GET", 404]))
+        self.assertRaises(TypeError, bundle.check_message,
+                          Event(self.trail, 1, 0, [80], ["GET", 404], deferred=True))
+
+        analytics = Analytics(self.trail, Analytics.FORMAT_JSON, "source", "id", event_id=1,
+                              static_params=[80], var_params=["GET", "/"])
+        bundle.check_message(analytics)
+        analytics.add_variable_param("extra")
+        self.assertRaises(ValueError, bundle.check_message, analytics)
+
+    def test_no_validation(self):
+        bundle = load_resource_bundle(self.write_bundle(BUNDLE), validate=False)
+        bundle.check_event(3, [], [])
+        bundle.check_message(Event(self.trail, 1))
+        template = bundle.template("TIMEOUT")
+        template.encode(self.trail.get_trail_id())
+
+    def test_template(self):
+        bundle = load_resource_bundle(self.write_bundle(BUNDLE))
+        template = bundle.template("HTTP_REQUEST", instance_id=4)
+        event = Event(self.trail, 1, 4, [80], ["GET", "/"])
+        self.assertEqual(template.encode(self.trail.get_trail_id(), [80], ["GET", "/"],
+                                         timestamp=event.timestamp),
+                         event.serialize())
+        self.assertRaises(TypeError, template.encode, self.trail.get_trail_id(), [80], ["GET", 1])
+
+    def test_client(self):
+        bundle = load_resource_bundle(self.write_bundle(BUNDLE))
+        client = Client("system", "type", "resource", "localhost", start=False,
+                        resource_bundle=bundle)
+        trail_id = self.trail.get_trail_id()
+        client.send(Event(self.trail, 1, 0, [80], ["GET", "/"]))
+        client.send_event(trail_id, 2)
+        self.assertRaises(ValueError, client.send, Event(self.trail, 3))
+        self.assertRaises(ValueError, client.send_event, trail_id, 1, 0, [80], [])
+        self.assertEqual(client.stats()["enqueued"], 2)
@@ -0,0 +1,177 @@
+import socket
+import threading
+import time
+import unittest
+from metaswitch.sasclient.messages import encode_event
+from metaswitch.sasclient.msgbuffer import MessageBuffer
+from metaswitch.sasclient.sender import MessageSender
+
+TRAIL_ID = 111
+
+
+class FakeSocket(object):
+    """
+    Stands in for the connection to SAS, recording each write, and taking no more than limit bytes
+    per write.  It has no sendmsg, so each write is of (part of) a single batch.  It is backed by
+    one end of a socketpair, so that the sender can select() on it.
+    """
+    def __init__(self, limit=None):
+        self._sock, self._peer = socket.socketpair()
+        self.limit = limit
+        self.writes = []
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def recv(self, size):
+        return self._sock.recv(size)
+
+    def send(self, data):
+        if self.limit is not None:
+            data = data[:self.limit]
+        data = data.tobytes() if isinstance(data, memoryview) else bytes(data)
+        self.writes.append(data)
+        return len(data)
+
+    def close(self):
+        self._sock.close()
+        self._peer.close()
+
+
+class MessageSenderBatchTest(unittest.TestCase):
+    """
+    Test how the sender coalesces queued messages into batches, and writes them to the socket.
+    """
+    def setUp(self):
+        self.queue = MessageBuffer(1000)
+        self.sock = FakeSocket()
+
+    def tearDown(self):
+        self.sock.close()
+
+    def make_sender(self, **kwargs):
+        sender = MessageSender(threading.Event(), self.queue, threading.Event(), "system", "type",
+                               "resource", '127.0.0.1', 0, **kwargs)
+        # Connected to the fake socket, without an Init message.
+        sender._sas_sock = self.sock
+        sender._connected = True
+        return sender
+
+    def queue_events(self, count, start=0):
+        events = [encode_event(TRAIL_ID, 1, 0, [sequence], timestamp=0)
+                  for sequence in range(start, start + count)]
+        for event in events:
+            self.queue.put(event)
+        return events
+
+    def write_batches(self, sender):
+        """
+        Fill and write batches until the queue is empty.
+        :return: the number of messages in each batch
+        """
+        batches = []
+        while True:
+            count = sender.fill(0)
+            if not count:
+                return batches
+            batches.append(count)
+            self.assertTrue(sender.write_outgoing())
+
+    def test_message_limit(self):
+        sender = self.make_sender(batch_max_messages=4)
+        events = self.queue_events(10)
+        self.assertEqual(self.write_batches(sender), [4, 4, 2])
+        self.assertEqual(self.sock.writes, [b''.join(events[0:4]),
+                                            b''.join(events[4:8]),
+                                            b''.join(events[8:10])])
+
+    def test_byte_limit(self):
+        # A batch is closed by the message that takes it to the limit.
+        size = len(self.queue_events(10)[0])
+        sender = self.make_sender(batch_max_bytes=int(size * 2.5))
+        self.assertEqual(self.write_batches(sender), [3, 3, 3, 1])
+        self.assertEqual([len(data) for data in self.sock.writes], [3 * size] * 3 + [size])
+
+    def test_one_message_over_byte_limit(self):
+        # A batch always has at least one message, however big.
+        events = self.queue_events(2)
+        sender = self.make_sender(batch_max_bytes=1)
+        self.assertEqual(self.write_batches(sender), [1, 1])
+        self.assertEqual(self.sock.writes, events)
+
+    def test_no_linger(self):
+        sender = self.make_sender()
+        self.queue_events(1)
+        threading.Timer(0.1, self.queue_events, (1, 1)).start()
+        self.assertEqual(sender.fill(0), 1)
+        time.sleep(0.2)
+        self.assertEqual(sender.fill(0), 1)
+
+    def test_linger(self):
+        # A message that arrives while the sender lingers joins the batch.
+        sender = self.make_sender(batch_linger=0.5)
+        self.queue_events(1)
+        threading.Timer(0.1, self.queue_events, (1, 1)).start()
+        self.assertEqual(sender.fill(0), 2)
+
+    def test_linger_expires(self):
+        sender = self.make_sender(batch_linger=0.2)
+        events = self.queue_events(1)
+        start = time.time()
+        self.assertEqual(sender.fill(0), 1)
+        self.assertGreaterEqual(time.time() - start, 0.15)
+        self.assertTrue(sender.write_outgoing())
+        self.assertEqual(self.sock.writes, events)
+
+    def test_partial_writes(self):
+        # Each write carries on from where the last one stopped, and messages are only counted
+        # as sent once they have been written completely.
+        self.sock.limit = 7
+        sender = self.make_sender()
+        events = self.queue_events(3)
+        self.assertEqual(sender.fill(0), 3)
+
+        stats = sender._stats
+        self.assertTrue(sender.write_outgoing())
+        self.assertEqual(b''.join(self.sock.writes), b''.join(events))
+        self.assertTrue(all(len(data) <= 7 for data in self.sock.writes))
+        self.assertEqual(stats.sent, 3)
+        self.assertEqual(stats.bytes_sent, sum(len(event) for event in events))
+
+    def test_partial_write_counts(self):
+        # Stop writing part way through the second message.
+        events = self.queue_events(2)
+        size = len(events[0])
+        self.sock.limit = size + 1
+        sender = self.make_sender()
+        sender.fill(0)
+        sent, completed = sender._outgoing.write(self.sock)
+        self.assertEqual((sent, completed), (size + 1, 1))
+        self.assertEqual(sender.unsent(), 1)
+
+        # The rest of the second message follows on.
+        self.assertTrue(sender.write_outgoing())
+        self.assertEqual(self.sock.writes[-1], events[1][1:])
+        self.assertEqual(b''.join(self.sock.writes), b''.join(events))
+        self.assertEqual(sender.unsent(), 0)
+
+    def test_flush_ignores_later_messages(self):
+        # A flush is done once the messages queued before it have been written, even if more
+        # have been queued since.
+        sender = self.make_sender()
+        self.queue_events(3)
+        results = []
+        flusher = threading.Thread(target=lambda: results.append(sender.flush(5)))
+        flusher.start()
+        # Wait for the flush to start, so that it's only waiting for the first three.
+        deadline = time.time() + 5
+        while not sender._flush_waiters and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(sender.fill(0), 3)
+        self.queue_events(3, 3)
+        sender.check_flushed()
+        self.assertTrue(sender.write_outgoing())
+        sender.check_flushed()
+        flusher.join()
+        self.assertEqual(results, [True])
+        self.assertEqual(len(self.queue), 3)
@@ -0,0 +1,101 @@
+import socket
+import time
+import unittest
+from metaswitch.sasclient import Client, Event, Trail
+from metaswitch.sasclient.constants import MESSAGE_EVENT, MESSAGE_INITIALISATION
+from metaswitch.sasclient.sender import SocketOptions
+from fake_sas import FakeSAS, FakeSASTestCase
+
+
+class SASClientSocketOptionsTest(FakeSASTestCase):
+    """
+    Test the options for the connection to SAS.
+    """
+    def test_port(self):
+        # The second listener is the one clients connect to by default.
+        other = FakeSAS()
+        try:
+            client = Client("system", "type", "resource", self.sas.address, sas_port=self.sas.port)
+            self.assertTrue(self.sas.wait_for(lambda: len(self.sas.messages(0)) == 1))
+            self.assertEqual(self.sas.messages(0)[0][0], MESSAGE_INITIALISATION)
+            self.assertEqual(other.connections, [])
+            client.stop()
+        finally:
+            other.stop()
+
+    def test_apply(self):
+        options = SocketOptions(send_timeout=3, tcp_nodelay=True, send_buffer_size=65536,
+                                keepalive=True, keepalive_idle=5, keepalive_interval=2,
+                                keepalive_count=3)
+        sock = socket.create_connection((self.sas.address, self.sas.port))
+        try:
+            options.apply(sock)
+            self.assertTrue(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+            self.assertTrue(sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE))
+            # Linux doubles the buffer size asked for, to allow for its own overhead.
+            self.assertGreaterEqual(sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF), 65536)
+            if hasattr(socket, 'TCP_KEEPIDLE'):
+                self.assertEqual(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE), 5)
+                self.assertEqual(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT), 3)
+        finally:
+            sock.close()
+
+    def test_defaults_unchanged(self):
+        sock = socket.create_connection((self.sas.address, self.sas.port))
+        try:
+            SocketOptions().apply(sock)
+            self.assertFalse(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+            self.assertFalse(sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE))
+        finally:
+            sock.close()
+
+    def test_client(self):
+        options = SocketOptions(connect_timeout=1, tcp_nodelay=True, keepalive=True,
+                                user_timeout=5)
+        client = Client("system", "type", "resource", self.sas.address, socket_options=options)
+        try:
+            client.send(Event(Trail(), 1))
+            self.assertTrue(self.sas.wait_for(lambda: len(self.sas.messages(0)) == 2))
+            self.assertEqual(self.sas.messages(0)[1][0], MESSAGE_EVENT)
+        finally:
+            client.stop()
+
+
+class SASClientStartTest(unittest.TestCase):
+    """
+    Test that starting the client doesn't wait for the connection to SAS.
+    """
+    def test_start_with_sas_unreachable(self):
+        # A listener whose backlog is full, so that further connections to it hang.
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(0)
+        port = listener.getsockname()[1]
+        backlog = socket.create_connection(('127.0.0.1', port))
+        try:
+            start = time.time()
+            client = Client("system", "type", "resource", '127.0.0.1', sas_port=port)
+            self.assertLess(time.time() - start, 0.5)
+
+            client.send(Event(Trail(), 1))
+            self.assertEqual(client.stats()["enqueued"], 1)
+            self.assertFalse(client.wait_connected(0.2))
+
+            # Stopping doesn't wait for the connection attempt to time out either.
+            start = time.time()
+            client.stop()
+            self.assertLess(time.time() - start, 1)
+        finally:
+            backlog.close()
+            listener.close()
+
+    def test_wait_connected(self):
+        sas = FakeSAS()
+        try:
+            client = Client("system", "type", "resource", sas.address, start=False)
+            self.assertFalse(client.wait_connected(0))
+            client.start()
+            self.assertTrue(client.wait_connected(5))
+            client.stop()
+        finally:
+            sas.stop()
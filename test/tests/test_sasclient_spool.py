@@ -0,0 +1,158 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+from metaswitch.sasclient import Client, main
+from metaswitch.sasclient.constants import MESSAGE_EVENT
+from metaswitch.sasclient.spool import Spool, SPOOL_HEADER
+from fake_sas import FakeSAS, FakeSASTestCase, sequence_number
+
+EVENTS = 100
+
+
+def message(sequence, length=8):
+    """
+    :return: a fake serialized message of the given length, identified by a sequence number
+    """
+    return struct.pack('!hbbi', length, 3, MESSAGE_EVENT, sequence) + b'\0' * (length - 8)
+
+
+class SpoolTest(unittest.TestCase):
+    """
+    Test the spool file on its own.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'spool')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_peek_and_consume(self):
+        spool = Spool(self.path, 100)
+        self.assertTrue(spool.empty())
+        for sequence in range(3):
+            spool.append(message(sequence))
+        self.assertEqual(len(spool), 24)
+
+        self.assertEqual(spool.peek(20), message(0) + message(1))
+        spool.consume(16)
+        self.assertEqual(spool.peek(20), message(2))
+        spool.consume(8)
+        self.assertTrue(spool.empty())
+        spool.close()
+
+    def test_peek_returns_at_least_one_message(self):
+        spool = Spool(self.path, 100)
+        spool.append(message(0, 20))
+        self.assertEqual(spool.peek(10), message(0, 20))
+        spool.close()
+
+    def test_oldest_messages_evicted_and_ring_wraps(self):
+        spool = Spool(self.path, 20)
+        for sequence in range(5):
+            spool.append(message(sequence))
+        self.assertEqual(spool.evicted, 3)
+        self.assertEqual(spool.peek(100), message(3) + message(4))
+
+        # The next message wraps around the end of the ring.
+        spool.append(message(5, 12))
+        self.assertEqual(spool.evicted, 4)
+        self.assertEqual(spool.peek(100), message(4) + message(5, 12))
+        spool.close()
+
+    def test_too_big(self):
+        spool = Spool(self.path, 20)
+        self.assertFalse(spool.append(message(0, 24)))
+        self.assertTrue(spool.empty())
+
+        # Only the messages at the end of the data that fit are kept.
+        self.assertTrue(spool.append(message(1) + message(2, 12) + message(3)))
+        self.assertEqual(spool.peek(100), message(2, 12) + message(3))
+        spool.close()
+
+    def test_persisted_across_reopen(self):
+        spool = Spool(self.path, 40)
+        for sequence in range(4):
+            spool.append(message(sequence))
+        spool.consume(8)
+        spool.close()
+
+        spool = Spool(self.path, 40)
+        self.assertEqual(spool.peek(100), message(1) + message(2) + message(3))
+        spool.close()
+
+        # A different capacity starts afresh.
+        spool = Spool(self.path, 20)
+        self.assertTrue(spool.empty())
+        spool.close()
+
+    def test_corruption_empties_spool(self):
+        spool = Spool(self.path, 20)
+        spool.append(message(0))
+        spool.close()
+        with open(self.path, 'r+b') as spool_file:
+            spool_file.seek(SPOOL_HEADER.size)
+            spool_file.write(b'\xff\xff')
+
+        spool = Spool(self.path, 20)
+        self.assertEqual(spool.peek(100), b'')
+        self.assertTrue(spool.empty())
+        spool.close()
+
+
+class SASClientSpoolTest(FakeSASTestCase):
+    """
+    Test that the client spools messages while SAS is unavailable, and sends them once it's back.
+    """
+    def setUp(self):
+        super(SASClientSpoolTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'spool')
+        self.port = self.sas.port
+        self.client = None
+
+    def tearDown(self):
+        if self.client is not None:
+            self.client.stop()
+        super(SASClientSpoolTest, self).tearDown()
+        shutil.rmtree(self.directory)
+
+    def start_client(self):
+        self.client = Client("system", "type", "resource", self.sas.address,
+                             spool_path=self.path, spool_watermark=0)
+
+    def received(self):
+        """
+        :return: the sequence numbers of the events SAS has received, on any connection
+        """
+        return [sequence_number(event) for event in self.sas.received()]
+
+    def test_messages_survive_outage(self):
+        self.start_client()
+        # Stop SAS only once the client is connected, so that the outage breaks the connection.
+        self.assertTrue(self.client.wait_connected(5))
+        self.sas.stop()
+        self.send_events(self.client, EVENTS)
+
+        self.sas = FakeSAS(self.port)
+        self.assertTrue(self.sas.wait_for(lambda: len(self.received()) >= EVENTS, timeout=10))
+        self.assertEqual(self.received(), list(range(EVENTS)))
+
+    def test_messages_survive_restart(self):
+        # Nothing is listening on the port while the first client runs.
+        self.sas.stop()
+        main.DEFAULT_SAS_PORT = self.port
+        try:
+            self.start_client()
+            self.send_events(self.client, EVENTS)
+        finally:
+            main.DEFAULT_SAS_PORT = self.sas._original_port
+        self.client.stop()
+        self.assertGreater(os.path.getsize(self.path), 0)
+
+        self.sas = FakeSAS(self.port)
+        self.start_client()
+        self.assertTrue(self.sas.wait_for(lambda: len(self.received()) >= EVENTS, timeout=10))
+        self.assertEqual(self.received(), list(range(EVENTS)))
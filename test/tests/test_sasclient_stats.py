@@ -0,0 +1,95 @@
+import unittest
+from metaswitch.sasclient import Client, Event, Trail
+from metaswitch.sasclient.main import MINIMUM_QUEUE_LENGTH
+from metaswitch.sasclient.stats import Histogram
+from fake_sas import FakeSAS
+
+EVENTS = 50
+
+
+class HistogramTest(unittest.TestCase):
+    """
+    Test the latency histogram.
+    """
+    def test_buckets_and_percentiles(self):
+        histogram = Histogram()
+        for seconds in [0.0000005, 0.000003, 0.000003, 0.000003, 0.001]:
+            histogram.record(seconds)
+
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot["count"], 5)
+        self.assertEqual(snapshot["max"], 0.001)
+        self.assertEqual(snapshot["buckets"], [(0.000001, 1), (0.000004, 3), (0.001024, 1)])
+        self.assertEqual(snapshot["p50"], 0.000004)
+        self.assertEqual(snapshot["p99"], 0.001)
+
+    def test_merge(self):
+        first = Histogram()
+        first.record(0.000003)
+        second = Histogram()
+        second.record(0.5)
+        snapshot = first.merge(second).snapshot()
+        self.assertEqual(snapshot["count"], 2)
+        self.assertEqual(snapshot["max"], 0.5)
+
+    def test_empty(self):
+        snapshot = Histogram().snapshot()
+        self.assertEqual(snapshot["count"], 0)
+        self.assertEqual(snapshot["mean"], 0.0)
+        self.assertEqual(snapshot["buckets"], [])
+
+
+class SASClientStatsTest(unittest.TestCase):
+    """
+    Test the statistics reported by Client.stats().
+    """
+    def test_sent(self):
+        sas = FakeSAS()
+        client = Client("system", "type", "resource", sas.address, connections=2)
+        try:
+            trail = Trail()
+            for _ in range(EVENTS):
+                client.send(Event(trail, 1))
+            self.assertTrue(sas.wait_for(lambda: client.stats()["sent"] == EVENTS))
+
+            stats = client.stats()
+            self.assertEqual(stats["enqueued"], EVENTS)
+            self.assertEqual(stats["dropped"], 0)
+            self.assertEqual(stats["queue_depth"], 0)
+            self.assertGreaterEqual(stats["bytes_sent"], EVENTS * Event(trail, 1).serialized_size())
+            self.assertGreater(stats["queue_wait"]["count"], 0)
+            self.assertGreater(stats["write_latency"]["count"], 0)
+            self.assertEqual(stats["reconnects"], 0)
+            self.assertEqual(len(stats["connections"]), 2)
+            self.assertEqual(sum(c["sent"] for c in stats["connections"]), EVENTS)
+        finally:
+            client.stop()
+            sas.stop()
+
+    def test_dropped(self):
+        client = Client("system", "type", "resource", "localhost", start=False,
+                        queue_length=MINIMUM_QUEUE_LENGTH)
+        trail = Trail()
+        for _ in range(MINIMUM_QUEUE_LENGTH + 10):
+            client.send(Event(trail, 1))
+
+        stats = client.stats()
+        self.assertEqual(stats["enqueued"], MINIMUM_QUEUE_LENGTH)
+        self.assertEqual(stats["dropped"], 10)
+        self.assertEqual(stats["sent"], 0)
+        self.assertEqual(stats["queue_depth"], MINIMUM_QUEUE_LENGTH)
+        self.assertEqual(stats["queue_high_water"], MINIMUM_QUEUE_LENGTH)
+
+    def test_byte_budget(self):
+        trail = Trail()
+        size = Event(trail, 1).serialized_size()
+        client = Client("system", "type", "resource", "localhost", start=False,
+                        queue_bytes=10 * size)
+        for _ in range(15):
+            client.send(Event(trail, 1))
+
+        stats = client.stats()
+        self.assertEqual(stats["enqueued"], 10)
+        self.assertEqual(stats["dropped"], 5)
+        self.assertEqual(stats["queue_bytes"], 10 * size)
+        self.assertEqual(stats["queue_bytes_high_water"], 10 * size)
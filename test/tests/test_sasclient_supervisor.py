@@ -0,0 +1,103 @@
+import struct
+import time
+from metaswitch.sasclient import Client, Event, Trail, sender
+from fake_sas import FakeSASTestCase
+
+EVENTS = 100
+
+
+class UnserializableEvent(Event):
+    def serialize_parts(self, parts):
+        parts.append(b'partial')
+        raise struct.error("parameter too long")
+
+
+class SASClientSupervisorTest(FakeSASTestCase):
+    """
+    Test that messages that fail to serialize, and senders that hit unexpected exceptions, don't
+    stop the client sending.
+    """
+    def setUp(self):
+        super(SASClientSupervisorTest, self).setUp()
+        self.write_outgoing = sender.MessageSender.write_outgoing
+        self.failures = 0
+
+    def tearDown(self):
+        sender.MessageSender.write_outgoing = self.write_outgoing
+        super(SASClientSupervisorTest, self).tearDown()
+
+    def fail_writes(self, count):
+        """
+        Make the next count writes by any sender raise an unexpected exception.
+        """
+        self.failures = count
+        write_outgoing = self.write_outgoing
+
+        def failing_write_outgoing(worker):
+            if self.failures > 0:
+                self.failures -= 1
+                raise RuntimeError("unexpected")
+            return write_outgoing(worker)
+        sender.MessageSender.write_outgoing = failing_write_outgoing
+
+    def test_unserializable_message(self):
+        client = Client("system", "type", "resource", self.sas.address)
+        try:
+            trail = Trail()
+            client.send(Event(trail, 1, 0, [1]))
+            client.send(UnserializableEvent(trail, 2))
+            client.send(Event(trail, 3, 0, [3]))
+            self.assertEqual(client.flush(5)["unsent"], 0)
+            self.assertTrue(self.sas.wait_for(lambda: len(self.sas.received(connection=0)) == 2))
+            stats = client.stats()
+            self.assertEqual(stats["sent"], 2)
+            self.assertEqual(stats["failed"], 1)
+            self.assertEqual(stats["dropped"], 1)
+            self.assertEqual(stats["restarts"], 0)
+        finally:
+            client.stop()
+
+    def test_unserializable_deferred_message(self):
+        client = Client("system", "type", "resource", self.sas.address)
+        try:
+            trail = Trail()
+            client.send(Event(trail, 1, deferred=True).add_variable_param(b'x' * 70000))
+            self.send_events(client, EVENTS)
+            self.assertEqual(client.flush(5)["unsent"], 0)
+            self.assertTrue(self.sas.wait_for(
+                lambda: len(self.sas.received(connection=0)) == EVENTS))
+            self.assertEqual(client.stats()["failed"], 1)
+        finally:
+            client.stop()
+
+    def test_restart(self):
+        client = Client("system", "type", "resource", self.sas.address)
+        try:
+            self.assertTrue(client.wait_connected(5))
+            self.fail_writes(1)
+            self.send_events(client, EVENTS)
+            self.assertTrue(self.sas.wait_for(lambda: client.stats()["restarts"] == 1))
+            self.assertTrue(client.wait_connected(5))
+            self.assertEqual(client.flush(5)["unsent"], 0)
+            # Messages that the failed sender had taken off the queue are lost.
+            self.assertEqual(client.stats()["sent"] + client.stats()["dropped"], EVENTS)
+            sent = client.stats()["sent"]
+
+            # The restarted sender carries on with new messages.
+            self.send_events(client, EVENTS)
+            self.assertEqual(client.flush(5)["unsent"], 0)
+            self.assertTrue(self.sas.wait_for(lambda: len(self.sas.received()) == sent + EVENTS))
+        finally:
+            client.stop()
+
+    def test_restart_backoff(self):
+        self.fail_writes(1000)
+        start = time.time()
+        client = Client("system", "type", "resource", self.sas.address)
+        # Restarts come 0.1, 0.2 and 0.4 seconds after each failure, so the third can't come
+        # sooner than 0.7 seconds after the start (however slowly the test runs).
+        self.assertTrue(self.sas.wait_for(lambda: client.stats()["restarts"] >= 3))
+        self.assertGreaterEqual(time.time() - start, 0.7)
+        start = time.time()
+        client.stop()
+        self.assertLess(time.time() - start, 1)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import struct
+import unittest
+from metaswitch.sasclient import (
+    Analytics, AnalyticsTemplate, Event, EventTemplate, Marker, MarkerTemplate, Trail, TestClient,
+    MARKER_ID_START, SCOPE_BRANCH, SCOPE_TRACE)
+from metaswitch.sasclient.constants import MESSAGE_EVENT, MESSAGE_MARKER
+from metaswitch.sasclient.messages import message_type
+
+
+class SASClientTemplateTest(unittest.TestCase):
+    """
+    Test that messages encoded from templates match those serialized from Message objects.
+    """
+    def setUp(self):
+        self.trail = Trail()
+        self.trail_id = self.trail.get_trail_id()
+
+    def test_event(self):
+        for static_params, var_params in [
+                ([], []),
+                ([1, -2, 0x7fffffff], []),
+                ([], ["an.example.host", u"caf\xe9", ""]),
+                ([80, 200], ["POST", "x" * 300])]:
+            template = EventTemplate(0x900001, 7, len(static_params), len(var_params))
+            event = Event(self.trail, 0x900001, 7, static_params, var_params)
+            self.assertEqual(
+                template.encode(self.trail_id, static_params, var_params,
+                                timestamp=event.timestamp),
+                event.serialize())
+
+    def test_marker(self):
+        for reactivate, scope in [(True, 0), (True, SCOPE_BRANCH), (False, SCOPE_TRACE)]:
+            template = MarkerTemplate(MARKER_ID_START, 3, reactivate, scope, 1, 1)
+            marker = Marker(self.trail, MARKER_ID_START, 3, reactivate, scope, [5], ["sip:a@b"])
+            self.assertEqual(
+                template.encode(self.trail_id, [5], ["sip:a@b"], timestamp=marker.timestamp),
+                marker.serialize())
+
+    def test_analytics(self):
+        for store_event in (False, True):
+            template = AnalyticsTemplate(Analytics.FORMAT_JSON, 'TestFormat', u'Friendly\xe9',
+                                         store_event, 0xde, 2, 1, 1)
+            message = Analytics(self.trail, Analytics.FORMAT_JSON, 'TestFormat', u'Friendly\xe9',
+                                store_event, 0xde, 2, [9], ['data: {"key": "value"}'])
+            self.assertEqual(
+                template.encode(self.trail_id, [9], ['data: {"key": "value"}'],
+                                timestamp=message.timestamp),
+                message.serialize())
+
+    def test_reuse(self):
+        # Each message from a template is independent of the last.
+        template = EventTemplate(1, n_static=1, n_var=1)
+        template.encode(Trail().get_trail_id(), [1], ["a longer parameter"], timestamp=1)
+        self.assertEqual(template.encode(self.trail_id, [2], ["short"], timestamp=2),
+                         Event(self.trail, 1, 0, [2], ["short"]).set_timestamp(2).serialize())
+
+    def test_wrong_parameter_count(self):
+        template = EventTemplate(1, n_static=1, n_var=1)
+        self.assertRaises(ValueError, template.encode, self.trail_id, [1], [])
+        self.assertRaises(struct.error, template.encode, self.trail_id, [1, 2], ["a"])
+
+    def test_test_client(self):
+        client = TestClient()
+        client.send_template(EventTemplate(1), self.trail_id)
+        client.send_template(MarkerTemplate(MARKER_ID_START), self.trail_id)
+        self.assertEqual([message_type(data) for data in client.message_queue],
+                         [MESSAGE_EVENT, MESSAGE_MARKER])
@@ -0,0 +1,75 @@
+import logging
+import unittest
+from metaswitch.sasclient import Client, Event, Trail
+from metaswitch.sasclient.tracer import MessageTracer
+
+
+class CountingEvent(Event):
+    """
+    An Event that counts how many times it has been rendered.
+    """
+    rendered = 0
+
+    def __str__(self):
+        CountingEvent.rendered += 1
+        return Event.__str__(self)
+
+
+class SASClientTracerTest(unittest.TestCase):
+    """
+    Test debug logging of messages, and the message tracer.
+    """
+    def setUp(self):
+        CountingEvent.rendered = 0
+        self.trail = Trail()
+
+    def test_sampled(self):
+        tracer = MessageTracer(sample_interval=10, capacity=3)
+        for _ in range(100):
+            tracer.trace(CountingEvent(self.trail, 1))
+        self.assertEqual(CountingEvent.rendered, 10)
+        traced = tracer.dump()
+        self.assertEqual(len(traced), 3)
+        self.assertIn("Event", traced[0][1])
+        tracer.clear()
+        self.assertEqual(tracer.dump(), [])
+
+    def test_trails(self):
+        other = Trail()
+        tracer = MessageTracer()
+        tracer.trace_trail(self.trail.get_trail_id())
+        tracer.trace(CountingEvent(self.trail, 1))
+        tracer.trace(CountingEvent(other, 1))
+        self.assertEqual(CountingEvent.rendered, 1)
+
+        tracer.untrace_trail(self.trail.get_trail_id())
+        tracer.trace(CountingEvent(self.trail, 1))
+        self.assertEqual(len(tracer.dump()), 1)
+
+    def test_client(self):
+        tracer = MessageTracer(trail_ids=[self.trail.get_trail_id()])
+        client = Client("system", "type", "resource", "localhost", start=False, tracer=tracer)
+        client.send(CountingEvent(self.trail, 1))
+        client.send(CountingEvent(Trail(), 1))
+        self.assertEqual(len(tracer.dump()), 1)
+
+    def test_debug_logging_off(self):
+        client = Client("system", "type", "resource", "localhost", start=False)
+        client.send(CountingEvent(self.trail, 1))
+        self.assertEqual(CountingEvent.rendered, 0)
+
+    def test_debug_logging_on(self):
+        logger = logging.getLogger("metaswitch.sasclient")
+        records = []
+        handler = logging.Handler()
+        handler.emit = lambda record: records.append(record.getMessage())
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        try:
+            client = Client("system", "type", "resource", "localhost", start=False)
+            client.send(CountingEvent(self.trail, 1))
+        finally:
+            logger.removeHandler(handler)
+            logger.setLevel(logging.INFO)
+        self.assertEqual(CountingEvent.rendered, 1)
+        self.assertTrue(any("Event" in record for record in records))
@@ -0,0 +1,43 @@
+import threading
+import unittest
+from metaswitch.sasclient.main import TrailIdGenerator, TRAIL_COUNTER_MAX
+
+
+class SASClientTrailTest(unittest.TestCase):
+    """
+    Test the allocation of trail IDs.
+    """
+    def test_prefix(self):
+        generator = TrailIdGenerator(prefix=5)
+        self.assertEqual(generator.next_id(), (5 << 32) | 1)
+        self.assertEqual(generator.next_id(), (5 << 32) | 2)
+
+    def test_generated_prefixes_differ(self):
+        first = TrailIdGenerator().next_id()
+        second = TrailIdGenerator().next_id()
+        self.assertNotEqual(first, second)
+        self.assertGreater(first, 0)
+        self.assertLess(first, 1 << 63)
+
+    def test_rollover(self):
+        generator = TrailIdGenerator(prefix=5, start=TRAIL_COUNTER_MAX)
+        self.assertEqual(generator.next_id(), (5 << 32) | TRAIL_COUNTER_MAX)
+        rolled = generator.next_id()
+        self.assertNotEqual(rolled >> 32, 5)
+        self.assertEqual(rolled & TRAIL_COUNTER_MAX, 1)
+
+    def test_unique_across_threads(self):
+        generator = TrailIdGenerator()
+        results = [[] for _ in range(8)]
+
+        def allocate(ids):
+            for _ in range(1000):
+                ids.append(generator.next_id())
+
+        threads = [threading.Thread(target=allocate, args=(ids,)) for ids in results]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        all_ids = [trail_id for ids in results for trail_id in ids]
+        self.assertEqual(len(set(all_ids)), 8000)
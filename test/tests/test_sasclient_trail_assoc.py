@@ -8,16 +8,16 @@ from test_sasclient import SASClientTestCase
 
 TIMESTAMP = 1450180692598
 ASSOC_STRING_SCOPE_NONE = (
-    '\x00\x1d\x03\x02\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\x00\x00\x00'
-    '\x00p\x00'
+    b'\x00\x1d\x03\x02\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\x00\x00\x00'
+    b'\x00p\x00'
 )
 ASSOC_STRING_SCOPE_BRANCH = (
-    '\x00\x1d\x03\x02\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\x00\x00\x00'
-    '\x00p\x01'
+    b'\x00\x1d\x03\x02\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\x00\x00\x00'
+    b'\x00p\x01'
 )
 ASSOC_STRING_SCOPE_TRACE = (
-    '\x00\x1d\x03\x02\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\x00\x00\x00'
-    '\x00p\x02'
+    b'\x00\x1d\x03\x02\x00\x00\x01Q\xa5\x81Jv\x00\x00\x00\x00\x00\x00\x00o\x00\x00\x00\x00\x00\x00'
+    b'\x00p\x02'
 )
 
 